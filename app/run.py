@@ -1,7 +1,68 @@
+import argparse
+import importlib.util
+import os
 import uvicorn
 
 
-if __name__ == "__main__":
+def event_loop(choice: str) -> str:
+    # NOTE: uvloop isn't available on windows, fall back to asyncio there
+    if choice == "auto":
+        return (
+            "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+        )
+    return choice
+
+
+def http_parser(choice: str) -> str:
+    if choice == "auto":
+        return (
+            "httptools" if importlib.util.find_spec("httptools") else "h11"
+        )
+    return choice
+
+
+def run_production() -> None:
+    """
+    Serves the app with SERVER_WORKERS processes.
+
+    Every worker imports the app on its own and creates its own Mongo
+    client in the lifespan handler, so no connection is ever shared
+    across a fork. On SIGTERM the workers stop accepting connections,
+    finish the requests in flight for up to SERVER_GRACEFUL_SHUTDOWN_SECONDS
+    and then run the lifespan shutdown (buffered inserts, Mongo client).
+    """
+    # NOTE: imported here so dev mode doesn't need a complete .env to start
+    from server.config import settings
+
     uvicorn.run(
-        "server.main:app", host="localhost", port=8000, reload=True
+        "server.main:app",
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=settings.SERVER_WORKERS or os.cpu_count() or 1,
+        loop=event_loop(settings.SERVER_LOOP),
+        http=http_parser(settings.SERVER_HTTP),
+        backlog=settings.SERVER_BACKLOG,
+        timeout_keep_alive=settings.SERVER_KEEP_ALIVE_SECONDS,
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_SHUTDOWN_SECONDS,
+        # NOTE: the client address is needed for the per-IP rate limits
+        proxy_headers=settings.RATE_LIMIT_TRUST_FORWARDED,
+        access_log=settings.SERVER_ACCESS_LOG,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the API")
+    parser.add_argument(
+        "--prod",
+        action="store_true",
+        help="multi-worker production mode, configured by the SERVER_* settings",
     )
+    args = parser.parse_args()
+
+    if args.prod:
+        run_production()
+    else:
+        # NOTE: dev mode, one process that reloads on code changes
+        uvicorn.run(
+            "server.main:app", host="localhost", port=8000, reload=True
+        )
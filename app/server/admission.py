@@ -0,0 +1,288 @@
+import logging
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+import orjson
+from jose import JWTError, jwt
+from starlette.types import ASGIApp, Receive, Scope, Send
+from .config import settings
+from .metrics import Counter, Gauge, registry
+
+# NOTE: redis is optional, it's only needed when RATE_LIMIT_REDIS_URL is set
+try:
+    from redis import asyncio as redis_asyncio
+except ImportError:
+    redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+admission_rejections = registry.register(
+    Counter(
+        "admission_rejections_total",
+        "Requests turned away before reaching a route, by reason",
+        ("reason",),
+    )
+)
+admission_in_flight = registry.register(
+    Gauge("admission_in_flight", "Requests admitted and not yet finished")
+)
+
+
+@dataclass(frozen=True)
+class Limit:
+    """
+    A token bucket: `rate` tokens a second, holding at most `burst`.
+    """
+
+    name: str
+    rate: float
+    burst: float
+
+
+class MemoryTokenBuckets:
+    """
+    Token buckets kept in the worker, with an LRU cap on the number of keys.
+
+    Each worker counts on its own, so with N workers a client gets up to
+    N times the limit; set RATE_LIMIT_REDIS_URL to share the buckets.
+    """
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        # NOTE: key -> (tokens, monotonic time of the last refill)
+        self._buckets: OrderedDict[
+            str, tuple[float, float]
+        ] = OrderedDict()
+
+    async def acquire(self, key: str, limit: Limit) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (limit.burst, now))
+        tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / limit.rate
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+# NOTE: refill and take in one script so concurrent workers can't both
+# NOTE: spend the last token; the wait is returned as a string because
+# NOTE: redis truncates lua numbers to integers
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return tostring(wait)
+"""
+
+
+class RedisTokenBuckets:
+    """
+    Token buckets shared by every worker.
+
+    If redis can't be reached the request is let through, so an outage of
+    the limiter doesn't become an outage of the API.
+    """
+
+    def __init__(self, url: str, prefix: str):
+        if redis_asyncio is None:
+            raise RuntimeError(
+                "RATE_LIMIT_REDIS_URL is set but the redis package isn't installed"
+            )
+        self.client = redis_asyncio.from_url(url)
+        self.script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+        self.prefix = prefix
+
+    async def acquire(self, key: str, limit: Limit) -> float:
+        try:
+            wait = await self.script(
+                keys=[self.prefix + key],
+                args=[limit.rate, limit.burst, time.time()],
+            )
+        except Exception:
+            logger.warning("Rate limiter unavailable", exc_info=True)
+            return 0.0
+        return float(wait)
+
+
+def create_token_buckets() -> Any:
+    if settings.RATE_LIMIT_REDIS_URL:
+        return RedisTokenBuckets(
+            settings.RATE_LIMIT_REDIS_URL, prefix="ratelimit:"
+        )
+    return MemoryTokenBuckets(settings.RATE_LIMIT_MAX_KEYS)
+
+
+USER_LIMIT = Limit(
+    "user", settings.RATE_LIMIT_USER_RATE, settings.RATE_LIMIT_USER_BURST
+)
+IP_LIMIT = Limit(
+    "ip", settings.RATE_LIMIT_IP_RATE, settings.RATE_LIMIT_IP_BURST
+)
+# NOTE: each of these costs a bcrypt hash, so they get their own much
+# NOTE: smaller bucket per client on top of the general one
+ROUTE_LIMITS = {
+    ("POST", "/auth/login"): Limit(
+        "login",
+        settings.RATE_LIMIT_LOGIN_RATE,
+        settings.RATE_LIMIT_LOGIN_BURST,
+    ),
+    ("POST", "/user/"): Limit(
+        "signup",
+        settings.RATE_LIMIT_SIGNUP_RATE,
+        settings.RATE_LIMIT_SIGNUP_BURST,
+    ),
+}
+# NOTE: probes and scrapes must keep answering while the app sheds load
+EXEMPT_PATHS = frozenset(["/health/live", "/health/ready", "/metrics"])
+
+
+def client_ip(scope: Scope, headers: dict[bytes, bytes]) -> str:
+    # NOTE: only trust X-Forwarded-For behind a proxy that sets it,
+    # NOTE: otherwise any client could pick its own bucket
+    if settings.RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = headers.get(b"x-forwarded-for")
+        if forwarded:
+            return forwarded.split(b",")[0].strip().decode("latin-1")
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def token_username(headers: dict[bytes, bytes]) -> Optional[str]:
+    """
+    The username in a valid bearer token, if the request has one.
+
+    The signature is checked so nobody can spend someone else's bucket;
+    an invalid token is simply treated as anonymous, the route's auth
+    dependency is what rejects it.
+    """
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        payload = jwt.decode(
+            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+        )
+    except JWTError:
+        return None
+    username = payload.get("username")
+    return username if isinstance(username, str) else None
+
+
+async def reject(
+    send: Send, status_code: int, detail: str, retry_after: float
+) -> None:
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                # NOTE: whole seconds, rounded up so a retry finds a token
+                (
+                    b"retry-after",
+                    str(max(1, math.ceil(retry_after))).encode(),
+                ),
+            ],
+        }
+    )
+    await send(
+        {
+            "type": "http.response.body",
+            "body": orjson.dumps({"detail": detail}),
+        }
+    )
+
+
+class AdmissionMiddleware:
+    """
+    Sheds load before any route work starts.
+
+    Over ADMISSION_MAX_IN_FLIGHT requests in the worker get a 503 straight
+    away instead of queueing behind the rest, which keeps the latency of
+    the admitted ones bounded. Clients over their token bucket get a 429:
+    per user with a valid bearer token, per IP otherwise, plus stricter
+    buckets for login and sign up. Both carry a Retry-After.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.max_in_flight = settings.ADMISSION_MAX_IN_FLIGHT
+        self.buckets = (
+            create_token_buckets() if settings.RATE_LIMIT_ENABLED else None
+        )
+        self.in_flight = 0
+
+    async def rate_limit_wait(self, scope: Scope) -> tuple[str, float]:
+        headers = dict(scope["headers"])
+        ip = client_ip(scope, headers)
+        route_limit = ROUTE_LIMITS.get((scope["method"], scope["path"]))
+        if route_limit is not None:
+            wait = await self.buckets.acquire(
+                f"{route_limit.name}:{ip}", route_limit
+            )
+            if wait:
+                return route_limit.name, wait
+
+        username = token_username(headers)
+        if username is not None:
+            key, limit = f"user:{username}", USER_LIMIT
+        else:
+            key, limit = f"ip:{ip}", IP_LIMIT
+        return limit.name, await self.buckets.acquire(key, limit)
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            admission_rejections.inc("overloaded")
+            await reject(
+                send,
+                503,
+                "Server Overloaded",
+                settings.ADMISSION_RETRY_AFTER_SECONDS,
+            )
+            return
+
+        # NOTE: counted before the limiter runs since a redis round trip
+        # NOTE: is work in flight too
+        self.in_flight += 1
+        admission_in_flight.inc()
+        try:
+            if self.buckets is not None:
+                limit_name, wait = await self.rate_limit_wait(scope)
+                if wait:
+                    admission_rejections.inc(f"rate_limit_{limit_name}")
+                    await reject(send, 429, "Too Many Requests", wait)
+                    return
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            admission_in_flight.dec()
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Optional
+from bson.objectid import ObjectId
+from pymongo import WriteConcern
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteError
+from .metrics import Histogram, registry
+
+logger = logging.getLogger(__name__)
+
+insert_batch_size = registry.register(
+    Histogram(
+        "mongo_insert_batch_size",
+        "Documents written per insert_many by the insert batchers",
+        ("collection",),
+        buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+    )
+)
+
+# NOTE: "default" leaves the write concern of the client/connection string
+DURABILITY_MODES = {
+    "default": None,
+    # NOTE: acknowledged by the primary, may still be lost on a failover
+    "acknowledged": WriteConcern(w=1),
+    # NOTE: in the primary's journal, survives a crash of the primary
+    "journaled": WriteConcern(w=1, j=True),
+    # NOTE: on a majority of the replica set, survives a failover
+    "majority": WriteConcern(w="majority"),
+}
+DUPLICATE_KEY_ERROR = 11000
+
+
+def write_error_exception(write_error: dict[str, Any]) -> WriteError:
+    # NOTE: the same exceptions insert_one raises, so callers handle
+    # NOTE: a batched insert exactly like a single one
+    error_class = (
+        DuplicateKeyError
+        if write_error["code"] == DUPLICATE_KEY_ERROR
+        else WriteError
+    )
+    return error_class(
+        write_error["errmsg"], write_error["code"], write_error
+    )
+
+
+class InsertBatcher:
+    """
+    Group commit for inserts into one collection.
+
+    Concurrent `insert` calls are buffered for up to `max_delay_seconds`
+    or `max_batch_size` documents, whichever comes first, then written
+    with one unordered insert_many: one round trip and one journal commit
+    for the whole batch instead of one per document. Every caller gets
+    its own inserted _id back, or its own exception if just its document
+    failed.
+
+    Args:
+        collection (Any): The collection to insert into.
+        max_batch_size (int): Flush as soon as this many documents are waiting.
+        max_delay_seconds (float): Flush at most this long after the first document arrived.
+        durability (str): One of DURABILITY_MODES, the write concern of the batches.
+        after_insert (Callable, optional): Awaited with the inserted documents before the callers are answered.
+    """
+
+    def __init__(
+        self,
+        collection: Any,
+        max_batch_size: int,
+        max_delay_seconds: float,
+        durability: str = "default",
+        after_insert: Optional[
+            Callable[[list[dict]], Awaitable[None]]
+        ] = None,
+    ):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(
+                f"Unknown durability {durability!r}, "
+                f"expected one of {', '.join(DURABILITY_MODES)}"
+            )
+        self.collection = collection
+        self.max_batch_size = max_batch_size
+        self.max_delay_seconds = max_delay_seconds
+        self.write_concern = DURABILITY_MODES[durability]
+        self.after_insert = after_insert
+        self.pending: list[tuple[dict, asyncio.Future]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.writes: set[asyncio.Task] = set()
+
+    async def insert(self, document: dict) -> ObjectId:
+        """
+        Queue a document for the next batch.
+
+        Parameters:
+            document (dict): The document, given an _id here if it has none.
+
+        Returns:
+            ObjectId: The _id of the inserted document.
+
+        Raises:
+            WriteError: If this document couldn't be inserted, e.g. DuplicateKeyError.
+            PyMongoError: If the whole batch failed.
+        """
+        loop = asyncio.get_running_loop()
+        # NOTE: set client side, so the batch result doesn't have to be
+        # NOTE: matched back to the callers
+        document.setdefault("_id", ObjectId())
+        future = loop.create_future()
+        self.pending.append((document, future))
+
+        if len(self.pending) >= self.max_batch_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(
+                self.max_delay_seconds, self.flush
+            )
+
+        # NOTE: shielded, a caller going away doesn't pull its document
+        # NOTE: out of a batch that may already be on the wire
+        return await asyncio.shield(future)
+
+    def flush(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        task = asyncio.ensure_future(self.write(batch))
+        # NOTE: kept until done so the task isn't garbage collected mid write
+        self.writes.add(task)
+        task.add_done_callback(self.writes.discard)
+
+    async def write(
+        self, batch: list[tuple[dict, asyncio.Future]]
+    ) -> None:
+        # NOTE: None until the insert_many outcome is known; every future
+        # NOTE: is resolved in the finally, whatever fails on the way
+        errors: Optional[dict[int, BaseException]] = None
+        try:
+            documents = [document for document, _ in batch]
+            collection = self.collection
+            if self.write_concern is not None:
+                collection = collection.with_options(
+                    write_concern=self.write_concern
+                )
+            insert_batch_size.observe(len(documents), collection.name)
+
+            try:
+                # NOTE: unordered so one bad document doesn't fail the rest
+                await collection.insert_many(documents, ordered=False)
+                errors = {}
+            except BulkWriteError as bulk_error:
+                errors = {
+                    write_error["index"]: write_error_exception(
+                        write_error
+                    )
+                    for write_error in bulk_error.details["writeErrors"]
+                }
+
+            inserted = [
+                document
+                for index, document in enumerate(documents)
+                if index not in errors
+            ]
+            if inserted and self.after_insert is not None:
+                try:
+                    await self.after_insert(inserted)
+                except Exception:
+                    logger.exception("after_insert failed for a batch")
+        except Exception as error:
+            if errors is None:
+                errors = {index: error for index in range(len(batch))}
+        finally:
+            for index, (document, future) in enumerate(batch):
+                if future.done():
+                    continue
+                if errors is None:
+                    # NOTE: cancelled mid write, whether it landed is unknown
+                    future.cancel()
+                elif index in errors:
+                    future.set_exception(errors[index])
+                else:
+                    future.set_result(document["_id"])
+
+    async def close(self) -> None:
+        # NOTE: on shutdown, writes what's buffered and waits for every batch
+        self.flush()
+        if self.writes:
+            await asyncio.gather(*self.writes, return_exceptions=True)
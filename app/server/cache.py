@@ -0,0 +1,134 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+import bson
+from .config import settings
+
+# NOTE: redis is optional, it's only needed when USER_CACHE_REDIS_URL is set
+try:
+    from redis import asyncio as redis_asyncio
+except ImportError:
+    redis_asyncio = None
+
+
+class MemoryCache:
+    """
+    In-process cache with a TTL per entry and an LRU size cap.
+
+    Each worker has its own copy, so an invalidation only reaches the
+    worker it ran on; the TTL bounds how stale the other workers can be.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+    async def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        # NOTE: a copy so a caller mutating the dict can't change the cached one
+        return dict(value)
+
+    async def set(self, key: str, value: dict) -> None:
+        self._entries[key] = (
+            self.clock() + self.ttl_seconds,
+            dict(value),
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisCache:
+    """
+    Cache shared by every worker, documents are stored BSON encoded.
+    """
+
+    def __init__(self, url: str, ttl_seconds: float, prefix: str):
+        if redis_asyncio is None:
+            raise RuntimeError(
+                "USER_CACHE_REDIS_URL is set but the redis package isn't installed"
+            )
+        self.client = redis_asyncio.from_url(url)
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[dict]:
+        raw = await self.client.get(self.prefix + key)
+        return bson.decode(raw) if raw is not None else None
+
+    async def set(self, key: str, value: dict) -> None:
+        await self.client.set(
+            self.prefix + key,
+            bson.encode(value),
+            px=int(self.ttl_seconds * 1000),
+        )
+
+    async def delete(self, key: str) -> None:
+        await self.client.delete(self.prefix + key)
+
+
+class UserCache:
+    """
+    Caches user documents by username for the auth dependency.
+
+    Args:
+        backend (MemoryCache | RedisCache): Where the documents are kept.
+    """
+
+    def __init__(self, backend: Any):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, username: str) -> Optional[dict]:
+        user_data = await self.backend.get(username)
+        if user_data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return user_data
+
+    async def set(self, username: str, user_data: dict) -> None:
+        await self.backend.set(username, user_data)
+
+    # NOTE: call this whenever a user document is created or changed
+    async def invalidate(self, username: str) -> None:
+        await self.backend.delete(username)
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def create_user_cache() -> UserCache:
+    ttl_seconds = settings.USER_CACHE_TTL_SECONDS
+    redis_url = settings.USER_CACHE_REDIS_URL
+    if redis_url:
+        return UserCache(
+            RedisCache(redis_url, ttl_seconds, prefix="user:")
+        )
+
+    max_size = settings.USER_CACHE_MAX_SIZE
+    return UserCache(MemoryCache(max_size, ttl_seconds))
+
+
+user_cache = create_user_cache()
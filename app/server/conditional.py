@@ -0,0 +1,159 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Iterable, Optional
+from fastapi import status, HTTPException, Request, Response
+
+# NOTE: posts written before versioning existed have no version field,
+# NOTE: they're treated as version 0 until their next update
+LEGACY_VERSION = 0
+
+
+def document_version(document: dict) -> int:
+    return document.get("version", LEGACY_VERSION)
+
+
+# NOTE: mongo hands datetimes back naive, they're always UTC; aware ones
+# NOTE: like ObjectId.generation_time carry bson's own utc tzinfo, which
+# NOTE: format_datetime(usegmt=True) rejects, so they're converted too
+def as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def document_last_modified(document: dict) -> datetime:
+    last_modified = document.get("last_modified")
+    if isinstance(last_modified, datetime):
+        return as_utc(last_modified)
+    # NOTE: legacy posts fall back to when their ObjectId was generated
+    return document["_id"].generation_time
+
+
+def document_etag(document: dict, variant: str = "") -> str:
+    """
+    A strong ETag for one post.
+
+    Args:
+        document (dict): The post document.
+        variant (str): Anything else that changes the body, e.g. the requested fields.
+
+    Returns:
+        str: The quoted ETag, "<id>-<version>" for the full post.
+    """
+    etag = f"{document['_id']}-{document_version(document)}"
+    if variant:
+        # NOTE: a partial body must never validate a cached full one
+        etag += f"-{hashlib.sha1(variant.encode()).hexdigest()}"
+    return f'"{etag}"'
+
+
+def list_etag(documents: Iterable[dict], variant: str = "") -> str:
+    """
+    A strong ETag for a list response.
+
+    Args:
+        documents (Iterable[dict]): The documents in the list, in order.
+        variant (str): Anything else that changes the body, e.g. the requested fields.
+
+    Returns:
+        str: The quoted ETag.
+    """
+    digest = hashlib.sha1(variant.encode())
+    for document in documents:
+        digest.update(document_etag(document).encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(as_utc(value), usegmt=True)
+
+
+def validator_headers(
+    etag: str, last_modified: Optional[datetime]
+) -> dict[str, str]:
+    if last_modified is None:
+        return {"ETag": etag}
+    return {"ETag": etag, "Last-Modified": http_date(last_modified)}
+
+
+def is_not_modified(
+    request: Request, etag: str, last_modified: Optional[datetime]
+) -> bool:
+    """
+    Checks If-None-Match, or If-Modified-Since when there is no If-None-Match.
+
+    Args:
+        request (Request): The incoming request.
+        etag (str): The current ETag of the resource.
+        last_modified (Optional[datetime]): When the resource last changed, if known.
+
+    Returns:
+        bool: True if the client's copy is current and a 304 should be sent.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # NOTE: If-None-Match uses the weak comparison so a W/ prefix is ignored
+        candidates = [
+            candidate.strip().removeprefix("W/")
+            for candidate in if_none_match.split(",")
+        ]
+        return "*" in candidates or etag in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = as_utc(parsedate_to_datetime(if_modified_since))
+    except (TypeError, ValueError):
+        return False
+    # NOTE: HTTP dates only have second precision
+    return as_utc(last_modified).replace(microsecond=0) <= since
+
+
+def not_modified_response(headers: dict[str, str]) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED, headers=headers
+    )
+
+
+def parse_if_match(if_match: Optional[str], post_id: str) -> Optional[int]:
+    """
+    Reads the version a client expects a post to still have.
+
+    Args:
+        if_match (str, optional): The If-Match header.
+        post_id (str): The ID of the post being changed.
+
+    Returns:
+        Optional[int]: The expected version, or None when any version will do.
+
+    Raises:
+        HTTPException: 412 if the header can't be the ETag of this post.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+
+    etag = if_match.strip()
+    prefix = f'"{post_id}-'
+    version = etag[len(prefix) : -1]
+    if (
+        etag.startswith(prefix)
+        and etag.endswith('"')
+        and version.isdigit()
+    ):
+        return int(version)
+
+    raise HTTPException(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        detail="Precondition Failed",
+    )
+
+
+def version_filter(expected_version: Optional[int]) -> dict[str, Any]:
+    if expected_version is None:
+        return {}
+    if expected_version == LEGACY_VERSION:
+        # NOTE: $in with None also matches posts without a version field
+        return {"version": {"$in": [None, LEGACY_VERSION]}}
+    return {"version": expected_version}
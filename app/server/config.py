@@ -1,10 +1,135 @@
+from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
+    """
+    Every setting the app reads, from the environment or the .env file.
+
+    Environment variables win over .env, the names match the field names.
+    """
+
     model_config = SettingsConfigDict(
         extra="allow", env_file=".env", env_file_encoding="utf-8"
     )
 
+    # NOTE: database
+    ATLAS_URI: str
+    CLUSTER_DB_NAME: str
+    POSTS_COLLECTION_NAME: str
+    USERS_COLLECTION_NAME: str
+    COUNTERS_COLLECTION_NAME: str = "counters"
+    FEED_COLLECTION_NAME: str = "feed"
+
+    # NOTE: connection pool, see database.py; timeouts are in milliseconds
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 10
+    MONGO_MAX_IDLE_TIME_MS: Optional[int] = 300_000
+    MONGO_MAX_CONNECTING: int = 2
+    MONGO_CONNECT_TIMEOUT_MS: int = 5_000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5_000
+    MONGO_SOCKET_TIMEOUT_MS: Optional[int] = 30_000
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: Optional[int] = 2_000
+    # NOTE: comma separated, in order of preference, e.g. "zstd,snappy,zlib";
+    # NOTE: zstd and snappy need their python packages installed
+    MONGO_COMPRESSORS: str = "zlib"
+    # NOTE: primary, primaryPreferred, secondary, secondaryPreferred or nearest
+    MONGO_READ_PREFERENCE: str = "primary"
+    MONGO_APP_NAME: str = "fastapi-posts"
+    # NOTE: how long /health/ready waits on a ping before calling the db down
+    MONGO_HEALTH_TIMEOUT_SECONDS: float = 2.0
+
+    # NOTE: production server, see run.py --prod; workers 0 means one per core,
+    # NOTE: loop is auto, uvloop or asyncio and http auto, httptools or h11
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0
+    SERVER_LOOP: str = "auto"
+    SERVER_HTTP: str = "auto"
+    SERVER_BACKLOG: int = 2048
+    SERVER_KEEP_ALIVE_SECONDS: int = 5
+    SERVER_GRACEFUL_SHUTDOWN_SECONDS: int = 30
+    SERVER_ACCESS_LOG: bool = False
+
+    # NOTE: auth
+    SECRET_KEY: str
+    ALGORITHM: str
+    ACCESS_TOKEN_EXPIRE_MINUTES: int
+
+    # NOTE: password hashing, see utils.py
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_EXECUTOR: str = "thread"
+    PASSWORD_HASH_WORKERS: Optional[int] = None
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+
+    # NOTE: user cache, see cache.py
+    USER_CACHE_TTL_SECONDS: float = 60
+    USER_CACHE_MAX_SIZE: int = 1024
+    USER_CACHE_REDIS_URL: Optional[str] = None
+
+    # NOTE: admission control and rate limits, see admission.py;
+    # NOTE: rates are tokens per second, bursts the bucket size
+    ADMISSION_MAX_IN_FLIGHT: int = 256
+    ADMISSION_RETRY_AFTER_SECONDS: float = 1
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_USER_RATE: float = 20
+    RATE_LIMIT_USER_BURST: float = 40
+    RATE_LIMIT_IP_RATE: float = 10
+    RATE_LIMIT_IP_BURST: float = 20
+    RATE_LIMIT_LOGIN_RATE: float = 0.2
+    RATE_LIMIT_LOGIN_BURST: float = 5
+    RATE_LIMIT_SIGNUP_RATE: float = 0.05
+    RATE_LIMIT_SIGNUP_BURST: float = 3
+    RATE_LIMIT_MAX_KEYS: int = 100_000
+    RATE_LIMIT_REDIS_URL: Optional[str] = None
+    # NOTE: only behind a proxy that sets X-Forwarded-For itself
+    RATE_LIMIT_TRUST_FORWARDED: bool = False
+
+    # NOTE: per request profiling, see profiling.py; requests are profiled
+    # NOTE: with a signed X-Profile header, or 1 in PROFILING_SAMPLE_RATE
+    PROFILING_ENABLED: bool = False
+    PROFILING_SECRET: Optional[str] = None
+    PROFILING_SAMPLE_RATE: int = 0
+    PROFILING_INTERVAL_MS: float = 1
+    PROFILING_DIR: str = "profiles"
+    PROFILING_MAX_PROFILES: int = 50
+    PROFILING_TOP_FRAMES: int = 25
+
+    # NOTE: query diagnostics, see query_diagnostics.py; every query shape
+    # NOTE: is explained once, and again every QUERY_EXPLAIN_INTERVAL_SECONDS
+    # NOTE: if that isn't 0, queries over SLOW_QUERY_MS are logged
+    QUERY_DIAGNOSTICS_ENABLED: bool = False
+    SLOW_QUERY_MS: float = 100
+    QUERY_EXPLAIN_INTERVAL_SECONDS: float = 0
+    QUERY_MAX_EXAMINED_RATIO: float = 10
+    QUERY_DIAGNOSTICS_MAX_SHAPES: int = 1000
+
+    # NOTE: posts
+    EXPORT_BATCH_SIZE: int = 500
+    BULK_MAX_BATCH_SIZE: int = 1000
+    # NOTE: the largest ?limit= of GET /post/
+    LIST_MAX_LIMIT: int = 100
+    # NOTE: group commit for POST /post/, see batching.py; durability is
+    # NOTE: default, acknowledged, journaled or majority
+    INSERT_BATCH_ENABLED: bool = False
+    INSERT_BATCH_MAX_SIZE: int = 100
+    INSERT_BATCH_MAX_DELAY_MS: float = 5
+    INSERT_BATCH_DURABILITY: str = "default"
+    # NOTE: public feed, see feed_repository.py; the newest FEED_HOT_WINDOW
+    # NOTE: entries are cached per worker for FEED_CACHE_TTL_SECONDS
+    FEED_HOT_WINDOW: int = 200
+    FEED_CACHE_TTL_SECONDS: float = 2
+    FEED_MAX_LIMIT: int = 100
+    # NOTE: how long a search's total is reused for the ?envelope=true response
+    FILTERED_COUNT_TTL_SECONDS: float = 30
+    FILTERED_COUNT_CACHE_SIZE: int = 4096
+    # NOTE: content storage, see content.py; compression is none, zlib or
+    # NOTE: zstd (needs the zstandard package) and only applies to content
+    # NOTE: of at least CONTENT_COMPRESSION_MIN_BYTES
+    CONTENT_COMPRESSION: str = "none"
+    CONTENT_COMPRESSION_MIN_BYTES: int = 2048
+    CONTENT_COMPRESSION_LEVEL: int = 6
+    CONTENT_EXCERPT_LENGTH: int = 200
+
 
 settings = Settings()
@@ -0,0 +1,185 @@
+import argparse
+import asyncio
+import zlib
+from typing import Any, Optional
+from bson.binary import Binary
+from .config import settings
+
+# NOTE: zstandard is optional, it's only needed for CONTENT_COMPRESSION=zstd
+# NOTE: or to read posts that were stored with it
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# NOTE: a post's content is stored either as a plain "content" string or,
+# NOTE: when it's at least CONTENT_COMPRESSION_MIN_BYTES long, as the
+# NOTE: compressed "content_z" bytes plus the "content_codec" that made them.
+# NOTE: Either way the post also gets an "excerpt", so list views can ask
+# NOTE: for ?fields=...,excerpt and never read the full content at all.
+# NOTE: Clients always see a plain "content", see `decode_content`.
+CODECS = ("none", "zlib", "zstd")
+STORED_CONTENT_FIELDS = ("content", "content_z", "content_codec")
+
+
+def compress(codec: str, data: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.compress(data, settings.CONTENT_COMPRESSION_LEVEL)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError(
+                "CONTENT_COMPRESSION=zstd needs the zstandard package"
+            )
+        return zstandard.ZstdCompressor(
+            level=settings.CONTENT_COMPRESSION_LEVEL
+        ).compress(data)
+    raise ValueError(
+        f"Unknown codec {codec!r}, expected one of {', '.join(CODECS)}"
+    )
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError(
+                "Reading zstd compressed posts needs the zstandard package"
+            )
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown codec {codec!r}")
+
+
+def make_excerpt(content: str, length: int) -> str:
+    """
+    The start of `content`, cut at a word boundary.
+
+    Args:
+        content (str): The full content.
+        length (int): The longest excerpt, in characters, "…" not included.
+
+    Returns:
+        str: The whitespace-collapsed content if it fits, else its first words and "…".
+    """
+    text = " ".join(content.split())
+    if len(text) <= length:
+        return text
+    cut = text[:length]
+    # NOTE: a single word longer than the excerpt is cut where it is
+    if " " in cut:
+        cut = cut[: cut.rindex(" ")]
+    return cut.rstrip() + "…"
+
+
+def encode_content(
+    fields: dict[str, Any]
+) -> tuple[dict[str, Any], list[str]]:
+    """
+    Turns post fields with a plain "content" into their stored form.
+
+    Args:
+        fields (dict): A new post or the changes of an update.
+
+    Returns:
+        tuple: The fields to store and, for updates, the fields to $unset
+        because the content moved between its plain and compressed form.
+        Fields without "content" come back as they are.
+    """
+    if "content" not in fields:
+        return fields, []
+
+    stored = {
+        name: value for name, value in fields.items() if name != "content"
+    }
+    content = fields["content"]
+    stored["excerpt"] = make_excerpt(
+        content, settings.CONTENT_EXCERPT_LENGTH
+    )
+
+    codec = settings.CONTENT_COMPRESSION
+    raw = content.encode()
+    if (
+        codec != "none"
+        and len(raw) >= settings.CONTENT_COMPRESSION_MIN_BYTES
+    ):
+        compressed = compress(codec, raw)
+        # NOTE: incompressible content (already compressed, random) stays plain
+        if len(compressed) < len(raw):
+            stored["content_z"] = Binary(compressed)
+            stored["content_codec"] = codec
+            return stored, ["content"]
+
+    stored["content"] = content
+    return stored, ["content_z", "content_codec"]
+
+
+def decode_content(document: dict[str, Any]) -> dict[str, Any]:
+    """
+    Puts a plain "content" back on a post read from Mongo, in place.
+
+    Args:
+        document (dict): The post document, possibly with compressed content.
+
+    Returns:
+        dict: The same document, "content_z" and "content_codec" replaced by "content".
+    """
+    compressed = document.pop("content_z", None)
+    codec = document.pop("content_codec", None)
+    if compressed is not None:
+        document["content"] = decompress(codec, compressed).decode()
+    return document
+
+
+def stored_projection(
+    projection: Optional[dict[str, int]]
+) -> Optional[dict[str, int]]:
+    # NOTE: content may live in either field, the compressed one is only
+    # NOTE: fetched (and decompressed) when the caller asked for content
+    if projection is None or "content" not in projection:
+        return projection
+    return {
+        **projection,
+        **{name: 1 for name in STORED_CONTENT_FIELDS},
+    }
+
+
+# NOTE: run from the app directory, e.g.
+# NOTE: python -m server.content --migrate
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Store existing posts the way new ones are: add their excerpt "
+            f"and compress content per CONTENT_COMPRESSION "
+            f"({settings.CONTENT_COMPRESSION})"
+        )
+    )
+    parser.add_argument(
+        "--migrate",
+        action="store_true",
+        required=True,
+        help="rewrite posts whose stored form is out of date",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="posts rewritten per bulk write",
+    )
+    args = parser.parse_args()
+
+    # NOTE: imported here, the repositories import this module
+    from .database import mongo
+    from .repositories.post_repository import migrate_post_content
+
+    async def run() -> int:
+        mongo.connect()
+        try:
+            return await migrate_post_content(args.batch_size)
+        finally:
+            mongo.close()
+
+    print(f"migrated {asyncio.run(run())} posts")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,158 @@
-from pymongo import MongoClient
+import logging
+import time
+from typing import Any, Optional
+from motor.motor_asyncio import (
+    AsyncIOMotorClient,
+    AsyncIOMotorCollection,
+    AsyncIOMotorDatabase,
+)
+from .config import settings
+from .metrics import mongo_command_listener, mongo_pool_listener
+from .query_diagnostics import query_diagnostics
 
-from dotenv import dotenv_values
+logger = logging.getLogger(__name__)
 
-# from config import settings
 
-env_config = dotenv_values(".env")
+def client_options() -> dict[str, Any]:
+    """
+    The MongoClient keyword arguments built from settings.
 
-# NOTE: connects to the mongo database here using MONGODB ATLAS so db is in the cloud
-# mongo_client = MongoClient(settings.ATLAS_URI)
-# print("Connected to MongoDB... Success!")
+    Options left unset (None) fall back to the driver defaults.
 
-# db = mongo_client[settings.CLUSTER_DB_NAME]
-# posts_coll = db[settings.POSTS_COLLECTION_NAME]
-# users_coll = db[settings.USERS_COLLECTION_NAME]
+    Returns:
+        dict: The options to create the client with.
+    """
+    options = {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": settings.MONGO_MAX_IDLE_TIME_MS,
+        "maxConnecting": settings.MONGO_MAX_CONNECTING,
+        "connectTimeoutMS": settings.MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": settings.MONGO_SOCKET_TIMEOUT_MS,
+        "waitQueueTimeoutMS": settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "compressors": settings.MONGO_COMPRESSORS or None,
+        "readPreference": settings.MONGO_READ_PREFERENCE,
+        "appname": settings.MONGO_APP_NAME,
+    }
+    return {
+        key: value for key, value in options.items() if value is not None
+    }
 
-mongo_client = MongoClient(f"{env_config['ATLAS_URI']}")
-print("Connected to MongoDB... Success!")
 
-db = mongo_client[f"{env_config['CLUSTER_DB_NAME']}"]
-posts_coll = db[f"{env_config['POSTS_COLLECTION_NAME']}"]
-users_coll = db[f"{env_config['USERS_COLLECTION_NAME']}"]
+class Mongo:
+    """
+    Owns the one MongoClient of the process.
+
+    Nothing connects at import time: the lifespan handler in main.py calls
+    `connect` and `warm_up` before the first request and `close` on
+    shutdown, so the pool is already open when traffic arrives.
+    """
+
+    def __init__(self):
+        self.client: Optional[AsyncIOMotorClient] = None
+        self.collections: dict[str, AsyncIOMotorCollection] = {}
+
+    def connect(self) -> AsyncIOMotorClient:
+        if self.client is None:
+            # NOTE: motor wraps pymongo so every query is awaited instead of blocking the event loop
+            # NOTE: times every command and tracks the pool for /metrics and /health/ready
+            listeners: list[Any] = [
+                mongo_command_listener,
+                mongo_pool_listener,
+            ]
+            if settings.QUERY_DIAGNOSTICS_ENABLED:
+                listeners.append(query_diagnostics)
+            self.client = AsyncIOMotorClient(
+                settings.ATLAS_URI,
+                event_listeners=listeners,
+                **client_options(),
+            )
+            if settings.QUERY_DIAGNOSTICS_ENABLED:
+                # NOTE: explains run on their own thread, through the
+                # NOTE: synchronous pymongo client motor wraps
+                query_diagnostics.attach(self.client.delegate)
+        return self.client
+
+    @property
+    def db(self) -> AsyncIOMotorDatabase:
+        if self.client is None:
+            raise RuntimeError(
+                "MongoDB client isn't connected, see Mongo.connect"
+            )
+        return self.client[settings.CLUSTER_DB_NAME]
+
+    def collection(self, name: str) -> AsyncIOMotorCollection:
+        collection = self.collections.get(name)
+        if collection is None:
+            collection = self.collections[name] = self.db[name]
+        return collection
+
+    async def ping(self) -> float:
+        """
+        Round trip to the server.
+
+        Returns:
+            float: The round trip time in seconds.
+
+        Raises:
+            PyMongoError: If no server could be reached.
+        """
+        start = time.perf_counter()
+        await self.db.command("ping")
+        return time.perf_counter() - start
+
+    async def warm_up(self) -> bool:
+        """
+        Selects a server and opens the first connection.
+
+        minPoolSize takes care of opening the rest in the background.
+
+        Returns:
+            bool: False if the server couldn't be reached, the app still
+            starts and /health/ready reports it until the server is back.
+        """
+        try:
+            elapsed = await self.ping()
+        except Exception:
+            logger.exception("MongoDB warm up failed")
+            return False
+        logger.info("Connected to MongoDB in %.1f ms", elapsed * 1000)
+        return True
+
+    def close(self) -> None:
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+            self.collections.clear()
+
+
+mongo = Mongo()
+
+
+class LazyCollection:
+    """
+    Stands in for a collection of `mongo` so modules can keep importing
+    `posts_coll` and `users_coll` before the client exists.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __getattr__(self, attribute: str) -> Any:
+        return getattr(mongo.collection(self.name), attribute)
+
+
+class LazyDatabase:
+    def __getitem__(self, name: str) -> AsyncIOMotorCollection:
+        return mongo.collection(name)
+
+    def __getattr__(self, attribute: str) -> Any:
+        return getattr(mongo.db, attribute)
+
+
+db: Any = LazyDatabase()
+posts_coll: Any = LazyCollection(settings.POSTS_COLLECTION_NAME)
+users_coll: Any = LazyCollection(settings.USERS_COLLECTION_NAME)
+counters_coll: Any = LazyCollection(settings.COUNTERS_COLLECTION_NAME)
+feed_coll: Any = LazyCollection(settings.FEED_COLLECTION_NAME)
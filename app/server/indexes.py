@@ -0,0 +1,212 @@
+import argparse
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+from pymongo import IndexModel, ASCENDING, TEXT
+from .database import db, mongo, posts_coll, users_coll
+
+logger = logging.getLogger(__name__)
+
+# NOTE: bump this whenever INDEXES changes so the applied version
+# NOTE: recorded in the database shows which definitions are live
+INDEX_VERSION = 2
+INDEX_VERSIONS_COLLECTION_NAME = "index_versions"
+
+# NOTE: every index the app relies on, keyed by the collection it lives on
+INDEXES: dict[str, list[IndexModel]] = {
+    "posts": [
+        # NOTE: owner scoped listing seeks and sorts on _id
+        IndexModel(
+            [("owner_id", ASCENDING), ("_id", ASCENDING)],
+            name="owner_id_id",
+        ),
+        # NOTE: owner_id is the prefix so a search only walks the owner's slice;
+        # NOTE: compressed content can't be indexed, its excerpt still is
+        IndexModel(
+            [
+                ("owner_id", ASCENDING),
+                ("title", TEXT),
+                ("excerpt", TEXT),
+                ("content", TEXT),
+            ],
+            name="owner_id_title_excerpt_content_text",
+            weights={"title": 10, "excerpt": 2, "content": 1},
+        ),
+    ],
+    "users": [
+        # NOTE: login, the auth dependency and GET /user/{user_name} all look up by username
+        IndexModel(
+            [("username", ASCENDING)], name="username_unique", unique=True
+        ),
+    ],
+}
+
+COLLECTIONS = {"posts": posts_coll, "users": users_coll}
+
+
+@dataclass
+class IndexReport:
+    collection: str
+    missing: list[str] = field(default_factory=list)
+    extra: list[str] = field(default_factory=list)
+    created: list[str] = field(default_factory=list)
+    dropped: list[str] = field(default_factory=list)
+
+
+def is_text_index(index: dict) -> bool:
+    # NOTE: defined as {field: "text"}, reported back as ("_fts", "text")
+    key = index["key"]
+    values = key.values() if isinstance(key, dict) else dict(key).values()
+    return TEXT in values
+
+
+async def check_indexes() -> list[IndexReport]:
+    """
+    Compare the indexes in the database against INDEXES.
+
+    Returns:
+        list[IndexReport]: One report per collection listing missing and extra index names.
+    """
+    reports = []
+    for name, index_models in INDEXES.items():
+        existing = await COLLECTIONS[name].index_information()
+        wanted = [index.document["name"] for index in index_models]
+        reports.append(
+            IndexReport(
+                collection=name,
+                missing=[
+                    index for index in wanted if index not in existing
+                ],
+                # NOTE: the _id index always exists and isn't ours to manage
+                extra=[
+                    index
+                    for index in existing
+                    if index not in wanted and index != "_id_"
+                ],
+            )
+        )
+    return reports
+
+
+async def apply_indexes(drop_extra: bool = False) -> list[IndexReport]:
+    """
+    Build missing indexes and record the applied INDEX_VERSION.
+
+    Args:
+        drop_extra (bool): Also drop indexes that aren't in INDEXES. Defaults to False.
+
+    Returns:
+        list[IndexReport]: The reports from `check_indexes` with what was created and dropped.
+    """
+    reports = await check_indexes()
+    for report in reports:
+        coll = COLLECTIONS[report.collection]
+        missing = [
+            index
+            for index in INDEXES[report.collection]
+            if index.document["name"] in report.missing
+        ]
+        if missing:
+            # NOTE: a collection can only have one text index, an outdated
+            # NOTE: one has to go before its replacement can be built
+            if any(is_text_index(index.document) for index in missing):
+                existing = await coll.index_information()
+                for index in report.extra:
+                    if is_text_index(existing[index]):
+                        await coll.drop_index(index)
+                        report.dropped.append(index)
+            report.created = await coll.create_indexes(missing)
+        if drop_extra:
+            for index in report.extra:
+                if index in report.dropped:
+                    continue
+                await coll.drop_index(index)
+                report.dropped.append(index)
+
+    await db[INDEX_VERSIONS_COLLECTION_NAME].update_one(
+        {"_id": "indexes"},
+        {
+            "$set": {
+                "version": INDEX_VERSION,
+                "applied_at": datetime.now(timezone.utc),
+            }
+        },
+        upsert=True,
+    )
+    return reports
+
+
+def log_reports(reports: list[IndexReport]) -> None:
+    for report in reports:
+        if report.created:
+            logger.info(
+                "%s: created indexes %s", report.collection, report.created
+            )
+        if report.dropped:
+            logger.info(
+                "%s: dropped indexes %s", report.collection, report.dropped
+            )
+        if report.extra and not report.dropped:
+            logger.warning(
+                "%s: indexes not in the definitions %s",
+                report.collection,
+                report.extra,
+            )
+
+
+async def bootstrap_indexes() -> Optional[str]:
+    # NOTE: runs as a background task on startup, so a failed or slow
+    # NOTE: build is logged instead of keeping the app from serving; the
+    # NOTE: name of the error is the task's result, for /health/ready
+    try:
+        log_reports(await apply_indexes())
+    except Exception as error:
+        logger.exception(
+            "Applying index definitions v%s failed", INDEX_VERSION
+        )
+        return type(error).__name__
+    return None
+
+
+# NOTE: run from the app directory, e.g. python -m server.indexes --apply
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=f"Check or apply the index definitions (v{INDEX_VERSION})"
+    )
+    parser.add_argument(
+        "--apply", action="store_true", help="build missing indexes"
+    )
+    parser.add_argument(
+        "--drop-extra",
+        action="store_true",
+        help="with --apply, also drop indexes that aren't defined",
+    )
+    args = parser.parse_args()
+
+    async def run() -> list[IndexReport]:
+        mongo.connect()
+        try:
+            if args.apply:
+                return await apply_indexes(drop_extra=args.drop_extra)
+            return await check_indexes()
+        finally:
+            mongo.close()
+
+    reports = asyncio.run(run())
+
+    for report in reports:
+        print(f"{report.collection}:")
+        print(f"  missing: {', '.join(report.missing) or '-'}")
+        print(f"  extra:   {', '.join(report.extra) or '-'}")
+        if args.apply:
+            print(f"  created: {', '.join(report.created) or '-'}")
+            print(f"  dropped: {', '.join(report.dropped) or '-'}")
+
+    if not args.apply and any(report.missing for report in reports):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
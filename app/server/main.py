@@ -1,9 +1,60 @@
+import asyncio
+import contextlib
+from typing import AsyncIterator
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import post_router, user_router, auth_router
+from .routers import post_router, user_router, auth_router, health_router
+from .database import mongo
+from .repositories.post_repository import post_inserts
+from .admission import AdmissionMiddleware
+from .profiling import ProfilingMiddleware
+from .config import settings
+from .pagination import NEXT_CURSOR_HEADER
+from .indexes import bootstrap_indexes
+from .utils import password_pool
+from .cache import user_cache
+from .oauth2 import user_lookups
+from .singleflight import collapse_ratio_collector
+from .metrics import (
+    MetricsMiddleware,
+    PROMETHEUS_CONTENT_TYPE,
+    cache_collector,
+    registry,
+)
+
+
+# NOTE: the mongo client is created and warmed here instead of at import,
+# NOTE: so workers start fast and the first request finds an open pool
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    mongo.connect()
+    await mongo.warm_up()
+    # NOTE: builds any missing indexes in the background so startup isn't blocked,
+    # NOTE: the task is kept on app.state so it isn't garbage collected mid build
+    app.state.index_bootstrap = asyncio.create_task(bootstrap_indexes())
+    try:
+        yield
+    finally:
+        app.state.index_bootstrap.cancel()
+        # NOTE: writes out any buffered creates before the client goes away
+        if post_inserts is not None:
+            await post_inserts.close()
+        password_pool.shutdown()
+        mongo.close()
+
 
 # NOTE: this creates the app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+# NOTE: innermost, so a profile covers the route and not the rate limiting;
+# NOTE: not added at all unless enabled so it costs nothing by default
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+# NOTE: 503 when the worker is saturated, 429 past a client's rate limit,
+# NOTE: added before CORS so the rejections still carry the CORS headers
+app.add_middleware(AdmissionMiddleware)
 
 # NOTE: this for CORS, used for when a diff lang frontend is used
 origins = ["*"]
@@ -14,6 +65,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # NOTE: browsers hide non-standard response headers unless exposed
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Retry-After"],
+)
+
+# NOTE: per route request counts, status codes, latency and requests in flight
+app.add_middleware(MetricsMiddleware)
+registry.register_collector(
+    cache_collector("user_cache", user_cache.stats)
+)
+registry.register_collector(
+    collapse_ratio_collector(post_router.post_reads, user_lookups)
 )
 
 # NOTE: these connect the main.py to the routers for posts, users and authentication
@@ -22,8 +84,17 @@ app.include_router(user_router.router, tags=["Users"], prefix="/user")
 app.include_router(
     auth_router.router, tags=["Authentication"], prefix="/auth"
 )
+app.include_router(health_router.router, tags=["Health"], prefix="/health")
 
 
 @app.get("/")
 async def root():
     return {"message": "Home Page"}
+
+
+# NOTE: prometheus scrapes this, see metrics.py for what's in it
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(
+        registry.render(), media_type=PROMETHEUS_CONTENT_TYPE
+    )
@@ -0,0 +1,427 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Iterable
+from pymongo import monitoring
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# NOTE: the prometheus client defaults, in seconds
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def escape_label(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+    )
+
+
+def format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{escape_label(value)}"'
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Metric:
+    """
+    Base for the metric types, values are kept per label tuple.
+
+    Updates can come from the event loop and from pymongo's monitoring
+    threads at the same time, so they go through a lock.
+    """
+
+    kind = ""
+
+    def __init__(
+        self, name: str, documentation: str, labels: tuple[str, ...] = ()
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.lock = threading.Lock()
+
+    def header(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+    def render(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self.lock:
+            self.values[label_values] = (
+                self.values.get(label_values, 0) + amount
+            )
+
+    def render(self) -> list[str]:
+        with self.lock:
+            values = list(self.values.items())
+        return self.header() + [
+            f"{self.name}{format_labels(self.labels, label_values)} {value}"
+            for label_values, value in values
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *label_values: str, amount: float = 1) -> None:
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, *label_values: str, value: float) -> None:
+        with self.lock:
+            self.values[label_values] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+        # NOTE: per label tuple: [count per bucket (last one is +Inf), sum]
+        self.values: dict[tuple[str, ...], list[Any]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(label_values)
+            if entry is None:
+                entry = self.values[label_values] = [
+                    [0] * (len(self.buckets) + 1),
+                    0.0,
+                ]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self) -> list[str]:
+        with self.lock:
+            values = [
+                (label_values, list(counts), total)
+                for label_values, (counts, total) in self.values.items()
+            ]
+
+        lines = self.header()
+        bucket_labels = self.labels + ("le",)
+        for label_values, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(
+                self.buckets + (float("inf"),), counts
+            ):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(
+                    f"{self.name}_bucket"
+                    f"{format_labels(bucket_labels, label_values + (le,))}"
+                    f" {cumulative}"
+                )
+            labels = format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[Metric] = []
+        # NOTE: collectors produce extra lines at scrape time, for stats
+        # NOTE: other modules already keep, e.g. the user cache counters
+        self.collectors: list[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric: Metric) -> Any:
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(
+        self, collector: Callable[[], Iterable[str]]
+    ) -> None:
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(
+    Counter(
+        "http_requests_total",
+        "HTTP requests by route and status code",
+        ("method", "route", "status"),
+    )
+)
+http_request_duration = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency by route",
+        ("method", "route"),
+    )
+)
+http_requests_in_flight = registry.register(
+    Gauge("http_requests_in_flight", "HTTP requests being handled")
+)
+mongo_command_duration = registry.register(
+    Histogram(
+        "mongo_command_duration_seconds",
+        "MongoDB command latency by collection and command",
+        ("collection", "command"),
+    )
+)
+mongo_command_failures = registry.register(
+    Counter(
+        "mongo_command_failures_total",
+        "MongoDB commands that failed, by collection and command",
+        ("collection", "command"),
+    )
+)
+
+mongo_pool_connections = registry.register(
+    Gauge(
+        "mongo_pool_connections",
+        "Open MongoDB connections by server",
+        ("address",),
+    )
+)
+mongo_pool_checked_out = registry.register(
+    Gauge(
+        "mongo_pool_checked_out_connections",
+        "MongoDB connections in use by server",
+        ("address",),
+    )
+)
+mongo_pool_ready = registry.register(
+    Gauge(
+        "mongo_pool_ready",
+        "1 while a server's pool is usable, 0 after it was cleared",
+        ("address",),
+    )
+)
+mongo_pool_checkout_failures = registry.register(
+    Counter(
+        "mongo_pool_checkout_failures_total",
+        "MongoDB connection check outs that failed, by server and reason",
+        ("address", "reason"),
+    )
+)
+
+
+def route_label(scope: Scope) -> str:
+    # NOTE: the route template, not the raw path, so ids don't blow up the label count
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Records count, status and latency per route, and requests in flight.
+
+    A plain ASGI middleware rather than BaseHTTPMiddleware so it adds a
+    couple of timer reads and dict updates per request and nothing else.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            route = route_label(scope)
+            http_requests.inc(scope["method"], route, str(status_code))
+            http_request_duration.observe(elapsed, scope["method"], route)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Times every MongoDB command by collection and command name.
+
+    The collection is only in the started event, so it's remembered per
+    request until the matching succeeded or failed event comes in.
+    """
+
+    def __init__(self):
+        self.pending: dict[tuple[Any, int], str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        # NOTE: most commands carry the collection under their own name,
+        # NOTE: getMore carries the cursor id there and the collection apart
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = event.command.get("collection", "")
+        self.pending[(event.connection_id, event.request_id)] = collection
+
+    def collection(self, event: Any) -> str:
+        return self.pending.pop(
+            (event.connection_id, event.request_id), ""
+        )
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        mongo_command_duration.observe(
+            event.duration_micros / 1e6,
+            self.collection(event),
+            event.command_name,
+        )
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        collection = self.collection(event)
+        mongo_command_duration.observe(
+            event.duration_micros / 1e6, collection, event.command_name
+        )
+        mongo_command_failures.inc(collection, event.command_name)
+
+
+mongo_command_listener = MongoCommandListener()
+
+
+def address_label(address: Any) -> str:
+    host, port = address
+    return f"{host}:{port}"
+
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """
+    Tracks open and checked out connections per server.
+
+    The numbers live in the mongo_pool_* gauges, `stats` reads them back
+    for /health/ready.
+    """
+
+    def pool_created(self, event: monitoring.PoolCreatedEvent) -> None:
+        mongo_pool_connections.inc(address_label(event.address), amount=0)
+
+    def pool_ready(self, event: monitoring.PoolReadyEvent) -> None:
+        mongo_pool_ready.set(address_label(event.address), value=1)
+
+    def pool_cleared(self, event: monitoring.PoolClearedEvent) -> None:
+        mongo_pool_ready.set(address_label(event.address), value=0)
+
+    def pool_closed(self, event: monitoring.PoolClosedEvent) -> None:
+        mongo_pool_ready.set(address_label(event.address), value=0)
+
+    def connection_created(
+        self, event: monitoring.ConnectionCreatedEvent
+    ) -> None:
+        mongo_pool_connections.inc(address_label(event.address))
+
+    def connection_ready(
+        self, event: monitoring.ConnectionReadyEvent
+    ) -> None:
+        pass
+
+    def connection_closed(
+        self, event: monitoring.ConnectionClosedEvent
+    ) -> None:
+        mongo_pool_connections.dec(address_label(event.address))
+
+    def connection_check_out_started(
+        self, event: monitoring.ConnectionCheckOutStartedEvent
+    ) -> None:
+        pass
+
+    def connection_check_out_failed(
+        self, event: monitoring.ConnectionCheckOutFailedEvent
+    ) -> None:
+        mongo_pool_checkout_failures.inc(
+            address_label(event.address), str(event.reason)
+        )
+
+    def connection_checked_out(
+        self, event: monitoring.ConnectionCheckedOutEvent
+    ) -> None:
+        mongo_pool_checked_out.inc(address_label(event.address))
+
+    def connection_checked_in(
+        self, event: monitoring.ConnectionCheckedInEvent
+    ) -> None:
+        mongo_pool_checked_out.dec(address_label(event.address))
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        with mongo_pool_connections.lock:
+            open_connections = dict(mongo_pool_connections.values)
+        with mongo_pool_checked_out.lock:
+            checked_out = dict(mongo_pool_checked_out.values)
+        with mongo_pool_ready.lock:
+            ready = dict(mongo_pool_ready.values)
+        return {
+            address: {
+                "ready": bool(ready.get((address,), 0)),
+                "open": int(count),
+                "checked_out": int(checked_out.get((address,), 0)),
+            }
+            for (address,), count in open_connections.items()
+        }
+
+
+mongo_pool_listener = MongoPoolListener()
+
+
+def cache_collector(
+    name: str, stats: Callable[[], dict[str, int]]
+) -> Callable[[], list[str]]:
+    def collect() -> list[str]:
+        lines = []
+        for stat, value in stats().items():
+            metric = f"{name}_{stat}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        return lines
+
+    return collect
+
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
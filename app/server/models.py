@@ -8,7 +8,7 @@ from pydantic import (
     ConfigDict,
 )
 from datetime import datetime
-from typing import Optional, Annotated, Union, Any
+from typing import Optional, Annotated, Union, Any, List
 from bson.objectid import ObjectId
 
 
@@ -55,6 +55,25 @@ class ResponsePost(PostBase):
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
 
+# NOTE: a post in the public feed, id included since it isn't the reader's
+class ResponseFeedPost(ResponsePost):
+    id: PyObjectId = Field(validation_alias="_id")
+
+
+# NOTE: every field a client can ask for with ?fields=, id included
+class ResponsePartialPost(BaseModel):
+    id: Optional[PyObjectId] = Field(default=None, validation_alias="_id")
+    title: Optional[str] = None
+    content: Optional[str] = None
+    # NOTE: the start of content, for list views that don't need all of it
+    excerpt: Optional[str] = None
+    published: Optional[bool] = None
+    creation_time: Optional[datetime] = None
+    owner_id: Optional[PyObjectId] = None
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+
 class UpdatePost(BaseModel):
     title: Optional[str] = None
     content: Optional[str] = None
@@ -64,6 +83,45 @@ class ResponseUpdatePost(PostBase):
     pass
 
 
+class BulkUpdatePost(UpdatePost):
+    post_id: str
+
+
+class ResponseBulkItem(BaseModel):
+    # NOTE: index is the item's position in the request body
+    index: int
+    post_id: Optional[str] = None
+    # NOTE: the status code the single item endpoint would have answered with
+    status_code: int
+    detail: Optional[str] = None
+
+
+# NOTE: one post of POST /post/batch, the post is only set with a 200
+class ResponseBatchItem(ResponseBulkItem):
+    post: Optional[ResponsePost] = None
+
+
+class ResponseBatchPosts(BaseModel):
+    found: int
+    failed: int
+    results: List[ResponseBatchItem]
+
+
+# NOTE: the body of GET /post/?envelope=true
+class ResponsePostPage(BaseModel):
+    items: List[ResponsePost]
+    total: int
+    # NOTE: the cursor of the next page, or for text search, which pages with
+    # NOTE: page, the next page number; null on the last page
+    next: Optional[str] = None
+
+
+class ResponseBulk(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[ResponseBulkItem]
+
+
 ############################################
 
 
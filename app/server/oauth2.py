@@ -4,27 +4,22 @@ from fastapi import Depends, status, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from .models import TokenData
 from .database import users_coll
+from .cache import user_cache
+from .singleflight import SingleFlight
+from .config import settings
 from typing import Optional
 
-from dotenv import dotenv_values
 
-# from .config import settings
-
-env_config = dotenv_values(".env")
-
-
-# SECRET_KEY = settings.SECRET_KEY
-# ALGORITHM = settings.ALGORITHM
-# ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
-
-SECRET_KEY = f"{env_config['SECRET_KEY']}"
-ALGORITHM = f"{env_config['ALGORITHM']}"
-ACCESS_TOKEN_EXPIRE_MINUTES = int(
-    f"{env_config['ACCESS_TOKEN_EXPIRE_MINUTES']}"
-)
+SECRET_KEY = settings.SECRET_KEY
+ALGORITHM = settings.ALGORITHM
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+# NOTE: a burst of requests from one user right after a cache miss
+# NOTE: shares one users_coll lookup instead of each running its own
+user_lookups = SingleFlight("current_user")
+
 
 # NOTE: creates an access token
 def create_access_token(data: dict):
@@ -58,10 +53,20 @@ def verify_access_token(token: str, credentials_exception):
     return token_data
 
 
+async def load_user_data(username: str) -> Optional[dict]:
+    # NOTE: the password hash isn't needed past login so it never gets cached
+    user_data = await users_coll.find_one(
+        {"username": username}, projection={"password": 0}
+    )
+    if user_data is not None:
+        await user_cache.set(username, user_data)
+    return user_data
+
+
 # NOTE: this extracts the "username" or whatever field i've set inside the token
 # SIDENOTE: see the JWT videos to get why the "username" or
 # any other field i've set is present INSIDE the token
-def get_current_user_data(
+async def get_current_user_data(
     token: str = Depends(oauth2_scheme),
 ):
     credentials_exception = HTTPException(
@@ -80,6 +85,13 @@ def get_current_user_data(
     # NOTE: the whole point of this function is to return the
     # details of the user who was VALIDATED to have the token
 
-    user_data = users_coll.find_one({"username": token_data.username})
+    # NOTE: cached so most requests skip this lookup, see cache.py
+    user_data = await user_cache.get(token_data.username)
+    if user_data is None:
+        user_data = await user_lookups.do(
+            token_data.username,
+            lambda: load_user_data(token_data.username),
+        )
+
     # NOTE: so this is a dict which contains user_data document
     return user_data
@@ -0,0 +1,35 @@
+import base64
+import binascii
+from fastapi import status, HTTPException
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+
+# NOTE: the header the next page's cursor is sent back in, the body stays a plain list
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+# NOTE: a cursor is just the last seen _id, base64 encoded so clients treat it as opaque
+def encode_cursor(last_id: ObjectId) -> str:
+    return base64.urlsafe_b64encode(last_id.binary).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> ObjectId:
+    """
+    Decode a cursor produced by `encode_cursor`.
+
+    Args:
+        cursor (str): The opaque cursor sent by the client.
+
+    Returns:
+        ObjectId: The _id of the last document on the previous page.
+
+    Raises:
+        HTTPException: If the cursor is malformed.
+    """
+    try:
+        return ObjectId(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, InvalidId, TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid cursor: {cursor}",
+        )
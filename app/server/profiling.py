@@ -0,0 +1,390 @@
+import argparse
+import asyncio
+import hashlib
+import hmac
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from types import FrameType
+from typing import Any
+import orjson
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from .config import settings
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+# NOTE: (function, file, first line), the identity of a flamegraph frame
+Frame = tuple[str, str, int]
+
+
+def sign_profile_request(path: str, expires: int, secret: str) -> str:
+    """
+    The X-Profile header value that asks for `path` to be profiled.
+
+    Args:
+        path (str): The request path, e.g. "/post/6512...".
+        expires (int): Unix time after which the header is refused.
+        secret (str): PROFILING_SECRET.
+
+    Returns:
+        str: "<expires>.<hex HMAC-SHA256 of expires:path>".
+    """
+    signature = hmac.new(
+        secret.encode(), f"{expires}:{path}".encode(), hashlib.sha256
+    ).hexdigest()
+    return f"{expires}.{signature}"
+
+
+def is_signed_profile_request(value: bytes, path: str) -> bool:
+    if not settings.PROFILING_SECRET:
+        return False
+    expires, _, _ = value.decode("latin-1").partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    expected = sign_profile_request(
+        path, int(expires), settings.PROFILING_SECRET
+    )
+    return hmac.compare_digest(expected, value.decode("latin-1"))
+
+
+def code_frame(frame: FrameType) -> Frame:
+    code = frame.f_code
+    # NOTE: co_qualname is new in python 3.11, older ones get the bare name
+    return (
+        getattr(code, "co_qualname", code.co_name),
+        code.co_filename,
+        code.co_firstlineno,
+    )
+
+
+def thread_stack(thread_id: int) -> list[Frame]:
+    frame = sys._current_frames().get(thread_id)
+    stack = []
+    while frame is not None:
+        stack.append(code_frame(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def await_stack(task: asyncio.Task) -> list[Frame]:
+    # NOTE: a suspended task has no thread stack, its coroutine chain says
+    # NOTE: where it's waiting, e.g. on a bcrypt executor future or a mongo reply
+    stack = []
+    awaitable: Any = task.get_coro()
+    while awaitable is not None:
+        frame = (
+            getattr(awaitable, "cr_frame", None)
+            or getattr(awaitable, "gi_frame", None)
+            or getattr(awaitable, "ag_frame", None)
+        )
+        if frame is None:
+            # NOTE: "await future" shows up as the future's FutureIter
+            waiting_on = type(awaitable).__name__.removesuffix("Iter")
+            stack.append((f"(waiting on {waiting_on})", "", 0))
+            break
+        stack.append(code_frame(frame))
+        awaitable = (
+            getattr(awaitable, "cr_await", None)
+            or getattr(awaitable, "gi_yieldfrom", None)
+            or getattr(awaitable, "ag_await", None)
+        )
+    return stack
+
+
+class Sampler(threading.Thread):
+    """
+    Samples one request's task every `interval` seconds until stopped.
+
+    Runs on its own thread so the event loop isn't interrupted; when the
+    task is the one running on the loop its real stack is recorded,
+    otherwise where it's awaiting.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        task: asyncio.Task,
+        interval: float,
+    ):
+        super().__init__(name="request-profiler", daemon=True)
+        self.loop = loop
+        self.task = task
+        self.loop_thread_id = threading.get_ident()
+        self.interval = interval
+        self.samples: list[tuple[list[Frame], float]] = []
+        self.stopped = threading.Event()
+
+    def sample(self) -> list[Frame]:
+        if asyncio.current_task(self.loop) is self.task:
+            return thread_stack(self.loop_thread_id)
+        return await_stack(self.task)
+
+    def run(self) -> None:
+        last = time.perf_counter()
+        while not self.stopped.wait(self.interval):
+            now = time.perf_counter()
+            self.samples.append((self.sample(), now - last))
+            last = now
+
+
+def speedscope_profile(
+    name: str, samples: list[tuple[list[Frame], float]]
+) -> dict[str, Any]:
+    frame_index: dict[Frame, int] = {}
+    stacks = []
+    for stack, _ in samples:
+        stacks.append(
+            [
+                frame_index.setdefault(frame, len(frame_index))
+                for frame in stack
+            ]
+        )
+    weights = [round(weight * 1000, 3) for _, weight in samples]
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "server.profiling",
+        "shared": {
+            "frames": [
+                {"name": function, "file": file, "line": line}
+                for function, file, line in frame_index
+            ]
+        },
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(sum(weights), 3),
+                "samples": stacks,
+                "weights": weights,
+            }
+        ],
+    }
+
+
+def top_frames(
+    samples: list[tuple[list[Frame], float]], count: int
+) -> dict[str, list[dict[str, Any]]]:
+    """
+    The frames with the most self and total (inclusive) time.
+    """
+    self_time: Counter = Counter()
+    total_time: Counter = Counter()
+    for stack, weight in samples:
+        if stack:
+            self_time[stack[-1]] += weight
+        # NOTE: once per stack, recursion doesn't count a frame twice
+        for frame in set(stack):
+            total_time[frame] += weight
+    elapsed = sum(weight for _, weight in samples) or 1
+
+    def rows(times: Counter) -> list[dict[str, Any]]:
+        return [
+            {
+                "frame": f"{function} ({os.path.basename(file)}:{line})",
+                "ms": round(spent * 1000, 3),
+                "percent": round(spent / elapsed * 100, 1),
+            }
+            for (function, file, line), spent in times.most_common(count)
+        ]
+
+    return {"self": rows(self_time), "total": rows(total_time)}
+
+
+class ProfileStore:
+    """
+    Keeps the newest `max_profiles` profiles in `directory`.
+
+    Each profile is a .speedscope.json (open it on speedscope.app) and a
+    .summary.json with the top frames.
+    """
+
+    def __init__(self, directory: str, max_profiles: int):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self.lock = threading.Lock()
+
+    def save(
+        self,
+        profile_id: str,
+        profile: dict[str, Any],
+        summary: dict[str, Any],
+    ) -> None:
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            base = os.path.join(self.directory, profile_id)
+            with open(f"{base}.speedscope.json", "wb") as file:
+                file.write(orjson.dumps(profile))
+            with open(f"{base}.summary.json", "wb") as file:
+                file.write(
+                    orjson.dumps(summary, option=orjson.OPT_INDENT_2)
+                )
+            self.prune()
+
+    def prune(self) -> None:
+        # NOTE: ids start with a UTC timestamp, so name order is age order
+        profile_ids = sorted(
+            name.removesuffix(".summary.json")
+            for name in os.listdir(self.directory)
+            if name.endswith(".summary.json")
+        )
+        for profile_id in profile_ids[: -self.max_profiles]:
+            for suffix in (".speedscope.json", ".summary.json"):
+                try:
+                    os.remove(
+                        os.path.join(self.directory, profile_id + suffix)
+                    )
+                except FileNotFoundError:
+                    pass
+
+
+def profile_id_for(method: str, path: str) -> str:
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", path).strip("-") or "root"
+    return f"{timestamp}-{method}-{slug[:60]}"
+
+
+class ProfilingMiddleware:
+    """
+    Profiles single requests with a sampling profiler.
+
+    A request is profiled when it carries a valid X-Profile header (see
+    `sign_profile_request`) or, with PROFILING_SAMPLE_RATE N, once every N
+    requests. Only one request is profiled at a time. The response of a
+    profiled request carries an X-Profile-Id naming the files in
+    PROFILING_DIR.
+
+    Only added to the app when PROFILING_ENABLED is set; when it is, a
+    request that isn't profiled costs a header lookup and a counter.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.interval = settings.PROFILING_INTERVAL_MS / 1000
+        self.top_count = settings.PROFILING_TOP_FRAMES
+        self.store = ProfileStore(
+            settings.PROFILING_DIR, settings.PROFILING_MAX_PROFILES
+        )
+        self.requests = 0
+        self.active = False
+
+    def wants_profile(self, scope: Scope) -> bool:
+        self.requests += 1
+        if self.active:
+            return False
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                return is_signed_profile_request(value, scope["path"])
+        return bool(
+            self.sample_rate and self.requests % self.sample_rate == 0
+        )
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope["type"] != "http" or not self.wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = profile_id_for(scope["method"], scope["path"])
+        status_code = 500
+
+        async def send_with_profile_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (PROFILE_ID_HEADER, profile_id.encode()),
+                ]
+            await send(message)
+
+        self.active = True
+        sampler = Sampler(
+            asyncio.get_running_loop(),
+            asyncio.current_task(),
+            self.interval,
+        )
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.stopped.set()
+            self.active = False
+            duration = time.perf_counter() - start
+            # NOTE: encoding and writing the files happens on the sampler's
+            # NOTE: side, off the event loop
+            threading.Thread(
+                target=self.save,
+                args=(
+                    sampler,
+                    profile_id,
+                    scope["method"],
+                    scope["path"],
+                    status_code,
+                    duration,
+                ),
+                daemon=True,
+            ).start()
+
+    def save(
+        self,
+        sampler: Sampler,
+        profile_id: str,
+        method: str,
+        path: str,
+        status_code: int,
+        duration: float,
+    ) -> None:
+        sampler.join()
+        name = f"{method} {path}"
+        self.store.save(
+            profile_id,
+            speedscope_profile(name, sampler.samples),
+            {
+                "request": name,
+                "status_code": status_code,
+                "duration_ms": round(duration * 1000, 3),
+                "samples": len(sampler.samples),
+                "top_frames": top_frames(sampler.samples, self.top_count),
+            },
+        )
+
+
+# NOTE: run from the app directory, e.g.
+# NOTE: curl -H "X-Profile: $(python -m server.profiling /post/)" ...
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Print an X-Profile header value for a request path"
+    )
+    parser.add_argument("path", help="the request path, e.g. /post/")
+    parser.add_argument(
+        "--ttl",
+        type=int,
+        default=300,
+        help="seconds the header stays valid",
+    )
+    args = parser.parse_args()
+    if not settings.PROFILING_SECRET:
+        raise SystemExit("PROFILING_SECRET isn't set")
+    print(
+        sign_profile_request(
+            args.path,
+            int(time.time()) + args.ttl,
+            settings.PROFILING_SECRET,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
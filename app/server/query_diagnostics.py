@@ -0,0 +1,432 @@
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Optional
+import orjson
+from pymongo import monitoring
+from .config import settings
+from .metrics import Counter, registry
+
+logger = logging.getLogger(__name__)
+
+query_plan_warnings = registry.register(
+    Counter(
+        "mongo_query_plan_warnings_total",
+        "Query shapes whose explain() was flagged, by collection and reason",
+        ("collection", "reason"),
+    )
+)
+
+slow_queries = registry.register(
+    Counter(
+        "mongo_slow_queries_total",
+        "Queries over SLOW_QUERY_MS, by collection and command",
+        ("collection", "command"),
+    )
+)
+
+# NOTE: the commands that run a query, and where each one keeps it
+QUERY_COMMANDS = {
+    "find": lambda command: {
+        "filter": command.get("filter", {}),
+        "sort": command.get("sort"),
+    },
+    "aggregate": lambda command: {"pipeline": command.get("pipeline", [])},
+    "count": lambda command: {"filter": command.get("query", {})},
+    "distinct": lambda command: {
+        "key": command.get("key"),
+        "filter": command.get("query", {}),
+    },
+    "findAndModify": lambda command: {
+        "filter": command.get("query", {}),
+        "sort": command.get("sort"),
+    },
+    "update": lambda command: {"filter": command["updates"][0].get("q")},
+    "delete": lambda command: {"filter": command["deletes"][0].get("q")},
+}
+# NOTE: session and transport fields that explain doesn't take
+EXPLAIN_DROPPED_FIELDS = {
+    "lsid",
+    "txnNumber",
+    "writeConcern",
+    "readConcern",
+}
+
+
+def value_shape(value: Any) -> Any:
+    """
+    A filter with its values replaced by "?", keeping fields and operators.
+
+    Args:
+        value (Any): A filter, pipeline or part of one.
+
+    Returns:
+        Any: The same structure, with e.g. {"owner_id": "?", "_id": {"$gt": "?"}}.
+    """
+    if isinstance(value, dict):
+        return {key: value_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # NOTE: {"$in": [...]} is one shape whatever the list holds
+        if all(not isinstance(item, (dict, list)) for item in value):
+            return "?"
+        return [value_shape(item) for item in value]
+    return "?"
+
+
+def query_shape(command_name: str, command: dict[str, Any]) -> str:
+    query = QUERY_COMMANDS[command_name](command)
+    if "sort" in query and query["sort"] is not None:
+        # NOTE: the sort direction is part of the shape, not a value
+        query["sort"] = dict(query["sort"])
+    shaped = {
+        key: value if key in ("sort", "key") else value_shape(value)
+        for key, value in query.items()
+        if value is not None
+    }
+    return orjson.dumps(shaped, default=str).decode()
+
+
+def explain_command(
+    command_name: str, command: dict[str, Any]
+) -> dict[str, Any]:
+    explained = {
+        key: value
+        for key, value in command.items()
+        if not key.startswith("$") and key not in EXPLAIN_DROPPED_FIELDS
+    }
+    # NOTE: explain takes a single statement, the first one has the shape
+    if command_name == "update":
+        explained["updates"] = explained["updates"][:1]
+    elif command_name == "delete":
+        explained["deletes"] = explained["deletes"][:1]
+    # NOTE: executionStats would run $out/$merge stages for real
+    writes = any(
+        "$out" in stage or "$merge" in stage
+        for stage in command.get("pipeline", ())
+    )
+    return {
+        "explain": explained,
+        "verbosity": "queryPlanner" if writes else "executionStats",
+    }
+
+
+def find_key(value: Any, key: str) -> Optional[dict]:
+    # NOTE: the plan sits at the top for find, under stages[0].$cursor or
+    # NOTE: shards.<name> for aggregations and sharded clusters
+    if isinstance(value, dict):
+        if isinstance(value.get(key), dict):
+            return value[key]
+        items: Iterable[Any] = value.values()
+    elif isinstance(value, list):
+        items = value
+    else:
+        return None
+    for item in items:
+        found = find_key(item, key)
+        if found is not None:
+            return found
+    return None
+
+
+def plan_stages(plan: Any, stages: list[str], indexes: list[str]) -> None:
+    if isinstance(plan, dict):
+        if isinstance(plan.get("stage"), str):
+            stages.append(plan["stage"])
+        if isinstance(plan.get("indexName"), str):
+            indexes.append(plan["indexName"])
+        for item in plan.values():
+            plan_stages(item, stages, indexes)
+    elif isinstance(plan, list):
+        for item in plan:
+            plan_stages(item, stages, indexes)
+
+
+@dataclass
+class PlanSummary:
+    stages: list[str]
+    indexes: list[str]
+    docs_examined: Optional[int] = None
+    keys_examined: Optional[int] = None
+    returned: Optional[int] = None
+
+    @classmethod
+    def from_explain(cls, explain: dict[str, Any]) -> "PlanSummary":
+        stages: list[str] = []
+        indexes: list[str] = []
+        planner = find_key(explain, "queryPlanner") or {}
+        plan_stages(planner.get("winningPlan"), stages, indexes)
+        execution = find_key(explain, "executionStats") or {}
+        return cls(
+            stages=stages,
+            indexes=list(dict.fromkeys(indexes)),
+            docs_examined=execution.get("totalDocsExamined"),
+            keys_examined=execution.get("totalKeysExamined"),
+            returned=execution.get("nReturned"),
+        )
+
+    @property
+    def collscan(self) -> bool:
+        return "COLLSCAN" in self.stages
+
+    def warnings(self, max_examined_ratio: float) -> list[str]:
+        reasons = []
+        if self.collscan:
+            reasons.append("collscan")
+        if (
+            self.docs_examined is not None
+            and self.docs_examined
+            > max_examined_ratio * max(self.returned or 0, 1)
+        ):
+            reasons.append("examined_ratio")
+        return reasons
+
+    def __str__(self) -> str:
+        plan = " <- ".join(reversed(self.stages)) or "?"
+        if self.indexes:
+            plan += f" [{', '.join(self.indexes)}]"
+        if self.docs_examined is not None:
+            plan += (
+                f" examined {self.keys_examined} keys, {self.docs_examined}"
+                f" docs for {self.returned} returned"
+            )
+        return plan
+
+
+@dataclass
+class QueryShape:
+    collection: str
+    command: str
+    shape: str
+    count: int = 0
+    total_ms: float = 0
+    max_ms: float = 0
+    plan: Optional[PlanSummary] = None
+    plan_error: Optional[str] = None
+    warnings: list[str] = field(default_factory=list)
+    # NOTE: monotonic time of the last explain, None until one is queued
+    explained_at: Optional[float] = None
+
+
+class QueryDiagnostics(monitoring.CommandListener):
+    """
+    Records every distinct query shape and explains it in the background.
+
+    A shape is a query with its values taken out, e.g. a find on posts by
+    {"owner_id": "?", "_id": {"$gt": "?"}} sorted by _id. The first time a
+    shape is seen, and again every QUERY_EXPLAIN_INTERVAL_SECONDS when
+    that's set, its command is explained on a separate thread through the
+    synchronous client under motor, so requests never wait on it. Plans
+    with a COLLSCAN or that examine more than QUERY_MAX_EXAMINED_RATIO
+    documents per returned one are logged and counted, and so is every
+    query over SLOW_QUERY_MS, with its shape and plan.
+
+    Only registered on the client when QUERY_DIAGNOSTICS_ENABLED is set.
+    """
+
+    def __init__(
+        self,
+        slow_query_ms: float,
+        explain_interval_seconds: float,
+        max_examined_ratio: float,
+        max_shapes: int,
+    ):
+        self.slow_query_ms = slow_query_ms
+        self.explain_interval_seconds = explain_interval_seconds
+        self.max_examined_ratio = max_examined_ratio
+        self.max_shapes = max_shapes
+        self.client: Any = None
+        self.shapes: dict[tuple[str, str, str], QueryShape] = {}
+        self.pending: dict[tuple[Any, int], QueryShape] = {}
+        self.lock = threading.Lock()
+        self.explains: queue.Queue = queue.Queue(maxsize=max_shapes)
+        self.worker: Optional[threading.Thread] = None
+
+    def attach(self, client: Any) -> None:
+        """
+        Sets the pymongo client explains are run with.
+
+        Args:
+            client (Any): A synchronous MongoClient, e.g. the motor client's delegate.
+        """
+        self.client = client
+        if self.worker is None:
+            self.worker = threading.Thread(
+                target=self.run, name="query-explain", daemon=True
+            )
+            self.worker.start()
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name not in QUERY_COMMANDS:
+            return
+        command = event.command
+        collection = command.get(event.command_name)
+        try:
+            shape = query_shape(event.command_name, command)
+        except Exception:
+            logger.debug(
+                "No shape for %s", event.command_name, exc_info=True
+            )
+            return
+        key = (collection, event.command_name, shape)
+
+        now = time.monotonic()
+        with self.lock:
+            query = self.shapes.get(key)
+            if query is None:
+                if len(self.shapes) >= self.max_shapes:
+                    return
+                query = self.shapes[key] = QueryShape(
+                    collection, event.command_name, shape
+                )
+            explain = query.explained_at is None or (
+                self.explain_interval_seconds
+                and now - query.explained_at
+                >= self.explain_interval_seconds
+            )
+            if explain:
+                query.explained_at = now
+            self.pending[(event.connection_id, event.request_id)] = query
+
+        if explain and self.client is not None:
+            try:
+                self.explains.put_nowait(
+                    (
+                        query,
+                        event.database_name,
+                        explain_command(event.command_name, command),
+                    )
+                )
+            except queue.Full:
+                # NOTE: retried the next time the shape comes by
+                query.explained_at = None
+
+    def finished(self, event: Any) -> Optional[QueryShape]:
+        with self.lock:
+            query = self.pending.pop(
+                (event.connection_id, event.request_id), None
+            )
+            if query is None:
+                return None
+            duration_ms = event.duration_micros / 1000
+            query.count += 1
+            query.total_ms += duration_ms
+            query.max_ms = max(query.max_ms, duration_ms)
+
+        if duration_ms >= self.slow_query_ms:
+            slow_queries.inc(query.collection, query.command)
+            logger.warning(
+                "Slow query: %s on %s took %.1fms, shape %s, plan %s",
+                query.command,
+                query.collection,
+                duration_ms,
+                query.shape,
+                query.plan or query.plan_error or "not explained yet",
+            )
+        return query
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self.finished(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self.finished(event)
+
+    def explain(
+        self, query: QueryShape, database: str, command: dict
+    ) -> None:
+        try:
+            result = self.client[database].command(command)
+        except Exception as error:
+            query.plan_error = f"explain failed: {error}"
+            logger.debug(
+                "Explaining %s failed", query.shape, exc_info=True
+            )
+            return
+
+        query.plan = PlanSummary.from_explain(result)
+        warnings = query.plan.warnings(self.max_examined_ratio)
+        # NOTE: only new warnings are logged, not one per re-explain
+        for reason in warnings:
+            if reason not in query.warnings:
+                query_plan_warnings.inc(query.collection, reason)
+                logger.warning(
+                    "Query plan %s: %s on %s, shape %s, plan %s",
+                    reason,
+                    query.command,
+                    query.collection,
+                    query.shape,
+                    query.plan,
+                )
+        query.warnings = warnings
+
+    def run(self) -> None:
+        while True:
+            query, database, command = self.explains.get()
+            try:
+                self.explain(query, database, command)
+            finally:
+                self.explains.task_done()
+
+    def drain(self) -> None:
+        # NOTE: blocks until every queued explain has finished
+        self.explains.join()
+
+    def report(self) -> list[QueryShape]:
+        """
+        Every shape seen so far, slowest on average first.
+        """
+        with self.lock:
+            shapes = list(self.shapes.values())
+        return sorted(
+            shapes,
+            key=lambda query: query.total_ms / max(query.count, 1),
+            reverse=True,
+        )
+
+
+query_diagnostics = QueryDiagnostics(
+    slow_query_ms=settings.SLOW_QUERY_MS,
+    explain_interval_seconds=settings.QUERY_EXPLAIN_INTERVAL_SECONDS,
+    max_examined_ratio=settings.QUERY_MAX_EXAMINED_RATIO,
+    max_shapes=settings.QUERY_DIAGNOSTICS_MAX_SHAPES,
+)
+
+
+def assert_all_queries_indexed(
+    diagnostics: QueryDiagnostics = query_diagnostics,
+    allow_collections: Iterable[str] = (),
+) -> None:
+    """
+    Fails if any query seen so far scanned a whole collection.
+
+    Meant for the end of a test run against a real MongoDB with
+    QUERY_DIAGNOSTICS_ENABLED=true and the indexes applied. The tests
+    call it when they run with TEST_MONGODB_URI set, see conftest.py, so
+    a new unindexed query fails the suite.
+
+    Args:
+        diagnostics (QueryDiagnostics): Where the shapes were recorded. Defaults to the app's.
+        allow_collections (Iterable[str]): Collections whose scans are expected, e.g. for maintenance jobs.
+
+    Raises:
+        AssertionError: Listing every unindexed shape and its plan.
+    """
+    diagnostics.drain()
+    allowed = set(allow_collections)
+    unindexed = [
+        query
+        for query in diagnostics.report()
+        if query.plan is not None
+        and query.plan.collscan
+        and query.collection not in allowed
+    ]
+    if unindexed:
+        raise AssertionError(
+            "Unindexed queries:\n"
+            + "\n".join(
+                f"  {query.command} on {query.collection} {query.shape}: "
+                f"{query.plan}"
+                for query in unindexed
+            )
+        )
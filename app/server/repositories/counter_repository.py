@@ -0,0 +1,129 @@
+import argparse
+import asyncio
+from typing import Any
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from ..config import settings
+from ..database import counters_coll, mongo, posts_coll
+
+# NOTE: one document per owner, {_id: owner_id, posts: <count>, seeded: true},
+# NOTE: so the total of an unfiltered listing is a single _id lookup instead
+# NOTE: of a count over the owner's posts on every page.
+# NOTE: Writes always $inc (upserting), so none is ever lost. A counter a
+# NOTE: write created holds only the writes since, until a read seeds it
+# NOTE: from the posts themselves, see get_post_count. That seed can't be
+# NOTE: atomic with the count it's based on, a write in flight while it
+# NOTE: runs may be counted twice or not at all; the counts are only exact
+# NOTE: after `rebuild_post_counts` (--rebuild below) ran with writes quiet.
+
+
+async def adjust_post_count(owner_id: Any, delta: int) -> None:
+    """
+    Add `delta` to an owner's post count after posts were created or deleted.
+
+    Parameters:
+        owner_id (Any): The ID of the user whose posts changed.
+        delta (int): The number of posts created, negative for deleted.
+    """
+    if delta:
+        await counters_coll.update_one(
+            {"_id": owner_id}, {"$inc": {"posts": delta}}, upsert=True
+        )
+
+
+async def get_post_count(owner_id: Any) -> int:
+    """
+    The number of posts an owner has.
+
+    Parameters:
+        owner_id (Any): The ID of the user whose posts are counted.
+
+    Returns:
+        int: The post count.
+    """
+    counter = await counters_coll.find_one({"_id": owner_id})
+    if counter is not None and counter.get("seeded"):
+        return counter["posts"]
+
+    # NOTE: first read for this owner, counted once over the owner_id_id index.
+    # NOTE: The counter becomes the count plus whatever writes $inc'd it
+    # NOTE: since it was read above, instead of overwriting those writes
+    before = counter["posts"] if counter is not None else 0
+    count = await posts_coll.count_documents({"owner_id": owner_id})
+    try:
+        seeded = await counters_coll.find_one_and_update(
+            {"_id": owner_id, "seeded": {"$ne": True}},
+            {"$inc": {"posts": count - before}, "$set": {"seeded": True}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # NOTE: another request seeded it in between, theirs stands
+        seeded = await counters_coll.find_one({"_id": owner_id})
+    return seeded["posts"]
+
+
+async def count_matching_posts(
+    owner_id: Any, query: dict[str, Any]
+) -> int:
+    """
+    Count an owner's posts matching a filter, for search totals.
+
+    This does read the matching index entries, callers cache the result,
+    see FILTERED_COUNT_TTL_SECONDS.
+
+    Parameters:
+        owner_id (Any): The ID of the user whose posts are counted.
+        query (dict): The filter on top of the owner scope.
+
+    Returns:
+        int: The number of matching posts.
+    """
+    return await posts_coll.count_documents(
+        {"owner_id": owner_id, **query}
+    )
+
+
+async def rebuild_post_counts() -> None:
+    """
+    Recount every owner's posts from posts_coll.
+
+    $out swaps the new counters in atomically; posts written while it
+    runs may be missed, so run it when writes are quiet, e.g. once after
+    deploying the counters and whenever a total looks off.
+    """
+    await posts_coll.aggregate(
+        [
+            {"$group": {"_id": "$owner_id", "posts": {"$sum": 1}}},
+            {"$set": {"seeded": True}},
+            {"$out": settings.COUNTERS_COLLECTION_NAME},
+        ]
+    ).to_list(length=None)
+
+
+# NOTE: run from the app directory, e.g.
+# NOTE: python -m server.repositories.counter_repository --rebuild
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Maintain the per owner post counters"
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        required=True,
+        help="recount the posts of every owner",
+    )
+    parser.parse_args()
+
+    async def run() -> None:
+        mongo.connect()
+        try:
+            await rebuild_post_counts()
+        finally:
+            mongo.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import argparse
+import asyncio
+from typing import Any, Iterable, Optional
+from bson.objectid import ObjectId
+from pymongo import DESCENDING, DeleteOne, ReplaceOne
+from ..config import settings
+from ..content import STORED_CONTENT_FIELDS, decode_content
+from ..database import feed_coll, mongo, posts_coll
+
+# NOTE: the feed collection holds a copy of every published post, so the
+# NOTE: public feed is a walk down the _id index in reverse with no filter
+# NOTE: and no sort, instead of a scan and sort of posts_coll across owners.
+# NOTE: ObjectIds start with their creation second, so _id order is
+# NOTE: creation order (creation_time is client supplied and can't be trusted)
+
+# NOTE: the post fields copied into a feed entry, content as it's stored
+FEED_FIELDS = (
+    "_id",
+    "owner_id",
+    "title",
+    "excerpt",
+    *STORED_CONTENT_FIELDS,
+    "published",
+    "creation_time",
+    "last_modified",
+    "version",
+)
+
+
+def feed_entry(post: dict[str, Any]) -> dict[str, Any]:
+    return {field: post[field] for field in FEED_FIELDS if field in post}
+
+
+async def publish_posts(posts: Iterable[dict[str, Any]]) -> None:
+    """
+    Add newly created posts to the feed, skipping unpublished ones.
+
+    Parameters:
+        posts (Iterable[dict]): The inserted post documents, _id included.
+    """
+    entries = [feed_entry(post) for post in posts if post.get("published")]
+    if entries:
+        await feed_coll.insert_many(entries, ordered=False)
+
+
+async def sync_feed_entry(post_id: ObjectId, post: Optional[dict]) -> None:
+    """
+    Bring one feed entry in line with its post after a write.
+
+    Parameters:
+        post_id (ObjectId): The _id of the post.
+        post (Optional[dict]): The post as it is now, None if it was deleted.
+    """
+    if post is not None and post.get("published"):
+        await feed_coll.replace_one(
+            {"_id": post_id}, feed_entry(post), upsert=True
+        )
+    else:
+        await feed_coll.delete_one({"_id": post_id})
+
+
+async def sync_feed(post_ids: list[ObjectId]) -> None:
+    """
+    Bring the feed entries of many posts in line with the posts, for bulk writes.
+
+    Parameters:
+        post_ids (list[ObjectId]): The _ids of the posts that may have changed.
+    """
+    if not post_ids:
+        return
+    posts = {
+        post["_id"]: post
+        async for post in posts_coll.find(
+            {"_id": {"$in": post_ids}}, projection=list(FEED_FIELDS)
+        )
+    }
+    operations = [
+        ReplaceOne(
+            {"_id": post_id}, feed_entry(posts[post_id]), upsert=True
+        )
+        if post_id in posts and posts[post_id].get("published")
+        else DeleteOne({"_id": post_id})
+        for post_id in post_ids
+    ]
+    await feed_coll.bulk_write(operations, ordered=False)
+
+
+async def list_feed(
+    limit: int, before_id: Optional[ObjectId] = None
+) -> list[dict]:
+    """
+    The newest published posts of every owner.
+
+    Parameters:
+        limit (int): The maximum number of posts to return.
+        before_id (Optional[ObjectId]): Only return posts older than this _id (keyset paging).
+
+    Returns:
+        list[dict]: The feed entries, newest first.
+    """
+    query = {"_id": {"$lt": before_id}} if before_id is not None else {}
+    return [
+        decode_content(entry)
+        for entry in await feed_coll.find(query)
+        .sort("_id", DESCENDING)
+        .limit(limit)
+        .to_list(length=limit)
+    ]
+
+
+async def rebuild_feed() -> None:
+    """
+    Recompute the whole feed from posts_coll.
+
+    $out swaps the new collection in atomically, keeping its indexes;
+    posts written while it runs may be missed, so run it when writes
+    are quiet, e.g. once to backfill posts created before the feed.
+    """
+    await posts_coll.aggregate(
+        [
+            {"$match": {"published": True}},
+            {"$project": {field: 1 for field in FEED_FIELDS}},
+            {"$out": settings.FEED_COLLECTION_NAME},
+        ]
+    ).to_list(length=None)
+
+
+# NOTE: run from the app directory, e.g.
+# NOTE: python -m server.repositories.feed_repository --rebuild
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Maintain the published posts feed"
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        required=True,
+        help="recompute the feed from every published post",
+    )
+    parser.parse_args()
+
+    async def run() -> None:
+        mongo.connect()
+        try:
+            await rebuild_feed()
+        finally:
+            mongo.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,899 @@
+import logging
+import re
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Callable, Optional
+from bson.objectid import ObjectId
+from fastapi import status
+from pymongo import (
+    ReturnDocument,
+    ASCENDING,
+    InsertOne,
+    UpdateOne,
+    DeleteOne,
+)
+from pymongo.errors import BulkWriteError
+from ..database import posts_coll
+from ..conditional import (
+    document_last_modified,
+    document_version,
+    version_filter,
+)
+from .counter_repository import adjust_post_count
+from .feed_repository import publish_posts, sync_feed_entry, sync_feed
+from ..batching import DUPLICATE_KEY_ERROR, InsertBatcher
+from ..config import settings
+from ..content import (
+    STORED_CONTENT_FIELDS,
+    decode_content,
+    encode_content,
+    stored_projection,
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_SEARCH_LENGTH = 256
+
+
+# NOTE: every query here is scoped by BOTH _id and owner_id so a single
+# NOTE: round trip tells us "found and owned"; a None result means either
+# NOTE: the post doesn't exist or someone else owns it, see find_post_owner
+
+
+def owned_post_filter(
+    post_id: str, owner_id: Any, expected_version: Optional[int] = None
+) -> dict[str, Any]:
+    return {
+        "_id": ObjectId(post_id),
+        "owner_id": owner_id,
+        **version_filter(expected_version),
+    }
+
+
+# NOTE: every write bumps version and last_modified, they back the ETag and
+# NOTE: Last-Modified headers and If-Match checks, see conditional.py;
+# NOTE: content is stored per CONTENT_COMPRESSION, see content.py
+def stamp_new_post(post: dict[str, Any]) -> dict[str, Any]:
+    stored, _ = encode_content(post)
+    # NOTE: updated in place, callers hold on to the document for its _id
+    post.clear()
+    post.update(stored)
+    post["version"] = 1
+    post["last_modified"] = datetime.now(timezone.utc)
+    return post
+
+
+def versioned_update(
+    changes: dict[str, Any], modified_at: Optional[datetime] = None
+) -> dict[str, Any]:
+    stored, unset = encode_content(changes)
+    update: dict[str, Any] = {
+        "$set": {
+            **stored,
+            "last_modified": modified_at or datetime.now(timezone.utc),
+        },
+        "$inc": {"version": 1},
+    }
+    if unset:
+        update["$unset"] = {name: "" for name in unset}
+    return update
+
+
+async def after_posts_inserted(posts: list[dict[str, Any]]) -> None:
+    # NOTE: one $inc per owner in the batch rather than one per post
+    for owner_id, count in Counter(
+        post["owner_id"] for post in posts
+    ).items():
+        await adjust_post_count(owner_id, count)
+    await publish_posts(posts)
+
+
+# NOTE: off by default, with INSERT_BATCH_ENABLED concurrent creates share
+# NOTE: one insert_many, at the cost of up to INSERT_BATCH_MAX_DELAY_MS latency
+post_inserts: Optional[InsertBatcher] = (
+    InsertBatcher(
+        posts_coll,
+        max_batch_size=settings.INSERT_BATCH_MAX_SIZE,
+        max_delay_seconds=settings.INSERT_BATCH_MAX_DELAY_MS / 1000,
+        durability=settings.INSERT_BATCH_DURABILITY,
+        after_insert=after_posts_inserted,
+    )
+    if settings.INSERT_BATCH_ENABLED
+    else None
+)
+
+
+async def insert_post(post: dict[str, Any]) -> ObjectId:
+    """
+    Insert a new post.
+
+    Parameters:
+        post (dict): The post document, owner_id included.
+
+    Returns:
+        ObjectId: The _id of the new post.
+    """
+    if post_inserts is not None:
+        return await post_inserts.insert(stamp_new_post(post))
+
+    new_post_id = (
+        await posts_coll.insert_one(stamp_new_post(post))
+    ).inserted_id
+    # NOTE: the post is written either way, like a batch's after_insert a
+    # NOTE: failure here is logged rather than failing the create
+    try:
+        await after_posts_inserted([post])
+    except Exception:
+        logger.exception("after_posts_inserted failed for %s", new_post_id)
+    return new_post_id
+
+
+async def find_owned_post(
+    post_id: str, owner_id: Any, projection: Optional[dict] = None
+) -> Optional[dict]:
+    """
+    Find a post by its ID, but only if it belongs to the given owner.
+
+    Parameters:
+        post_id (str): The ID of the post to find.
+        owner_id (Any): The ID of the user who must own the post.
+        projection (Optional[dict]): Only fetch these fields. Defaults to the whole post.
+
+    Returns:
+        Optional[dict]: The post document, or None if it is missing or not owned.
+    """
+    found_post = await posts_coll.find_one(
+        owned_post_filter(post_id, owner_id),
+        projection=stored_projection(projection),
+    )
+    return decode_content(found_post) if found_post is not None else None
+
+
+async def find_owned_posts(
+    post_ids: list[ObjectId],
+    owner_id: Any,
+    projection: Optional[dict] = None,
+) -> list[dict]:
+    """
+    Find many posts by their IDs in one query, only those the owner has.
+
+    Parameters:
+        post_ids (list[ObjectId]): The IDs of the posts to find.
+        owner_id (Any): The ID of the user who must own the posts.
+        projection (Optional[dict]): Only fetch these fields. Defaults to the whole post.
+
+    Returns:
+        list[dict]: The found post documents, in no particular order.
+    """
+    # NOTE: an _id $in under the owner prefix, served by the owner_id_id index
+    found_posts = await posts_coll.find(
+        {"owner_id": owner_id, "_id": {"$in": post_ids}},
+        projection=stored_projection(projection),
+    ).to_list(length=len(post_ids))
+    return [decode_content(post) for post in found_posts]
+
+
+async def list_owned_posts(
+    owner_id: Any,
+    query: dict[str, Any],
+    limit: int,
+    after_id: Optional[ObjectId] = None,
+    skip: int = 0,
+    projection: Optional[dict] = None,
+) -> list[dict]:
+    """
+    List an owner's posts in _id order.
+
+    Parameters:
+        owner_id (Any): The ID of the user whose posts are listed.
+        query (dict): Extra filters to apply on top of the owner scope.
+        limit (int): The maximum number of posts to return.
+        after_id (Optional[ObjectId]): Only return posts after this _id (keyset paging).
+        skip (int): The number of posts to skip, only for the legacy page parameter.
+        projection (Optional[dict]): Only fetch these fields. Defaults to the whole post.
+
+    Returns:
+        list[dict]: The matching post documents.
+    """
+    scoped_query: dict[str, Any] = {"owner_id": owner_id, **query}
+    # NOTE: seeking on (owner_id, _id) keeps every page the same cost,
+    # NOTE: unlike skip which walks all the previous pages first
+    if after_id is not None:
+        scoped_query["_id"] = {"$gt": after_id}
+
+    cursor = posts_coll.find(
+        scoped_query, projection=stored_projection(projection)
+    ).sort("_id", ASCENDING)
+    if skip:
+        cursor = cursor.skip(skip)
+    return [
+        decode_content(post)
+        for post in await cursor.limit(limit).to_list(length=limit)
+    ]
+
+
+async def iter_owned_posts(
+    owner_id: Any, batch_size: int
+) -> AsyncIterator[dict]:
+    """
+    Iterate over every post an owner has, in _id order.
+
+    Documents are pulled from Mongo one batch at a time as the caller
+    asks for them, so memory use doesn't grow with the number of posts.
+
+    Parameters:
+        owner_id (Any): The ID of the user whose posts are iterated.
+        batch_size (int): The number of documents fetched per round trip.
+
+    Yields:
+        dict: The post documents.
+    """
+    cursor = (
+        posts_coll.find({"owner_id": owner_id})
+        .sort("_id", ASCENDING)
+        .batch_size(batch_size)
+    )
+    try:
+        async for post in cursor:
+            yield decode_content(post)
+    finally:
+        # NOTE: frees the server side cursor if the client went away mid export
+        await cursor.close()
+
+
+def text_search_terms(search: str) -> str:
+    """
+    Turn raw user input into a safe $text search string.
+
+    Only word characters are kept, so quotes (phrases) and leading
+    hyphens (negations) in the input can't change the query's meaning.
+
+    Parameters:
+        search (str): The raw search input.
+
+    Returns:
+        str: The space separated search terms, possibly empty.
+    """
+    return " ".join(re.findall(r"\w+", search[:MAX_SEARCH_LENGTH]))
+
+
+def substring_query(search: str) -> dict[str, Any]:
+    # NOTE: re.escape so the input is matched literally and can't be a costly pattern
+    if not search:
+        return {}
+    return {
+        "title": {
+            "$regex": re.escape(search[:MAX_SEARCH_LENGTH]),
+            "$options": "i",
+        }
+    }
+
+
+async def search_owned_posts(
+    owner_id: Any,
+    terms: str,
+    limit: int,
+    skip: int = 0,
+    projection: Optional[dict] = None,
+) -> list[dict]:
+    """
+    Full-text search over an owner's posts, best matches first.
+
+    Parameters:
+        owner_id (Any): The ID of the user whose posts are searched.
+        terms (str): The search terms, see `text_search_terms`.
+        limit (int): The maximum number of posts to return.
+        skip (int): The number of ranked results to skip.
+        projection (Optional[dict]): Only fetch these fields. Defaults to the whole post.
+
+    Returns:
+        list[dict]: The matching post documents, each with its relevance `score`.
+    """
+    # NOTE: served by the owner_id_title_excerpt_content_text index, see indexes.py
+    score = {"score": {"$meta": "textScore"}}
+    cursor = posts_coll.find(
+        {"owner_id": owner_id, "$text": {"$search": terms}},
+        projection={**(stored_projection(projection) or {}), **score},
+    ).sort([("score", {"$meta": "textScore"}), ("_id", ASCENDING)])
+    if skip:
+        cursor = cursor.skip(skip)
+    return [
+        decode_content(post)
+        for post in await cursor.limit(limit).to_list(length=limit)
+    ]
+
+
+async def update_owned_post(
+    post_id: str,
+    owner_id: Any,
+    changes: dict[str, Any],
+    expected_version: Optional[int] = None,
+) -> Optional[dict]:
+    """
+    Apply changes to an owned post and return the updated document.
+
+    Parameters:
+        post_id (str): The ID of the post to update.
+        owner_id (Any): The ID of the user who must own the post.
+        changes (dict): The fields to $set on the post.
+        expected_version (Optional[int]): Only update if the post still has this version.
+
+    Returns:
+        Optional[dict]: The post after the update, or None if it is missing, not owned or at another version.
+    """
+    post_filter = owned_post_filter(post_id, owner_id, expected_version)
+    # NOTE: a no-op update is just a read, it doesn't bump the version
+    if not changes:
+        found_post = await posts_coll.find_one(post_filter)
+        return (
+            decode_content(found_post) if found_post is not None else None
+        )
+
+    updated_post = await posts_coll.find_one_and_update(
+        post_filter,
+        versioned_update(changes),
+        return_document=ReturnDocument.AFTER,
+    )
+    if updated_post is None:
+        return None
+    # NOTE: the feed keeps the stored form, so it's synced before decoding;
+    # NOTE: posts can't change their published flag, so a draft has no
+    # NOTE: feed entry to touch
+    if updated_post.get("published"):
+        await sync_feed_entry(updated_post["_id"], updated_post)
+    return decode_content(updated_post)
+
+
+async def delete_owned_post(
+    post_id: str, owner_id: Any, expected_version: Optional[int] = None
+) -> Optional[dict]:
+    """
+    Delete an owned post.
+
+    Parameters:
+        post_id (str): The ID of the post to delete.
+        owner_id (Any): The ID of the user who must own the post.
+        expected_version (Optional[int]): Only delete if the post still has this version.
+
+    Returns:
+        Optional[dict]: The deleted post, or None if it is missing, not owned or at another version.
+    """
+    deleted_post = await posts_coll.find_one_and_delete(
+        owned_post_filter(post_id, owner_id, expected_version)
+    )
+    if deleted_post is not None:
+        await adjust_post_count(owner_id, -1)
+        await sync_feed_entry(deleted_post["_id"], None)
+    return deleted_post
+
+
+async def find_post_owner(post_id: str) -> Optional[Any]:
+    """
+    Look up who owns a post.
+
+    Only meant for the failure path of the owner-scoped queries above,
+    to tell a missing post (404) apart from someone else's post (403)
+    or a stale If-Match (412).
+
+    Parameters:
+        post_id (str): The ID of the post to look for.
+
+    Returns:
+        Optional[Any]: The owner_id of the post, or None if it doesn't exist.
+    """
+    found_post = await posts_coll.find_one(
+        {"_id": ObjectId(post_id)}, projection={"owner_id": 1}
+    )
+    return found_post["owner_id"] if found_post is not None else None
+
+
+async def find_post_owners(
+    post_ids: list[ObjectId],
+) -> dict[ObjectId, Any]:
+    """
+    Look up who owns each of the given posts in one query.
+
+    Parameters:
+        post_ids (list[ObjectId]): The IDs of the posts.
+
+    Returns:
+        dict[ObjectId, Any]: The owner_id of every post that exists, keyed by post _id.
+    """
+    found_posts = await posts_coll.find(
+        {"_id": {"$in": post_ids}}, projection={"owner_id": 1}
+    ).to_list(length=len(post_ids))
+    return {post["_id"]: post["owner_id"] for post in found_posts}
+
+
+async def find_post_states(
+    post_ids: list[ObjectId],
+) -> dict[ObjectId, dict[str, Any]]:
+    """
+    Look up the owner and version of each of the given posts in one query.
+
+    Parameters:
+        post_ids (list[ObjectId]): The IDs of the posts.
+
+    Returns:
+        dict[ObjectId, dict]: The owner_id, version and last_modified of every post that exists,
+        keyed by post _id.
+    """
+    found_posts = await posts_coll.find(
+        {"_id": {"$in": post_ids}},
+        projection={"owner_id": 1, "version": 1, "last_modified": 1},
+    ).to_list(length=len(post_ids))
+    return {post["_id"]: post for post in found_posts}
+
+
+async def bulk_write_posts(
+    operations: list[Any],
+    ordered: bool,
+    owner_id: Any,
+    post_ids: list[ObjectId],
+) -> tuple[dict[int, dict[str, Any]], int]:
+    """
+    Run inserts, updates and deletes on an owner's posts in a single bulk_write.
+
+    Parameters:
+        operations (list): pymongo InsertOne/UpdateOne/DeleteOne requests.
+        ordered (bool): Stop at the first failed operation instead of running the rest.
+        owner_id (Any): The ID of the user who owns the posts, for their post count.
+        post_ids (list[ObjectId]): The _ids of the posts the operations touch, for the feed.
+
+    Returns:
+        tuple: The write error of every failed operation, keyed by its index in `operations`,
+        and the number of documents the updates matched.
+    """
+    if not operations:
+        return {}, 0
+    write_errors: dict[int, dict[str, Any]] = {}
+    try:
+        result = await posts_coll.bulk_write(operations, ordered=ordered)
+    except BulkWriteError as bulk_error:
+        # NOTE: the writes before and around the failures still happened
+        inserted = bulk_error.details["nInserted"]
+        deleted = bulk_error.details["nRemoved"]
+        matched = bulk_error.details["nMatched"]
+        write_errors = {
+            write_error["index"]: write_error
+            for write_error in bulk_error.details["writeErrors"]
+        }
+    else:
+        # NOTE: the counts from mongo, not the planned operations, so a post
+        # NOTE: deleted by another request in between isn't counted twice
+        inserted = result.inserted_count
+        deleted = result.deleted_count
+        matched = result.matched_count
+
+    await adjust_post_count(owner_id, inserted - deleted)
+    # NOTE: re-read rather than worked out from the operations, which
+    # NOTE: only hold the $set of an update, not the resulting post
+    await sync_feed(post_ids)
+    return write_errors, matched
+
+
+def bulk_item(
+    index: int,
+    post_id: Optional[str],
+    status_code: int,
+    detail: Optional[str] = None,
+) -> dict[str, Any]:
+    return {
+        "index": index,
+        "post_id": post_id,
+        "status_code": status_code,
+        "detail": detail,
+    }
+
+
+async def plan_owned_operations(
+    post_ids: list[str],
+    owner_id: Any,
+    ordered: bool,
+    make_operation: Callable[[int, ObjectId, int], Any],
+) -> tuple[list[tuple[int, str, Any]], dict[int, dict[str, Any]]]:
+    """
+    Checks ownership of every post in a bulk request with one query.
+
+    A post_id that repeats an earlier item's is a 400, so every planned write
+    has a post of its own and its result can be read back from that post.
+
+    Parameters:
+        post_ids (list[str]): The post IDs in request order.
+        owner_id (Any): The ID of the user who must own the posts.
+        ordered (bool): Stop planning at the first item that fails its checks.
+        make_operation (Callable): Builds the write for an item from its index, _id and current
+            version, or returns None when there is nothing to write.
+
+    Returns:
+        tuple: The (index, post_id, operation) writes to run and the results already known.
+    """
+    valid_ids = [
+        ObjectId(post_id)
+        for post_id in post_ids
+        if ObjectId.is_valid(post_id)
+    ]
+    states = await find_post_states(valid_ids) if valid_ids else {}
+
+    planned: list[tuple[int, str, Any]] = []
+    results: dict[int, dict[str, Any]] = {}
+    seen: set[ObjectId] = set()
+    for index, post_id in enumerate(post_ids):
+        if not ObjectId.is_valid(post_id):
+            results[index] = bulk_item(
+                index,
+                post_id,
+                status.HTTP_400_BAD_REQUEST,
+                f"Invalid id: {post_id}",
+            )
+        elif ObjectId(post_id) in seen:
+            results[index] = bulk_item(
+                index,
+                post_id,
+                status.HTTP_400_BAD_REQUEST,
+                f"Duplicate id: {post_id}",
+            )
+        elif ObjectId(post_id) not in states:
+            results[index] = bulk_item(
+                index, post_id, status.HTTP_404_NOT_FOUND, "Post Not Found"
+            )
+        elif states[ObjectId(post_id)]["owner_id"] != owner_id:
+            results[index] = bulk_item(
+                index,
+                post_id,
+                status.HTTP_403_FORBIDDEN,
+                "User Not Authorized to Access Post",
+            )
+        else:
+            seen.add(ObjectId(post_id))
+            operation = make_operation(
+                index,
+                ObjectId(post_id),
+                document_version(states[ObjectId(post_id)]),
+            )
+            if operation is None:
+                results[index] = bulk_item(
+                    index, post_id, status.HTTP_200_OK
+                )
+            else:
+                planned.append((index, post_id, operation))
+            continue
+
+        # NOTE: ordered mode stops at the first failure like the write itself would
+        if ordered:
+            break
+
+    return planned, results
+
+
+async def unmatched_updates(
+    planned: list[tuple[int, str, Any]],
+    attempted: list[int],
+    expected_writes: dict[int, tuple[int, datetime]],
+    owner_id: Any,
+) -> dict[int, dict[str, Any]]:
+    """
+    Works out which version-scoped updates of a bulk_write didn't match.
+
+    Parameters:
+        planned (list): The (index, post_id, operation) writes that ran, one per post.
+        attempted (list): The positions in `planned` that didn't fail with a write error.
+        expected_writes (dict): The version and last_modified every write leaves its post at,
+            by position in `planned`.
+        owner_id (Any): The ID of the user who must own the posts.
+
+    Returns:
+        dict[int, dict]: The result of every item that wasn't updated, keyed by its request index.
+    """
+    states = await find_post_states(
+        [ObjectId(planned[op_index][1]) for op_index in attempted]
+    )
+    results: dict[int, dict[str, Any]] = {}
+    for op_index in attempted:
+        index, post_id, _ = planned[op_index]
+        state = states.get(ObjectId(post_id))
+        if state is None:
+            results[index] = bulk_item(
+                index, post_id, status.HTTP_404_NOT_FOUND, "Post Not Found"
+            )
+        elif state["owner_id"] != owner_id:
+            results[index] = bulk_item(
+                index,
+                post_id,
+                status.HTTP_403_FORBIDDEN,
+                "User Not Authorized to Access Post",
+            )
+        # NOTE: a post holding any other write than this position's own,
+        # NOTE: even one that left it at the same version, wasn't updated
+        elif (
+            document_version(state),
+            document_last_modified(state),
+        ) != expected_writes[op_index]:
+            results[index] = bulk_item(
+                index,
+                post_id,
+                status.HTTP_409_CONFLICT,
+                "Post Changed During The Request",
+            )
+    return results
+
+
+async def run_bulk(
+    planned: list[tuple[int, str, Any]],
+    results: dict[int, dict[str, Any]],
+    requested_ids: list[Optional[str]],
+    ordered: bool,
+    success_code: int,
+    owner_id: Any,
+    expected_writes: Optional[dict[int, tuple[int, datetime]]] = None,
+) -> dict[str, Any]:
+    """
+    Runs the planned writes in one bulk_write and reports every item.
+
+    Parameters:
+        planned (list): The (index, post_id, operation) writes to run.
+        results (dict): The results already known for items that were not planned.
+        requested_ids (list): The post_id sent for every item, None when creating.
+        ordered (bool): Stop at the first failed write.
+        success_code (int): The status code reported for a successful item.
+        owner_id (Any): The ID of the user who owns the posts.
+        expected_writes (dict, optional): For updates, the version and last_modified every
+            planned write leaves its post at, by its position in `planned`.
+
+    Returns:
+        dict: The `ResponseBulk` body.
+    """
+    write_errors, matched = await bulk_write_posts(
+        [operation for _, _, operation in planned],
+        ordered,
+        owner_id,
+        [ObjectId(post_id) for _, post_id, _ in planned],
+    )
+    failed_at = min(write_errors) if ordered and write_errors else None
+    attempted = [
+        op_index
+        for op_index in range(len(planned))
+        if op_index not in write_errors
+        and (failed_at is None or op_index < failed_at)
+    ]
+    # NOTE: every update matching its post is the common case, anything
+    # NOTE: less means some posts changed between the check and the write
+    if expected_writes is not None and matched < len(attempted):
+        results.update(
+            await unmatched_updates(
+                planned, attempted, expected_writes, owner_id
+            )
+        )
+
+    for op_index, (index, post_id, _) in enumerate(planned):
+        if index in results:
+            continue
+        if op_index in write_errors:
+            write_error = write_errors[op_index]
+            results[index] = bulk_item(
+                index,
+                post_id,
+                status.HTTP_409_CONFLICT
+                if write_error["code"] == DUPLICATE_KEY_ERROR
+                else status.HTTP_500_INTERNAL_SERVER_ERROR,
+                write_error["errmsg"],
+            )
+        elif failed_at is not None and op_index > failed_at:
+            break
+        else:
+            results[index] = bulk_item(index, post_id, success_code)
+
+    # NOTE: whatever is left was never attempted because an earlier item failed in ordered mode
+    for index, post_id in enumerate(requested_ids):
+        results.setdefault(
+            index,
+            bulk_item(
+                index,
+                post_id,
+                status.HTTP_424_FAILED_DEPENDENCY,
+                "Not Attempted After An Earlier Failure",
+            ),
+        )
+
+    ordered_results = [
+        results[index] for index in range(len(requested_ids))
+    ]
+    succeeded = sum(
+        1 for item in ordered_results if item["status_code"] < 300
+    )
+    return {
+        "succeeded": succeeded,
+        "failed": len(ordered_results) - succeeded,
+        "results": ordered_results,
+    }
+
+
+async def bulk_insert_posts(
+    posts: list[dict[str, Any]], owner_id: Any, ordered: bool
+) -> dict[str, Any]:
+    """
+    Insert many new posts for an owner in a single bulk_write.
+
+    Parameters:
+        posts (list[dict]): The new post documents, in request order.
+        owner_id (Any): The ID of the user creating the posts.
+        ordered (bool): Stop at the first post that fails to insert.
+
+    Returns:
+        dict: The `ResponseBulk` body, every item with its new post_id.
+    """
+    planned = []
+    for index, post in enumerate(posts):
+        post["owner_id"] = owner_id
+        # NOTE: ids are set here so every item knows its post_id even if the batch fails
+        post["_id"] = ObjectId()
+        planned.append(
+            (index, str(post["_id"]), InsertOne(stamp_new_post(post)))
+        )
+
+    return await run_bulk(
+        planned,
+        {},
+        [None] * len(posts),
+        ordered,
+        status.HTTP_201_CREATED,
+        owner_id,
+    )
+
+
+async def bulk_update_owned_posts(
+    updates: list[tuple[str, dict[str, Any]]],
+    owner_id: Any,
+    ordered: bool,
+) -> dict[str, Any]:
+    """
+    Apply changes to many owned posts in a single bulk_write.
+
+    Parameters:
+        updates (list[tuple[str, dict]]): The post_id and the fields to $set of every post, in request order.
+        owner_id (Any): The ID of the user who must own the posts.
+        ordered (bool): Stop at the first post that can't be updated.
+
+    Returns:
+        dict: The `ResponseBulk` body.
+    """
+    expected_writes: dict[int, tuple[int, datetime]] = {}
+    # NOTE: one stamp for the request, cut to the milliseconds mongo keeps,
+    # NOTE: so reading a post back tells whether it holds this write
+    now = datetime.now(timezone.utc)
+    modified_at = now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+    def make_operation(
+        index: int, post_id: ObjectId, version: int
+    ) -> Optional[UpdateOne]:
+        changes = updates[index][1]
+        if not changes:
+            return None
+        # NOTE: still scoped by owner_id and the checked version, so a post
+        # NOTE: that changed since the check is reported instead of overwritten
+        expected_writes[index] = (version + 1, modified_at)
+        return UpdateOne(
+            {
+                "_id": post_id,
+                "owner_id": owner_id,
+                **version_filter(version),
+            },
+            versioned_update(changes, modified_at),
+        )
+
+    post_ids = [post_id for post_id, _ in updates]
+    planned, results = await plan_owned_operations(
+        post_ids, owner_id, ordered, make_operation
+    )
+    return await run_bulk(
+        planned,
+        results,
+        post_ids,
+        ordered,
+        status.HTTP_200_OK,
+        owner_id,
+        expected_writes={
+            op_index: expected_writes[index]
+            for op_index, (index, _, _) in enumerate(planned)
+        },
+    )
+
+
+async def bulk_delete_owned_posts(
+    post_ids: list[str], owner_id: Any, ordered: bool
+) -> dict[str, Any]:
+    """
+    Delete many owned posts in a single bulk_write.
+
+    Parameters:
+        post_ids (list[str]): The IDs of the posts to delete, in request order.
+        owner_id (Any): The ID of the user who must own the posts.
+        ordered (bool): Stop at the first post that can't be deleted.
+
+    Returns:
+        dict: The `ResponseBulk` body.
+    """
+    planned, results = await plan_owned_operations(
+        post_ids,
+        owner_id,
+        ordered,
+        lambda index, post_id, version: DeleteOne(
+            {"_id": post_id, "owner_id": owner_id}
+        ),
+    )
+    return await run_bulk(
+        planned,
+        results,
+        post_ids,
+        ordered,
+        status.HTTP_204_NO_CONTENT,
+        owner_id,
+    )
+
+
+def content_is_current(
+    post: dict[str, Any], stored: dict[str, Any]
+) -> bool:
+    return post.get("excerpt") == stored["excerpt"] and post.get(
+        "content_codec"
+    ) == stored.get("content_codec")
+
+
+async def migrate_post_content(batch_size: int) -> int:
+    """
+    Rewrite posts into the current content storage, see content.py.
+
+    Adds the excerpt to posts created before it existed and compresses or
+    decompresses content to match CONTENT_COMPRESSION. Clients see the
+    same content either way, so version and last_modified (and with them
+    the ETags) are left alone. Safe to run again or while the app serves.
+
+    Parameters:
+        batch_size (int): The number of posts read and rewritten per round trip.
+
+    Returns:
+        int: The number of posts rewritten.
+    """
+    migrated = 0
+    cursor = (
+        posts_coll.find(
+            {},
+            projection=["excerpt", "version", *STORED_CONTENT_FIELDS],
+        )
+        .sort("_id", ASCENDING)
+        .batch_size(batch_size)
+    )
+    operations: list[UpdateOne] = []
+    post_ids: list[ObjectId] = []
+
+    async def flush() -> int:
+        if not operations:
+            return 0
+        result = await posts_coll.bulk_write(operations, ordered=False)
+        await sync_feed(post_ids)
+        operations.clear()
+        post_ids.clear()
+        return result.modified_count
+
+    async for post in cursor:
+        stored, unset = encode_content(
+            {"content": decode_content(dict(post)).get("content", "")}
+        )
+        if content_is_current(post, stored):
+            continue
+        update: dict[str, Any] = {"$set": stored}
+        if unset:
+            update["$unset"] = {name: "" for name in unset}
+        # NOTE: matched on version so a post updated meanwhile isn't
+        # NOTE: overwritten with its old content; missing matches missing
+        operations.append(
+            UpdateOne(
+                {"_id": post["_id"], "version": post.get("version")},
+                update,
+            )
+        )
+        post_ids.append(post["_id"])
+        if len(operations) >= batch_size:
+            migrated += await flush()
+    migrated += await flush()
+    return migrated
@@ -0,0 +1,158 @@
+from functools import lru_cache
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Iterable,
+    Optional,
+    Union,
+)
+import orjson
+from bson.objectid import ObjectId
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, create_model
+
+
+# NOTE: orjson knows datetimes natively, ObjectIds are the only BSON type we return
+def bson_default(value: Any) -> str:
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(
+        f"Type is not JSON serializable: {type(value).__name__}"
+    )
+
+
+class FastJSONResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=bson_default)
+
+
+# NOTE: (document key, output key) for every field of a response model,
+# NOTE: a str validation_alias names the document key when it differs, e.g. "_id"
+@lru_cache(maxsize=None)
+def response_keys(model: type[BaseModel]) -> tuple[tuple[str, str], ...]:
+    return tuple(
+        (
+            field.validation_alias
+            if isinstance(field.validation_alias, str)
+            else name,
+            field.alias or name,
+        )
+        for name, field in model.model_fields.items()
+    )
+
+
+@lru_cache(maxsize=256)
+def partial_model(
+    model: type[BaseModel], fields: tuple[str, ...]
+) -> type[BaseModel]:
+    """
+    Builds a response model with only some of `model`'s fields.
+
+    Args:
+        model (type[BaseModel]): The model to take the fields from.
+        fields (tuple[str, ...]): The field names to keep, in output order.
+
+    Returns:
+        type[BaseModel]: A new model with just those fields, cached per field set.
+    """
+    return create_model(
+        f"{model.__name__}_{'_'.join(fields)}",
+        __config__=model.model_config,
+        **{
+            name: (
+                model.model_fields[name].annotation,
+                model.model_fields[name],
+            )
+            for name in fields
+        },
+    )
+
+
+def shape_document(
+    keys: tuple[tuple[str, str], ...], document: dict, exclude_none: bool
+) -> dict[str, Any]:
+    shaped = {alias: document.get(name) for name, alias in keys}
+    if exclude_none:
+        return {
+            key: value
+            for key, value in shaped.items()
+            if value is not None
+        }
+    return shaped
+
+
+def fast_response(
+    model: type[BaseModel],
+    content: Union[dict, Iterable[dict]],
+    status_code: int = 200,
+    headers: Optional[dict[str, str]] = None,
+    exclude_none: bool = False,
+    envelope: Optional[dict[str, Any]] = None,
+) -> FastJSONResponse:
+    """
+    Builds a JSON response straight from Mongo documents.
+
+    Returning a Response makes FastAPI skip validating and re-serializing
+    the body against `response_model`, which stays on the route for the
+    OpenAPI docs. Only the fields declared on `model` are written out.
+
+    Args:
+        model (type[BaseModel]): The response model whose fields are kept.
+        content (dict | Iterable[dict]): One document, or several for a list response.
+        status_code (int): The response status code. Defaults to 200.
+        headers (dict, optional): Extra response headers.
+        exclude_none (bool): Drop fields whose value is None, like `response_model_exclude_none`.
+        envelope (dict, optional): Wrap a list response as {"items": [...], **envelope}.
+
+    Returns:
+        FastJSONResponse: The orjson encoded response.
+    """
+    keys = response_keys(model)
+    if isinstance(content, dict):
+        body: Any = shape_document(keys, content, exclude_none)
+    else:
+        body = [
+            shape_document(keys, document, exclude_none)
+            for document in content
+        ]
+        if envelope is not None:
+            body = {"items": body, **envelope}
+    return FastJSONResponse(body, status_code=status_code, headers=headers)
+
+
+async def ndjson_chunks(
+    model: type[BaseModel],
+    documents: AsyncIterable[dict],
+    chunk_size: int = 64 * 1024,
+) -> AsyncIterator[bytes]:
+    """
+    Encodes documents as newline delimited JSON for a StreamingResponse.
+
+    Lines are grouped into chunks of about `chunk_size` bytes so the
+    server isn't doing one socket write per document. Nothing more than
+    one chunk is ever held, and the next document is only pulled once the
+    previous chunk has been sent, so a slow client slows the export down
+    instead of making it buffer.
+
+    Args:
+        model (type[BaseModel]): The response model whose fields are kept.
+        documents (AsyncIterable[dict]): The Mongo documents to encode.
+        chunk_size (int): Roughly how many bytes to send at once.
+
+    Yields:
+        bytes: One or more complete NDJSON lines.
+    """
+    keys = response_keys(model)
+    chunk = bytearray()
+    async for document in documents:
+        chunk += orjson.dumps(
+            shape_document(keys, document, exclude_none=False),
+            default=bson_default,
+            option=orjson.OPT_APPEND_NEWLINE,
+        )
+        if len(chunk) >= chunk_size:
+            yield bytes(chunk)
+            chunk.clear()
+    if chunk:
+        yield bytes(chunk)
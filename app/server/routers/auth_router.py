@@ -1,7 +1,7 @@
 from fastapi import APIRouter, status, HTTPException, Depends
 from fastapi.security.oauth2 import OAuth2PasswordRequestForm
 from ..oauth2 import create_access_token
-from ..utils import verify_password
+from ..utils import verify_and_update_password_async
 from ..models import ResponseToken
 from ..database import users_coll
 
@@ -17,17 +17,32 @@ async def user_login(
     user_credentials: OAuth2PasswordRequestForm = Depends(),
 ):
     # NOTE: the form data which i enter has TWO fields username & password
-    user = users_coll.find_one({"username": user_credentials.username})
+    user = await users_coll.find_one(
+        {"username": user_credentials.username}
+    )
 
-    # NOTE: we match the username or password
-    if not user or not verify_password(
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid Credentials",
+        )
+
+    # NOTE: we match the password, bcrypt runs on the hashing pool not the event loop
+    verified, new_hash = await verify_and_update_password_async(
         user_credentials.password, user["password"]
-    ):
+    )
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Invalid Credentials",
         )
 
+    # NOTE: the stored hash used an old bcrypt cost so swap in the rehashed one
+    if new_hash:
+        await users_coll.update_one(
+            {"_id": user["_id"]}, {"$set": {"password": new_hash}}
+        )
+
     # NOTE: currently the token has been payloaded with
     # only "username" i can add more fields if i want
     access_token = create_access_token(data={"username": user["username"]})
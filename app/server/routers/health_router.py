@@ -0,0 +1,86 @@
+import asyncio
+from fastapi import APIRouter, status, Request
+from ..config import settings
+from ..database import mongo
+from ..metrics import mongo_pool_listener
+from ..responses import FastJSONResponse
+
+router = APIRouter()
+
+
+@router.get(
+    "/live",
+    status_code=status.HTTP_200_OK,
+    description="Liveness probe",
+)
+async def live():
+    """
+    Liveness probe.
+
+    Answers as long as the event loop does, it never touches MongoDB so a
+    database outage doesn't get healthy workers restarted.
+    """
+    return {"status": "ok"}
+
+
+@router.get(
+    "/ready",
+    status_code=status.HTTP_200_OK,
+    description="Readiness probe",
+)
+async def ready(request: Request):
+    """
+    Readiness probe.
+
+    Pings MongoDB and reports the connection pool of every server and
+    whether the startup index build is still running, done or failed.
+    A failed build is logged and doesn't make the app unready.
+
+    Returns:
+        FastJSONResponse: 200 if MongoDB answered the ping, 503 otherwise.
+    """
+    mongo_status: dict = {"ok": False}
+    if mongo.client is not None:
+        try:
+            elapsed = await asyncio.wait_for(
+                mongo.ping(), settings.MONGO_HEALTH_TIMEOUT_SECONDS
+            )
+            mongo_status = {
+                "ok": True,
+                "ping_ms": round(elapsed * 1000, 2),
+            }
+        except Exception as error:
+            mongo_status["error"] = type(error).__name__
+    else:
+        mongo_status["error"] = "NotConnected"
+
+    index_bootstrap = getattr(request.app.state, "index_bootstrap", None)
+    # NOTE: "failed" comes with the name of the error as "indexes_error"
+    indexes_status, indexes_error = "done", None
+    if index_bootstrap is not None:
+        if not index_bootstrap.done():
+            indexes_status = "building"
+        elif index_bootstrap.cancelled():
+            indexes_status, indexes_error = "failed", "Cancelled"
+        elif index_bootstrap.result() is not None:
+            indexes_status = "failed"
+            indexes_error = index_bootstrap.result()
+
+    return FastJSONResponse(
+        {
+            "status": "ready" if mongo_status["ok"] else "unavailable",
+            "mongo": mongo_status,
+            "pool": {
+                "max_size": settings.MONGO_MAX_POOL_SIZE,
+                "min_size": settings.MONGO_MIN_POOL_SIZE,
+                "servers": mongo_pool_listener.stats(),
+            },
+            "indexes": indexes_status,
+            **({"indexes_error": indexes_error} if indexes_error else {}),
+        },
+        status_code=(
+            status.HTTP_200_OK
+            if mongo_status["ok"]
+            else status.HTTP_503_SERVICE_UNAVAILABLE
+        ),
+    )
@@ -1,147 +1,579 @@
-from fastapi import APIRouter, status, HTTPException, Response, Depends
+import time
+from fastapi import (
+    APIRouter,
+    status,
+    HTTPException,
+    Response,
+    Depends,
+    Body,
+    Header,
+    Request,
+    Query,
+)
+from fastapi.responses import StreamingResponse
 from fastapi.encoders import jsonable_encoder
 from typing import List
 from ..models import (
     ResponsePost,
+    ResponsePartialPost,
     ResponseCreatePost,
     CreatePost,
     UpdatePost,
     ResponseUpdatePost,
+    BulkUpdatePost,
+    ResponseBulk,
+    ResponsePostPage,
+    ResponseFeedPost,
+    ResponseBatchPosts,
+)
+from ..config import settings
+from ..repositories.post_repository import (
+    find_owned_post,
+    find_owned_posts,
+    list_owned_posts,
+    iter_owned_posts,
+    search_owned_posts,
+    text_search_terms,
+    substring_query,
+    update_owned_post,
+    delete_owned_post,
+    find_post_owner,
+    insert_post,
+    find_post_owners,
+    bulk_item,
+    bulk_insert_posts,
+    bulk_update_owned_posts,
+    bulk_delete_owned_posts,
+    MAX_SEARCH_LENGTH,
 )
-from ..database import posts_coll
-from ..serializers.post_serializer import (
-    post_list_serializer,
-    post_serializer,
+from ..responses import (
+    FastJSONResponse,
+    fast_response,
+    ndjson_chunks,
+    partial_model,
+    response_keys,
+    shape_document,
 )
 from bson.objectid import ObjectId
 from ..oauth2 import get_current_user_data
-from typing import Union, Any, Optional
+from ..singleflight import SingleFlight
+from ..cache import MemoryCache
+from ..repositories.feed_repository import list_feed
+from ..repositories.counter_repository import (
+    get_post_count,
+    count_matching_posts,
+)
+from ..pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor
+from ..conditional import (
+    document_etag,
+    document_last_modified,
+    list_etag,
+    validator_headers,
+    is_not_modified,
+    not_modified_response,
+    parse_if_match,
+)
+from typing import Union, Optional, NoReturn, Literal, Any
+from pydantic import BaseModel
 from datetime import datetime
 
 router = APIRouter()
 
+EXPORT_BATCH_SIZE = settings.EXPORT_BATCH_SIZE
+FEED_MAX_LIMIT = settings.FEED_MAX_LIMIT
+LIST_MAX_LIMIT = settings.LIST_MAX_LIMIT
+BULK_MAX_BATCH_SIZE = settings.BULK_MAX_BATCH_SIZE
 
-def find_post(post_id: str) -> Any:
-    """
-    Find a post by its ID.
-
-    Parameters:
-        post_id (str): The ID of the post to find.
+# NOTE: concurrent reads of the same post by its owner share one query
+post_reads = SingleFlight("get_post")
 
-    Returns:
-        Any: The post with the specified ID, or None if no such post exists.
-    """
-    return posts_coll.find_one({"_id": ObjectId(post_id)})
+# NOTE: search totals for ?envelope=true, unfiltered totals come from
+# NOTE: the counters collection instead, see counter_repository.py
+filtered_counts = MemoryCache(
+    settings.FILTERED_COUNT_CACHE_SIZE, settings.FILTERED_COUNT_TTL_SECONDS
+)
 
 
-def validate_post(post_id: str) -> bool:
+async def raise_post_access_error(
+    post_id: str, owner_id: Any, expected_version: Optional[int] = None
+) -> NoReturn:
     """
-    Validates a post by checking if it exists in the database.
+    Raises the right error after an owner-scoped query came back empty.
 
     Parameters:
-        post_id (str): The unique identifier of the post.
-
-    Returns:
-        bool: True if the post is found, False otherwise.
+        post_id (str): The ID of the post that could not be accessed.
+        owner_id (Any): The ID of the current user.
+        expected_version (Optional[int]): The version the query required, from If-Match.
 
     Raises:
-        HTTPException: If the post is not found in the database.
+        HTTPException: 404 if the post doesn't exist, 403 if another user owns it,
+            412 if it's the user's post but no longer at the expected version.
     """
-    found_post = find_post(post_id)
-    if found_post:
-        return True
+    # NOTE: this extra read only happens on the failure path,
+    # NOTE: a successful request is always a single round trip
+    post_owner = await find_post_owner(post_id)
+    if post_owner is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Post Not Found",
+        )
+
+    if post_owner != owner_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User Not Authorized to Access Post",
+        )
+
+    if expected_version is not None:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Precondition Failed",
+        )
 
+    # NOTE: owned and no version asked for, so it was deleted in between
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
         detail="Post Not Found",
     )
 
 
-def validate_user_for_the_post(
-    post_id: str, current_user_data: dict[str, str]
-) -> bool:
+def validate_id(post_id: str) -> bool:
     """
-    Validates whether the current user is authorized to access a specific post.
+    Validate a post ID.
 
     Args:
         post_id (str): The ID of the post to be validated.
-        current_user_data (dict): The data of the current user.
 
     Returns:
-        bool: True if the current user is authorized to access the post, False otherwise.
+        bool: True if the post ID is valid, False otherwise.
 
     Raises:
-        HTTPException: If the current user is not authorized to access the post.
+        HTTPException: If the post ID is invalid.
+
     """
-    found_post = find_post(post_id)
-    if found_post["owner_id"] == current_user_data["_id"]:
+    # NOTE: checks if post_id is a 24 character hex string
+    if ObjectId.is_valid(post_id):
         return True
     raise HTTPException(
-        status_code=status.HTTP_403_FORBIDDEN,
-        detail="User Not Authorized to Access Post",
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Invalid id: {post_id}",
     )
 
 
-def validate_id(post_id: str) -> bool:
+def parse_fields(
+    fields: Optional[str],
+) -> tuple[type[BaseModel], Optional[dict[str, int]]]:
     """
-    Validate a post ID.
+    Turns a ?fields= list into a response model and a Mongo projection.
 
     Args:
-        post_id (str): The ID of the post to be validated.
+        fields (str, optional): Comma separated field names, e.g. "id,title,creation_time".
 
     Returns:
-        bool: True if the post ID is valid, False otherwise.
+        tuple: The reduced response model and the projection, or ResponsePost and None when no fields were asked for.
 
     Raises:
-        HTTPException: If the post ID is invalid.
+        HTTPException: If an unknown field is asked for.
+    """
+    requested = tuple(
+        dict.fromkeys(
+            name.strip()
+            for name in (fields or "").split(",")
+            if name.strip()
+        )
+    )
+    # NOTE: a blank or commas only value asks for no particular fields,
+    # NOTE: the same as leaving ?fields= out
+    if not requested:
+        return ResponsePost, None
+
+    unknown = [
+        name
+        for name in requested
+        if name not in ResponsePartialPost.model_fields
+    ]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid fields: {', '.join(unknown)}",
+        )
 
+    # NOTE: _id always comes back from mongo so "id" needs no projection entry,
+    # NOTE: version and last_modified are always read for the ETag headers
+    projection = {name: 1 for name in requested if name != "id"}
+    projection.update(version=1, last_modified=1)
+    return partial_model(ResponsePartialPost, requested), projection
+
+
+def fields_variant(response_model: type[BaseModel]) -> str:
+    # NOTE: the fields in output order, part of the ETag so a partial body
+    # NOTE: never validates a full one; empty for the full ResponsePost
+    if response_model is ResponsePost:
+        return ""
+    return "fields:" + ",".join(response_model.model_fields) + ";"
+
+
+def conditional_response(
+    request: Request,
+    response_model: type[BaseModel],
+    content: Union[dict, list[dict]],
+    etag: str,
+    last_modified: Optional[datetime],
+    headers: Optional[dict[str, str]] = None,
+    envelope: Optional[dict[str, Any]] = None,
+) -> Response:
     """
-    # NOTE: checks if post_id is a 24 character hex string
-    if ObjectId.is_valid(post_id):
-        return True
-    raise HTTPException(
-        status_code=status.HTTP_400_BAD_REQUEST,
-        detail=f"Invalid id: {post_id}",
+    Answers a GET with 304 if the client's copy is current, else with the body.
+
+    Args:
+        request (Request): The incoming request, for its conditional headers.
+        response_model (type[BaseModel]): The model the body is encoded against.
+        content (dict | list[dict]): The post document(s).
+        etag (str): The ETag of the response.
+        last_modified (Optional[datetime]): When a single post last changed, None for lists.
+        headers (dict, optional): Extra headers, sent with the 304 too.
+        envelope (dict, optional): Wrap a list in {"items": [...], **envelope}.
+
+    Returns:
+        Response: A body-less 304, or the encoded content.
+    """
+    # NOTE: lists are sent without a last_modified: the newest post on a page
+    # NOTE: doesn't change when a post is deleted or slides onto the page, so
+    # NOTE: If-Modified-Since would 304 a stale page; their ETag covers both
+    headers = {**(headers or {}), **validator_headers(etag, last_modified)}
+    # NOTE: the body is only encoded when the client actually needs it
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(headers)
+    return fast_response(
+        response_model, content, headers=headers, envelope=envelope
     )
 
 
+class FeedWindow:
+    """
+    The newest `size` feed entries, re-read at most every `ttl_seconds`.
+
+    The front pages of the feed, the ones nearly every reader asks for,
+    are sliced out of it without a query. A new post shows up once the
+    window is next refreshed.
+    """
+
+    def __init__(self, size: int, ttl_seconds: float):
+        self.size = size
+        self.ttl_seconds = ttl_seconds
+        self.entries: list[dict] = []
+        self.positions: dict[ObjectId, int] = {}
+        self.expires_at = 0.0
+        # NOTE: on expiry only one request re-reads the window
+        self.refills = SingleFlight("feed_window")
+
+    async def refill(self) -> None:
+        entries = await list_feed(self.size)
+        self.entries = entries
+        self.positions = {
+            entry["_id"]: index for index, entry in enumerate(entries)
+        }
+        self.expires_at = time.monotonic() + self.ttl_seconds
+
+    async def page(
+        self, limit: int, before_id: Optional[ObjectId]
+    ) -> Optional[list[dict]]:
+        """
+        A page of the feed, if it lies inside the window.
+
+        Parameters:
+            limit (int): The number of entries wanted.
+            before_id (Optional[ObjectId]): The _id of the last entry of the previous page.
+
+        Returns:
+            Optional[list[dict]]: The entries, or None when the page has to be queried.
+        """
+        if time.monotonic() >= self.expires_at:
+            await self.refills.do("window", self.refill)
+
+        start = 0
+        if before_id is not None:
+            if before_id not in self.positions:
+                return None
+            start = self.positions[before_id] + 1
+        # NOTE: a window that isn't full holds the whole feed
+        if (
+            start + limit > len(self.entries)
+            and len(self.entries) >= self.size
+        ):
+            return None
+        return self.entries[start : start + limit]
+
+
+feed_window = FeedWindow(
+    settings.FEED_HOT_WINDOW, settings.FEED_CACHE_TTL_SECONDS
+)
+
+
+async def filtered_total(
+    owner_id: Any, search_key: str, query: dict[str, Any]
+) -> int:
+    """
+    The total of a filtered listing, from a short lived cache.
+
+    Parameters:
+        owner_id (Any): The ID of the user whose posts are listed.
+        search_key (str): What identifies the filter, e.g. the search mode and terms.
+        query (dict): The filter on top of the owner scope.
+
+    Returns:
+        int: The number of matching posts, up to FILTERED_COUNT_TTL_SECONDS old.
+    """
+    cache_key = f"{owner_id}:{search_key}"
+    cached = await filtered_counts.get(cache_key)
+    if cached is not None:
+        return cached["total"]
+    total = await count_matching_posts(owner_id, query)
+    await filtered_counts.set(cache_key, {"total": total})
+    return total
+
+
+def validate_batch_size(size: int) -> None:
+    """
+    Rejects bulk requests with more than BULK_MAX_BATCH_SIZE items.
+
+    Args:
+        size (int): The number of items in the request.
+
+    Raises:
+        HTTPException: If the batch is too large.
+    """
+    if size > BULK_MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch Too Large: at most {BULK_MAX_BATCH_SIZE} items",
+        )
+
+
 @router.get(
     "/",
     response_description="Get all posts",
-    # NOTE: reponse is a List
-    response_model=List[ResponsePost],
+    # NOTE: reponse is a List, or a ResponsePostPage with envelope=true
+    response_model=Union[List[ResponsePost], ResponsePostPage],
 )
 async def get_all_posts(
-    limit: int = 10,
-    page: int = 1,
+    request: Request,
+    limit: int = Query(10, ge=1, le=LIST_MAX_LIMIT),
+    page: int = Query(1, ge=1),
+    cursor: Optional[str] = None,
     search: Optional[str] = "",
+    search_mode: Literal["text", "substring"] = "text",
+    fields: Optional[str] = None,
+    envelope: bool = False,
     current_user_data: dict[str, str] = Depends(get_current_user_data),
-) -> list[dict[str, str]]:
+) -> FastJSONResponse:
     """
     Get all posts.
 
     Parameters:
-        limit (int): The maximum number of posts to retrieve. Defaults to 10.
-        page (int): The page number of the posts to retrieve. Defaults to 1.
+        limit (int): The maximum number of posts to retrieve, 1 to LIST_MAX_LIMIT. Defaults to 10.
+        page (int): The page number of the posts to retrieve, from 1. Defaults to 1. Kept for compatibility, prefer `cursor`.
+        cursor (str, optional): The opaque `X-Next-Cursor` value from the previous page. Takes precedence over `page`.
+        search (str, optional): Only return posts matching this search.
+        search_mode (str): "text" (default) runs an indexed full-text search over title and content (only the excerpt of compressed content), best matches first, paged with `page`.
+            "substring" keeps the old case-insensitive title substring match and supports `cursor`.
+        fields (str, optional): Comma separated fields to return, e.g. "id,title,excerpt". Only these are read from Mongo,
+            so leaving out content skips reading and decompressing it.
+        envelope (bool): Return {"items": [...], "total": ..., "next": ...} instead of a bare list. Defaults to False.
+            For text search "next" is the next `page`, otherwise the next `cursor`.
         current_user_data (dict): The data of the current user. Defaults to the result of the `get_current_user_data` function.
 
     Returns:
-        list[dict[str, str]]: A list of posts as dictionaries, where each post has a `'str'` key and a `'str'` value.
-    """
-    skip: int = (page - 1) * limit
-    posts: list[dict[str, str]] = post_list_serializer(
-        posts_coll.find(
-            {
-                "$and": [
-                    {"owner_id": current_user_data["_id"]},
-                    {"title": {"$regex": search, "$options": "i"}},
-                ]
+        FastJSONResponse: The list of posts, encoded straight from the Mongo documents.
+        The cursor for the next page, if there is one, is set in the `X-Next-Cursor` response header.
+        An ETag is set too, a matching If-None-Match gets a 304.
+    """
+    response_model, projection = parse_fields(fields)
+    owner_id = current_user_data["_id"]
+    variant = fields_variant(response_model)
+
+    if search and search_mode == "text":
+        search_terms = text_search_terms(search)
+        if not search_terms:
+            return conditional_response(
+                request,
+                response_model,
+                [],
+                list_etag(
+                    [],
+                    variant=variant + ("envelope:0" if envelope else ""),
+                ),
+                None,
+                envelope={"total": 0, "next": None} if envelope else None,
+            )
+        # NOTE: relevance ranked results have no stable _id order to seek on,
+        # NOTE: so text search pages with page like before; one extra post
+        # NOTE: tells us if there is a next page
+        ranked_posts = await search_owned_posts(
+            owner_id,
+            search_terms,
+            limit + 1,
+            skip=(page - 1) * limit,
+            projection=projection,
+        )
+        next_page = None
+        if len(ranked_posts) > limit:
+            ranked_posts = ranked_posts[:limit]
+            next_page = str(page + 1)
+        page_envelope = None
+        if envelope:
+            page_envelope = {
+                "total": await filtered_total(
+                    owner_id,
+                    f"text:{search_terms}",
+                    {"$text": {"$search": search_terms}},
+                ),
+                "next": next_page,
             }
+        return conditional_response(
+            request,
+            response_model,
+            ranked_posts,
+            list_etag(
+                ranked_posts,
+                variant=variant
+                + (
+                    f"envelope:{page_envelope['total']}:{next_page}"
+                    if page_envelope
+                    else ""
+                ),
+            ),
+            None,
+            envelope=page_envelope,
+        )
+
+    after_id = decode_cursor(cursor) if cursor else None
+    # NOTE: page only falls back to skip when no cursor was sent
+    skip: int = 0 if cursor else (page - 1) * limit
+    query = substring_query(search) if search_mode == "substring" else {}
+
+    # NOTE: fetching one extra post tells us if there is a next page
+    found_posts = await list_owned_posts(
+        owner_id,
+        query,
+        limit + 1,
+        after_id=after_id,
+        skip=skip,
+        projection=projection,
+    )
+    headers: dict[str, str] = {}
+    if len(found_posts) > limit:
+        found_posts = found_posts[:limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(found_posts[-1]["_id"])
+
+    variant += headers.get(NEXT_CURSOR_HEADER, "")
+    page_envelope = None
+    if envelope:
+        # NOTE: unfiltered totals are kept up to date on every write, only
+        # NOTE: filtered ones need counting and those are cached
+        total = (
+            await filtered_total(
+                owner_id, f"substring:{search[:MAX_SEARCH_LENGTH]}", query
+            )
+            if query
+            else await get_post_count(owner_id)
         )
-        .skip(skip)
-        .limit(limit)
+        page_envelope = {
+            "total": total,
+            "next": headers.get(NEXT_CURSOR_HEADER),
+        }
+        variant += f"envelope:{total}"
+
+    return conditional_response(
+        request,
+        response_model,
+        found_posts,
+        list_etag(found_posts, variant=variant),
+        None,
+        headers=headers,
+        envelope=page_envelope,
+    )
+
+
+# NOTE: declared before /{post_id} so "feed" isn't taken for a post id
+@router.get(
+    "/feed",
+    description="Public feed of published posts",
+    response_model=List[ResponseFeedPost],
+)
+async def get_feed(
+    request: Request,
+    limit: int = Query(20, ge=1, le=FEED_MAX_LIMIT),
+    cursor: Optional[str] = None,
+) -> Response:
+    """
+    The newest published posts of every user, no login needed.
+
+    Parameters:
+        limit (int): The number of posts per page, 1 to FEED_MAX_LIMIT. Defaults to 20.
+        cursor (str, optional): The opaque `X-Next-Cursor` value from the previous page.
+
+    Returns:
+        Response: The posts, newest first, with the next page's cursor in `X-Next-Cursor`.
+        An ETag is set too, a matching If-None-Match gets a 304.
+    """
+    before_id = decode_cursor(cursor) if cursor else None
+
+    # NOTE: fetching one extra post tells us if there is a next page
+    entries = await feed_window.page(limit + 1, before_id)
+    if entries is None:
+        entries = await list_feed(limit + 1, before_id)
+
+    headers: dict[str, str] = {}
+    if len(entries) > limit:
+        entries = entries[:limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(entries[-1]["_id"])
+
+    return conditional_response(
+        request,
+        ResponseFeedPost,
+        entries,
+        list_etag(entries, variant=headers.get(NEXT_CURSOR_HEADER, "")),
+        None,
+        headers=headers,
+    )
+
+
+# NOTE: declared before /{post_id} so "export" isn't taken for a post id
+@router.get(
+    "/export",
+    description="Export all posts as NDJSON",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {"application/x-ndjson": {}},
+            "description": "One ResponsePost JSON object per line",
+        }
+    },
+)
+async def export_posts(
+    current_user_data: dict[str, str] = Depends(get_current_user_data),
+) -> StreamingResponse:
+    """
+    Export all posts.
+
+    Streams every post the current user owns as newline delimited JSON,
+    one `ResponsePost` per line, reading them from Mongo in batches of
+    `EXPORT_BATCH_SIZE`.
+
+    Parameters:
+        current_user_data (dict): The data of the current user.
+
+    Returns:
+        StreamingResponse: The NDJSON stream.
+    """
+    documents = iter_owned_posts(
+        current_user_data["_id"], EXPORT_BATCH_SIZE
+    )
+    return StreamingResponse(
+        ndjson_chunks(ResponsePost, documents),
+        media_type="application/x-ndjson",
     )
-    return posts
 
 
 # NOTE: pretty simple, just gets the post where
@@ -155,8 +587,10 @@ async def get_all_posts(
 )
 async def get_post(
     post_id: str,
+    request: Request,
+    fields: Optional[str] = None,
     current_user_data: dict[str, str] = Depends(get_current_user_data),
-) -> dict[str, str] | None:
+) -> Response:
     """
     A description of the entire function, its parameters, and its return types.
 
@@ -167,26 +601,141 @@ async def get_post(
     Parameters:
         - post_id: str
             The ID of the post to retrieve.
+        - fields: str, optional
+            Comma separated fields to return, e.g. "id,title". Only these are read from Mongo.
         - current_user_data: dict[str, str], optional
             The data of the current user.
 
     Returns:
-        - dict[str, str] | None
-            The serialized post data if the post and user are valid, otherwise None.
+        - Response
+            The post, encoded straight from the Mongo document, with ETag and Last-Modified headers.
+            A 304 without a body if If-None-Match or If-Modified-Since show the client's copy is current.
 
     Raises:
         - HTTPException
             If the post ID is invalid.
     """
     validate_id(post_id)
+    response_model, projection = parse_fields(fields)
+
+    # NOTE: one query scoped by post_id AND owner_id, if nothing comes back
+    # NOTE: raise_post_access_error works out whether that's a 404 or a 403
+    owner_id = current_user_data["_id"]
+    found_post = await post_reads.do(
+        (post_id, owner_id, tuple(projection) if projection else None),
+        lambda: find_owned_post(post_id, owner_id, projection=projection),
+    )
+    if found_post is None:
+        await raise_post_access_error(post_id, current_user_data["_id"])
+
+    return conditional_response(
+        request,
+        response_model,
+        found_post,
+        document_etag(found_post, variant=fields_variant(response_model)),
+        document_last_modified(found_post),
+    )
 
-    # NOTE: here first post_id is checked whether exists in DB or not?
-    # NOTE: is post_id is valid,i.e post is present then check current user actual owner
-    # NOTE: if so then return the post
-    if validate_post(post_id):
-        if validate_user_for_the_post(post_id, current_user_data):
-            print(current_user_data)
-            return post_serializer(find_post(post_id))
+
+@router.post(
+    "/batch",
+    description="Get many Posts",
+    response_model=ResponseBatchPosts,
+)
+async def batch_get_posts(
+    post_ids: List[str] = Body(...),
+    fields: Optional[str] = None,
+    current_user_data: dict[str, str] = Depends(get_current_user_data),
+) -> FastJSONResponse:
+    """
+    Get many Posts in one request.
+
+    Args:
+        post_ids (List[str]): The IDs of the posts to get, at most BULK_MAX_BATCH_SIZE.
+        fields (str, optional): Comma separated fields to return for every post, e.g. "id,title,excerpt".
+        current_user_data (dict): The data of the current user.
+
+    Returns:
+        FastJSONResponse: The result of every ID, in request order; the post when it's found,
+        else a 400, 403 or 404 status_code like GET /{post_id} would answer.
+    """
+    validate_batch_size(len(post_ids))
+    response_model, projection = parse_fields(fields)
+    owner_id = current_user_data["_id"]
+
+    valid_ids = list(
+        dict.fromkeys(
+            ObjectId(post_id)
+            for post_id in post_ids
+            if ObjectId.is_valid(post_id)
+        )
+    )
+    # NOTE: one query for all the owned posts, a second one only for the
+    # NOTE: IDs that weren't found, to tell missing apart from not owned
+    found_posts = (
+        {
+            post["_id"]: post
+            for post in await find_owned_posts(
+                valid_ids, owner_id, projection=projection
+            )
+        }
+        if valid_ids
+        else {}
+    )
+    not_found = [
+        post_id for post_id in valid_ids if post_id not in found_posts
+    ]
+    owners = await find_post_owners(not_found) if not_found else {}
+
+    keys = response_keys(response_model)
+    results = []
+    for index, post_id in enumerate(post_ids):
+        if not ObjectId.is_valid(post_id):
+            results.append(
+                bulk_item(
+                    index,
+                    post_id,
+                    status.HTTP_400_BAD_REQUEST,
+                    f"Invalid id: {post_id}",
+                )
+            )
+        elif ObjectId(post_id) in found_posts:
+            item = bulk_item(index, post_id, status.HTTP_200_OK)
+            item["post"] = shape_document(
+                keys, found_posts[ObjectId(post_id)], exclude_none=False
+            )
+            results.append(item)
+        elif ObjectId(post_id) in owners:
+            results.append(
+                bulk_item(
+                    index,
+                    post_id,
+                    status.HTTP_403_FORBIDDEN,
+                    "User Not Authorized to Access Post",
+                )
+            )
+        else:
+            results.append(
+                bulk_item(
+                    index,
+                    post_id,
+                    status.HTTP_404_NOT_FOUND,
+                    "Post Not Found",
+                )
+            )
+
+    for item in results:
+        item.setdefault("post", None)
+    found = sum(
+        1 for item in results if item["status_code"] == status.HTTP_200_OK
+    )
+    return FastJSONResponse(
+        {
+            "found": found,
+            "failed": len(results) - found,
+            "results": results,
+        }
+    )
 
 
 @router.post(
@@ -197,6 +746,7 @@ async def get_post(
 )
 async def create_post(
     post: CreatePost,
+    response: Response,
     current_user_data: dict = Depends(get_current_user_data),
 ) -> dict[str, Union[str, bool, datetime]]:
     """
@@ -215,7 +765,13 @@ async def create_post(
     current_user_id: str = current_user_data["_id"]
     post_encoded["owner_id"] = current_user_id
     # NOTE: only then we insert the post
-    new_post_id = posts_coll.insert_one(post_encoded).inserted_id
+    new_post_id = await insert_post(post_encoded)
+    response.headers.update(
+        validator_headers(
+            document_etag(post_encoded),
+            document_last_modified(post_encoded),
+        )
+    )
     return {
         # NOTE: id must be str as normally it is of type ObjectId
         "post_id": str(new_post_id),
@@ -225,6 +781,98 @@ async def create_post(
     }
 
 
+@router.post(
+    "/bulk",
+    description="Create many Posts",
+    response_model=ResponseBulk,
+)
+async def bulk_create_posts(
+    posts: List[CreatePost],
+    ordered: bool = True,
+    current_user_data: dict = Depends(get_current_user_data),
+) -> dict[str, Any]:
+    """
+    Create many Posts in one request.
+
+    Args:
+        posts (List[CreatePost]): The posts to create, at most BULK_MAX_BATCH_SIZE.
+        ordered (bool): Stop at the first post that fails to insert. Defaults to True.
+        current_user_data (dict): The data of the current user.
+
+    Returns:
+        dict[str, Any]: The result of every post, in request order, with its new post_id.
+    """
+    validate_batch_size(len(posts))
+    return await bulk_insert_posts(
+        [jsonable_encoder(post) for post in posts],
+        current_user_data["_id"],
+        ordered,
+    )
+
+
+# NOTE: declared before PUT /{post_id} so "bulk" isn't taken for a post id
+@router.put(
+    "/bulk",
+    description="Update many Posts",
+    response_model=ResponseBulk,
+)
+async def bulk_update_posts(
+    posts: List[BulkUpdatePost],
+    ordered: bool = True,
+    current_user_data: dict[str, str] = Depends(get_current_user_data),
+) -> dict[str, Any]:
+    """
+    Update many Posts in one request.
+
+    Args:
+        posts (List[BulkUpdatePost]): The post_id and changes of every post, at most BULK_MAX_BATCH_SIZE.
+        ordered (bool): Stop at the first post that can't be updated. Defaults to True.
+        current_user_data (dict): The data of the current user.
+
+    Returns:
+        dict[str, Any]: The result of every post, in request order.
+    """
+    validate_batch_size(len(posts))
+    return await bulk_update_owned_posts(
+        [
+            (
+                post.post_id,
+                post.model_dump(exclude_none=True, exclude={"post_id"}),
+            )
+            for post in posts
+        ],
+        current_user_data["_id"],
+        ordered,
+    )
+
+
+@router.post(
+    "/bulk/delete",
+    description="Delete many Posts",
+    response_model=ResponseBulk,
+)
+async def bulk_delete_posts(
+    post_ids: List[str] = Body(...),
+    ordered: bool = True,
+    current_user_data: dict[str, str] = Depends(get_current_user_data),
+) -> dict[str, Any]:
+    """
+    Delete many Posts in one request.
+
+    Args:
+        post_ids (List[str]): The IDs of the posts to delete, at most BULK_MAX_BATCH_SIZE.
+        ordered (bool): Stop at the first post that can't be deleted. Defaults to True.
+        current_user_data (dict): The data of the current user.
+
+    Returns:
+        dict[str, Any]: The result of every post, in request order.
+    """
+    validate_batch_size(len(post_ids))
+    return await bulk_delete_owned_posts(
+        post_ids, current_user_data["_id"], ordered
+    )
+
+
 @router.put(
     "/{post_id}",
     description="Updating a Post",
@@ -235,33 +883,49 @@ async def create_post(
 async def update_post(
     post_id: str,
     post: UpdatePost,
+    if_match: Optional[str] = Header(None),
     current_user_data: dict[str, str] = Depends(get_current_user_data),
-) -> dict[str, str] | None:
+) -> FastJSONResponse:
     """
     Updates a post with the specified post ID.
 
     Args:
         post_id (str): The ID of the post to be updated.
         post (UpdatePost): The updated post data.
+        if_match (str, optional): The post's ETag, the update only happens if the post hasn't changed since.
         current_user_data (dict): The data of the current user.
 
     Returns:
-        Union[dict[str, str], None]: The updated post as a dictionary, or None if the post was not found.
+        FastJSONResponse: The updated post, encoded straight from the Mongo document, with its new ETag.
 
     Raises:
         PostIDValidationError: If the post ID is invalid.
     """
     validate_id(post_id)
+    expected_version = parse_if_match(if_match, post_id)
+
+    # NOTE: UPDATE THE POST and get the updated one back in the same round trip,
+    # NOTE: the If-Match version is part of the same query's filter
+    updated_post = await update_owned_post(
+        post_id,
+        current_user_data["_id"],
+        post.model_dump(exclude_none=True),
+        expected_version=expected_version,
+    )
+    if updated_post is None:
+        await raise_post_access_error(
+            post_id, current_user_data["_id"], expected_version
+        )
 
-    if validate_post(post_id):
-        if validate_user_for_the_post(post_id, current_user_data):
-            # NOTE: UPDATE THE POST
-            posts_coll.update_one(
-                {"_id": ObjectId(post_id)},
-                {"$set": post.model_dump(exclude_none=True)},
-            )
-            # NOTE: after this post was updated, so NOW found_post is the updated one.
-            return post_serializer(find_post(post_id))
+    return fast_response(
+        ResponseUpdatePost,
+        updated_post,
+        headers=validator_headers(
+            document_etag(updated_post),
+            document_last_modified(updated_post),
+        ),
+        exclude_none=True,
+    )
 
 
 @router.delete(
@@ -271,6 +935,7 @@ async def update_post(
 )
 async def delete_post(
     post_id: str,
+    if_match: Optional[str] = Header(None),
     current_user_data: dict[str, str] = Depends(get_current_user_data),
 ):
     """
@@ -278,15 +943,24 @@ async def delete_post(
 
     Parameters:
         - post_id (str): The ID of the post to delete.
+        - if_match (str, optional): The post's ETag, the delete only happens if the post hasn't changed since.
         - current_user_data (dict, optional): The data of the current user. Defaults to the result of the `get_current_user_data` dependency.
 
     Returns:
         - Response: The response object with a status code of 204 (No Content).
     """
     validate_id(post_id)
+    expected_version = parse_if_match(if_match, post_id)
+
+    # NOTE: DELETE THE POST
+    deleted_post = await delete_owned_post(
+        post_id,
+        current_user_data["_id"],
+        expected_version=expected_version,
+    )
+    if deleted_post is None:
+        await raise_post_access_error(
+            post_id, current_user_data["_id"], expected_version
+        )
 
-    if validate_post(post_id):
-        if validate_user_for_the_post(post_id, current_user_data):
-            # NOTE: DELETE THE POST
-            posts_coll.find_one_and_delete({"_id": ObjectId(post_id)})
-            return Response(status_code=status.HTTP_204_NO_CONTENT)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
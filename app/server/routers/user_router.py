@@ -1,26 +1,26 @@
 from fastapi import APIRouter, status, HTTPException, Depends
 from fastapi.encoders import jsonable_encoder
-from ..utils import hash_password
+from pymongo.errors import DuplicateKeyError
+from ..utils import hash_password_async
 from ..models import CreateUser, ResponseCreateUser, ResponseUser
 from ..database import users_coll
 
 # from .post_router import validate_id
 from typing import Any
 from ..oauth2 import get_current_user_data
-from ..serializers.user_serializer import (
-    user_serializer,
-)
+from ..cache import user_cache
+from ..responses import fast_response
 
 
 router = APIRouter()
 
 
-def find_user(user_name: str) -> Any:
-    return users_coll.find_one({"username": user_name})
+async def find_user(user_name: str) -> Any:
+    return await users_coll.find_one({"username": user_name})
 
 
-def validate_user_name(user_name: str) -> bool:
-    found_user = find_user(user_name)
+async def validate_user_name(user_name: str) -> bool:
+    found_user = await find_user(user_name)
     if found_user:
         return True
 
@@ -30,10 +30,10 @@ def validate_user_name(user_name: str) -> bool:
     )
 
 
-def validate_user_for_the_query(
+async def validate_user_for_the_query(
     user_name: str, current_user_data: dict[str, str]
 ) -> bool:
-    found_user = find_user(user_name)
+    found_user = await find_user(user_name)
     if found_user["_id"] == current_user_data["_id"]:
         return True
     raise HTTPException(
@@ -56,15 +56,26 @@ async def create_user(user: CreateUser):
         user (CreateUser): The user object containing the user data.
 
     Returns:
-        dict: A dictionary containing the ID and creation time of the new user.
+        dict: The ID, username and creation time of the new user.
     """
-    hashed_password = hash_password(user.password)
+    hashed_password = await hash_password_async(user.password)
     user.password = hashed_password
     user_encoded = jsonable_encoder(user)
     # NOTE: jsonable_encoder converts the Model data to a dict/json type
-    new_user_id = users_coll.insert_one(user_encoded).inserted_id
+    # NOTE: usernames are unique through the username_unique index
+    try:
+        new_user_id = (
+            await users_coll.insert_one(user_encoded)
+        ).inserted_id
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Username Already Taken",
+        )
+    await user_cache.invalidate(user.username)
     return {
         "id": str(new_user_id),
+        "username": user.username,
         "creation_time": user.creation_time,
     }
 
@@ -87,16 +98,17 @@ async def get_user(
         current_user_data (dict): The data of the current user.
 
     Returns:
-        ResponseCreateUser: The serialized user object.
+        FastJSONResponse: The user, encoded straight from the Mongo document.
 
     Description:
-        This function retrieves the user with the given user ID. It validates the user ID
-        using the `validate_id` function. If the user is valid, it returns the serialized
-        user object using the `user_serializer` function.
+        This function retrieves the user with the given user name. It checks the user exists
+        with the `validate_user_name` function and that it is the current user. If so, it
+        returns the user document encoded by `fast_response` with the `ResponseUser` model,
+        which leaves out the password.
 
     Raises:
         None.
     """
-    if validate_user_name(user_name):
-        if validate_user_for_the_query(user_name, current_user_data):
-            return user_serializer(find_user(user_name))
+    if await validate_user_name(user_name):
+        if await validate_user_for_the_query(user_name, current_user_data):
+            return fast_response(ResponseUser, await find_user(user_name))
@@ -0,0 +1,88 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+from .metrics import Counter, registry
+
+singleflight_calls = registry.register(
+    Counter(
+        "singleflight_calls_total",
+        "Lookups that went through a single-flight group",
+        ("group",),
+    )
+)
+singleflight_executions = registry.register(
+    Counter(
+        "singleflight_executions_total",
+        "Lookups that actually ran, the rest shared one already in flight",
+        ("group",),
+    )
+)
+
+
+class SingleFlight:
+    """
+    Collapses concurrent identical lookups into one.
+
+    The first caller for a key starts the lookup, everyone asking for the
+    same key while it's in flight awaits that one and gets the same
+    result or exception. Nothing is kept once it finishes, this isn't a
+    cache: a call that starts afterwards runs its own lookup.
+
+    The result object is shared between the callers, so they must treat
+    it as read-only.
+
+    Args:
+        group (str): The name used for the metrics labels.
+    """
+
+    def __init__(self, group: str):
+        self.group = group
+        self.in_flight: dict[Hashable, asyncio.Future] = {}
+
+    async def do(
+        self, key: Hashable, lookup: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        singleflight_calls.inc(self.group)
+        future = self.in_flight.get(key)
+        if future is None:
+            singleflight_executions.inc(self.group)
+            # NOTE: a task of its own so the caller that started it going
+            # NOTE: away (client disconnect) doesn't cancel it for the rest
+            future = asyncio.ensure_future(lookup())
+            self.in_flight[key] = future
+            future.add_done_callback(lambda done: self.forget(key, done))
+        return await asyncio.shield(future)
+
+    def forget(self, key: Hashable, future: asyncio.Future) -> None:
+        if self.in_flight.get(key) is future:
+            del self.in_flight[key]
+        # NOTE: marks the exception retrieved if every caller went away
+        if not future.cancelled():
+            future.exception()
+
+    def stats(self) -> dict[str, float]:
+        calls = singleflight_calls.values.get((self.group,), 0)
+        executions = singleflight_executions.values.get((self.group,), 0)
+        return {
+            "calls": calls,
+            "executions": executions,
+            "collapse_ratio": 1 - executions / calls if calls else 0.0,
+        }
+
+
+def collapse_ratio_collector(
+    *groups: SingleFlight,
+) -> Callable[[], list[str]]:
+    def collect() -> list[str]:
+        metric = "singleflight_collapse_ratio"
+        lines = [
+            f"# HELP {metric} Share of lookups served by one already in flight",
+            f"# TYPE {metric} gauge",
+        ]
+        for group in groups:
+            lines.append(
+                f'{metric}{{group="{group.group}"}} '
+                f'{group.stats()["collapse_ratio"]}'
+            )
+        return lines
+
+    return collect
@@ -1,7 +1,27 @@
+import asyncio
+import os
+from concurrent.futures import (
+    Executor,
+    ThreadPoolExecutor,
+    ProcessPoolExecutor,
+)
+from typing import Any, Callable, Optional
+from fastapi import status, HTTPException
 from passlib.context import CryptContext
+from .config import settings
+
+# NOTE: changing BCRYPT_ROUNDS makes older hashes "need update",
+# NOTE: they're then rehashed with the new cost on the user's next login
+BCRYPT_ROUNDS = settings.BCRYPT_ROUNDS
 
 # NOTE: this specifies the hashing algorithm "bcrypt"
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 
 
 # NOTE: this hashes the password using passlib module
@@ -12,3 +32,83 @@ def hash_password(password: str):
 # NOTE: this takes in the pswd user enters, hashes it, then compares it with the DB's hash
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
+
+
+# NOTE: same as verify_password but also returns a new hash if the stored one uses an old cost
+def verify_and_update_password(plain_password, hashed_password):
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+class PasswordHashingPool:
+    """
+    Runs bcrypt off the event loop on a bounded pool.
+
+    At most `workers` hashes run at once and at most `max_queue` more wait
+    for a worker; past that callers get a 503 straight away instead of
+    piling up behind a login spike.
+
+    Args:
+        kind (str): "thread" or "process". bcrypt releases the GIL so threads are usually enough.
+        workers (int): The number of hashes that can run at the same time.
+        max_queue (int): The number of hashes allowed to wait for a worker.
+    """
+
+    def __init__(self, kind: str, workers: int, max_queue: int):
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = workers + max_queue
+        self.pending = 0
+        self._executor: Optional[Executor] = None
+
+    # NOTE: created on first use so a process pool isn't started at import time
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="bcrypt"
+                )
+        return self._executor
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too Many Password Checks In Progress",
+                headers={"Retry-After": "1"},
+            )
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_pool = PasswordHashingPool(
+    kind=settings.PASSWORD_HASH_EXECUTOR,
+    workers=settings.PASSWORD_HASH_WORKERS or min(4, os.cpu_count() or 1),
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
+
+
+async def hash_password_async(password: str) -> str:
+    return await password_pool.run(hash_password, password)
+
+
+async def verify_and_update_password_async(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, Optional[str]]:
+    return await password_pool.run(
+        verify_and_update_password, plain_password, hashed_password
+    )
@@ -0,0 +1,126 @@
+import os
+import uuid
+
+# NOTE: the settings are read when server is imported, so these come first;
+# NOTE: nothing connects to ATLAS_URI, the client is swapped for mongomock
+os.environ.setdefault("ATLAS_URI", "mongodb://localhost:27017")
+os.environ.setdefault("CLUSTER_DB_NAME", "test")
+# NOTE: or against a real mongod, which explains every query shape so an
+# NOTE: unindexed one fails the run; its database is dropped after each test
+TEST_MONGODB_URI = os.environ.get("TEST_MONGODB_URI")
+if TEST_MONGODB_URI:
+    os.environ["ATLAS_URI"] = TEST_MONGODB_URI
+    os.environ["CLUSTER_DB_NAME"] = "pytest"
+    os.environ["QUERY_DIAGNOSTICS_ENABLED"] = "true"
+os.environ.setdefault("POSTS_COLLECTION_NAME", "posts")
+os.environ.setdefault("USERS_COLLECTION_NAME", "users")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["FEED_CACHE_TTL_SECONDS"] = "0"
+
+import anyio
+import httpx
+import pytest
+
+mongomock_motor = pytest.importorskip(
+    "mongomock_motor", reason="pip install -r requirements-dev.txt"
+)
+
+from server import database
+from server.config import settings
+from server.main import app
+from server.oauth2 import create_access_token
+from server.query_diagnostics import (
+    assert_all_queries_indexed,
+    query_diagnostics,
+)
+from server.repositories import post_repository
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def queries_are_indexed():
+    yield
+    # NOTE: mongomock can't explain, only a real mongod has plans to check
+    if TEST_MONGODB_URI:
+        assert_all_queries_indexed()
+
+
+@pytest.fixture
+async def client(monkeypatch):
+    if not TEST_MONGODB_URI:
+        # NOTE: a fresh in-memory database per test
+        monkeypatch.setattr(
+            database,
+            "AsyncIOMotorClient",
+            mongomock_motor.AsyncMongoMockClient,
+        )
+    async with app.router.lifespan_context(app):
+        if TEST_MONGODB_URI:
+            # NOTE: a query explained before its index exists is a COLLSCAN
+            await app.state.index_bootstrap
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            yield client
+        if TEST_MONGODB_URI:
+            # NOTE: the explains run against this test's data, so they
+            # NOTE: finish before it's dropped for the next one
+            await anyio.to_thread.run_sync(query_diagnostics.drain)
+            await database.mongo.client.drop_database(
+                settings.CLUSTER_DB_NAME
+            )
+
+
+@pytest.fixture
+def make_user(client):
+    async def make_user() -> dict[str, str]:
+        # NOTE: unique names, the user cache outlives a test's database
+        username = f"user-{uuid.uuid4().hex[:12]}"
+        await database.users_coll.insert_one(
+            {
+                "username": username,
+                "email": f"{username}@example.com",
+                "password": "unused",
+            }
+        )
+        token = create_access_token({"username": username})
+        return {"Authorization": f"Bearer {token}"}
+
+    return make_user
+
+
+@pytest.fixture
+def post_projections(monkeypatch):
+    # NOTE: the projection of every find/find_one the post repository runs
+    projections: list = []
+
+    class RecordingCollection:
+        def __getattr__(self, attribute):
+            return getattr(database.posts_coll, attribute)
+
+        def record(self, projection):
+            # NOTE: a copy, mongomock adds _id to the one it's given
+            projections.append(
+                dict(projection) if projection is not None else None
+            )
+
+        def find(self, *args, **kwargs):
+            self.record(kwargs.get("projection"))
+            return database.posts_coll.find(*args, **kwargs)
+
+        async def find_one(self, *args, **kwargs):
+            self.record(kwargs.get("projection"))
+            return await database.posts_coll.find_one(*args, **kwargs)
+
+    monkeypatch.setattr(
+        post_repository, "posts_coll", RecordingCollection()
+    )
+    return projections
@@ -0,0 +1,121 @@
+import asyncio
+import httpx
+import pytest
+from fastapi.routing import APIRoute
+from server import admission
+from server.admission import AdmissionMiddleware, Limit
+from server.config import settings
+from server.main import app
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def limited_client(client, monkeypatch):
+    # NOTE: conftest turns rate limiting off, this wraps the app in a
+    # NOTE: middleware of its own with it on and small buckets; the app
+    # NOTE: builds its own stack on its first request, so that goes first
+    await client.get("/health/live")
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "RATE_LIMIT_REDIS_URL", None)
+    monkeypatch.setattr(settings, "RATE_LIMIT_TRUST_FORWARDED", True)
+    monkeypatch.setattr(
+        admission, "USER_LIMIT", Limit("user", rate=0.001, burst=2)
+    )
+    monkeypatch.setattr(
+        admission, "IP_LIMIT", Limit("ip", rate=0.001, burst=100)
+    )
+    monkeypatch.setitem(
+        admission.ROUTE_LIMITS,
+        ("POST", "/auth/login"),
+        Limit("login", rate=0.001, burst=1),
+    )
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=AdmissionMiddleware(app)),
+        base_url="http://test",
+    ) as limited_client:
+        yield limited_client
+
+
+def test_route_limits_name_real_routes():
+    routes = {
+        (method, route.path)
+        for route in app.routes
+        if isinstance(route, APIRoute)
+        for method in route.methods
+    }
+    assert set(admission.ROUTE_LIMITS) <= routes
+
+
+async def test_user_bucket_answers_429_with_retry_after(
+    limited_client, make_user
+):
+    headers = await make_user()
+    statuses = [
+        (await limited_client.get("/post/", headers=headers)).status_code
+        for _ in range(2)
+    ]
+    assert statuses == [200, 200]
+
+    limited = await limited_client.get("/post/", headers=headers)
+    assert limited.status_code == 429
+    assert int(limited.headers["retry-after"]) >= 1
+
+    # NOTE: another user has a bucket of their own
+    other = await make_user()
+    assert (
+        await limited_client.get("/post/", headers=other)
+    ).status_code == 200
+
+
+async def test_login_bucket_is_keyed_by_ip(limited_client):
+    async def login(ip: str) -> int:
+        response = await limited_client.post(
+            "/auth/login",
+            data={"username": "nobody", "password": "wrong"},
+            headers={"X-Forwarded-For": ip},
+        )
+        return response.status_code
+
+    assert await login("10.0.0.1") == 403
+    assert await login("10.0.0.1") == 429
+    assert await login("10.0.0.2") == 403
+
+
+async def test_exempt_paths_skip_the_buckets(limited_client, monkeypatch):
+    monkeypatch.setattr(
+        admission, "IP_LIMIT", Limit("ip", rate=0.001, burst=1)
+    )
+    await limited_client.get("/")
+    assert (await limited_client.get("/")).status_code == 429
+    for path in ("/health/live", "/health/ready", "/metrics"):
+        assert (await limited_client.get(path)).status_code == 200
+
+
+async def test_over_max_in_flight_answers_503(monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_MAX_IN_FLIGHT", 1)
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", False)
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_app(scope, receive, send):
+        if scope["path"] == "/post/":
+            started.set()
+            await release.wait()
+        await send({"type": "http.response.start", "status": 200})
+        await send({"type": "http.response.body", "body": b""})
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=AdmissionMiddleware(slow_app)),
+        base_url="http://test",
+    ) as client:
+        admitted = asyncio.create_task(client.get("/post/"))
+        await started.wait()
+
+        shed = await client.get("/post/")
+        assert shed.status_code == 503
+        assert shed.headers["retry-after"] == "1"
+
+        # NOTE: probes still get through to a saturated worker
+        assert (await client.get("/health/live")).status_code == 200
+        release.set()
+        assert (await admitted).status_code == 200
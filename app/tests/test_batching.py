@@ -0,0 +1,143 @@
+import asyncio
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import DuplicateKeyError
+from server import database
+from server.batching import InsertBatcher
+from server.repositories import post_repository
+
+pytestmark = pytest.mark.anyio
+
+
+def make_batcher(collection, **options) -> InsertBatcher:
+    return InsertBatcher(
+        collection, max_batch_size=10, max_delay_seconds=0.001, **options
+    )
+
+
+async def test_batch_failure_before_the_write_reaches_every_caller():
+    class BrokenCollection:
+        name = "posts"
+
+        def with_options(self, **options):
+            raise RuntimeError("bad write concern")
+
+    batcher = make_batcher(BrokenCollection(), durability="majority")
+    results = await asyncio.wait_for(
+        asyncio.gather(
+            batcher.insert({}), batcher.insert({}), return_exceptions=True
+        ),
+        timeout=1,
+    )
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+async def test_after_insert_failure_still_answers_callers():
+    collection = AsyncMongoMockClient()["test"]["posts"]
+
+    async def after_insert(documents):
+        raise RuntimeError("counter down")
+
+    batcher = make_batcher(collection, after_insert=after_insert)
+    post_ids = await asyncio.wait_for(
+        asyncio.gather(batcher.insert({}), batcher.insert({})), timeout=1
+    )
+    assert await collection.count_documents({}) == len(post_ids) == 2
+
+
+class CountingCollection:
+    def __init__(self, collection):
+        self.collection = collection
+        self.name = collection.name
+        self.batches: list[int] = []
+
+    def with_options(self, **options):
+        return self
+
+    async def insert_many(self, documents, ordered=True):
+        self.batches.append(len(documents))
+        return await self.collection.insert_many(
+            documents, ordered=ordered
+        )
+
+
+async def test_concurrent_inserts_share_one_insert_many():
+    collection = AsyncMongoMockClient()["test"]["posts"]
+    counting = CountingCollection(collection)
+    batcher = make_batcher(counting)
+
+    titles = [f"post {index}" for index in range(5)]
+    post_ids = await asyncio.wait_for(
+        asyncio.gather(
+            *(batcher.insert({"title": title}) for title in titles)
+        ),
+        timeout=1,
+    )
+    assert counting.batches == [5]
+    assert len(set(post_ids)) == 5
+    for title, post_id in zip(titles, post_ids):
+        assert (await collection.find_one({"_id": post_id}))[
+            "title"
+        ] == title
+
+
+async def test_duplicate_id_fails_only_its_own_caller():
+    collection = AsyncMongoMockClient()["test"]["posts"]
+    taken = (await collection.insert_one({"title": "taken"})).inserted_id
+    counting = CountingCollection(collection)
+    batcher = make_batcher(counting)
+
+    results = await asyncio.wait_for(
+        asyncio.gather(
+            batcher.insert({"title": "first"}),
+            batcher.insert({"_id": taken, "title": "again"}),
+            batcher.insert({"title": "last"}),
+            return_exceptions=True,
+        ),
+        timeout=1,
+    )
+    assert counting.batches == [3]
+    first, duplicate, last = results
+    assert isinstance(duplicate, DuplicateKeyError)
+    assert (await collection.find_one({"_id": first}))["title"] == "first"
+    assert (await collection.find_one({"_id": last}))["title"] == "last"
+    assert (await collection.find_one({"_id": taken}))["title"] == "taken"
+
+
+async def test_create_post_through_the_batcher(
+    client, make_user, monkeypatch
+):
+    counting = CountingCollection(database.posts_coll)
+    batcher = InsertBatcher(
+        counting,
+        max_batch_size=10,
+        max_delay_seconds=0.01,
+        after_insert=post_repository.after_posts_inserted,
+    )
+    monkeypatch.setattr(post_repository, "post_inserts", batcher)
+    headers = await make_user()
+
+    responses = await asyncio.gather(
+        *(
+            client.post(
+                "/post/",
+                json={"title": f"post {index}", "content": "content"},
+                headers=headers,
+            )
+            for index in range(3)
+        )
+    )
+    assert [response.status_code for response in responses] == [201] * 3
+    await batcher.close()
+    assert sum(counting.batches) == 3
+
+    for index, response in enumerate(responses):
+        post = await client.get(
+            f"/post/{response.json()['post_id']}", headers=headers
+        )
+        assert post.json()["title"] == f"post {index}"
+    listed = await client.get(
+        "/post/", params={"envelope": True}, headers=headers
+    )
+    # NOTE: the post count is kept by the batch's after_insert
+    assert listed.json()["total"] == 3
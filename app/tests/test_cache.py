@@ -0,0 +1,86 @@
+import uuid
+import pytest
+from jose import jwt
+from server.cache import MemoryCache, UserCache, user_cache
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def test_entries_expire_after_the_ttl():
+    clock = FakeClock()
+    cache = MemoryCache(max_size=10, ttl_seconds=60, clock=clock)
+    await cache.set("alice", {"username": "alice"})
+
+    clock.now += 59
+    assert await cache.get("alice") == {"username": "alice"}
+    clock.now += 1
+    assert await cache.get("alice") is None
+    assert len(cache) == 0
+
+
+async def test_least_recently_used_entry_is_evicted():
+    cache = MemoryCache(max_size=2, ttl_seconds=60)
+    await cache.set("alice", {})
+    await cache.set("bob", {})
+    # NOTE: reading alice makes bob the least recently used
+    await cache.get("alice")
+    await cache.set("carol", {})
+
+    assert await cache.get("bob") is None
+    assert await cache.get("alice") == {}
+    assert await cache.get("carol") == {}
+    assert len(cache) == 2
+
+
+async def test_callers_get_a_copy():
+    cache = MemoryCache(max_size=10, ttl_seconds=60)
+    await cache.set("alice", {"username": "alice"})
+    (await cache.get("alice"))["username"] = "mallory"
+    assert await cache.get("alice") == {"username": "alice"}
+
+
+async def test_user_cache_counts_hits_and_misses():
+    cache = UserCache(MemoryCache(max_size=10, ttl_seconds=60))
+    await cache.get("alice")
+    await cache.set("alice", {"username": "alice"})
+    await cache.get("alice")
+    await cache.get("alice")
+
+    assert cache.stats() == {"hits": 2, "misses": 1}
+    await cache.invalidate("alice")
+    assert await cache.get("alice") is None
+
+
+async def test_cached_user_has_no_password(client, make_user):
+    headers = await make_user()
+    assert (await client.get("/post/", headers=headers)).status_code == 200
+
+    token = headers["Authorization"].removeprefix("Bearer ")
+    username = jwt.get_unverified_claims(token)["username"]
+    cached = await user_cache.backend.get(username)
+    assert cached["username"] == username
+    assert "password" not in cached
+
+
+async def test_create_user_invalidates_the_cached_user(client):
+    username = f"user-{uuid.uuid4().hex}"
+    await user_cache.set(username, {"username": username, "stale": True})
+
+    response = await client.post(
+        "/user/",
+        json={
+            "username": username,
+            "email": f"{username}@example.com",
+            "password": "secret",
+        },
+    )
+    assert response.status_code == 201
+    assert await user_cache.backend.get(username) is None
@@ -0,0 +1,34 @@
+import asyncio
+import pytest
+from pymongo.errors import OperationFailure
+from server import indexes
+from server.main import app
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_live(client):
+    response = await client.get("/health/live")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+
+async def test_ready_reports_the_pool(client):
+    response = await client.get("/health/ready")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+
+
+async def test_ready_reports_a_failed_index_build(client, monkeypatch):
+    async def failing_apply_indexes():
+        raise OperationFailure("index build aborted")
+
+    monkeypatch.setattr(indexes, "apply_indexes", failing_apply_indexes)
+    app.state.index_bootstrap = asyncio.create_task(
+        indexes.bootstrap_indexes()
+    )
+    await app.state.index_bootstrap
+
+    body = (await client.get("/health/ready")).json()
+    assert body["indexes"] == "failed"
+    assert body["indexes_error"] == "OperationFailure"
@@ -0,0 +1,71 @@
+import httpx
+import pytest
+from bson.objectid import ObjectId
+from server import admission
+from server.admission import AdmissionMiddleware, Limit
+from server.config import settings
+from server.main import app
+from server.metrics import MetricsMiddleware, http_requests
+
+pytestmark = pytest.mark.anyio
+
+
+def request_count(method: str, route: str, status: int) -> float:
+    return http_requests.values.get((method, route, str(status)), 0)
+
+
+async def test_routes_are_labelled_by_template(client, make_user):
+    headers = await make_user()
+    post_id = (
+        await client.post(
+            "/post/",
+            json={"title": "title", "content": "content"},
+            headers=headers,
+        )
+    ).json()["post_id"]
+    missing_id = str(ObjectId())
+    await client.get(f"/post/{post_id}", headers=headers)
+    await client.get(f"/post/{missing_id}", headers=headers)
+    await client.get("/no/such/route")
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    scraped = response.text
+    for labels in (
+        'method="GET",route="/post/{post_id}",status="200"',
+        'method="GET",route="/post/{post_id}",status="404"',
+        'method="GET",route="unmatched",status="404"',
+    ):
+        assert f"http_requests_total{{{labels}}}" in scraped
+    assert (
+        'http_request_duration_seconds_count{method="GET",'
+        'route="/post/{post_id}"}' in scraped
+    )
+    # NOTE: raw ids never become label values
+    assert post_id not in scraped
+    assert missing_id not in scraped
+
+
+async def test_rejected_requests_are_unmatched(client, monkeypatch):
+    # NOTE: the app builds its own stack on its first request, before
+    # NOTE: rate limiting is turned on for the wrapping middleware below
+    await client.get("/health/live")
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "RATE_LIMIT_REDIS_URL", None)
+    monkeypatch.setattr(
+        admission, "IP_LIMIT", Limit("ip", rate=0.001, burst=1)
+    )
+    rejected_before = request_count("GET", "unmatched", 429)
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(
+            app=MetricsMiddleware(AdmissionMiddleware(app))
+        ),
+        base_url="http://test",
+    ) as limited_client:
+        await limited_client.get("/post/")
+        rejected = await limited_client.get("/post/")
+
+    assert rejected.status_code == 429
+    assert request_count("GET", "unmatched", 429) == rejected_before + 1
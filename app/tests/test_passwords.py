@@ -0,0 +1,85 @@
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from server import database, utils
+from server.utils import PasswordHashingPool
+
+pytestmark = pytest.mark.anyio
+
+
+def bcrypt_context(rounds: int) -> CryptContext:
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+async def test_pool_answers_503_past_workers_and_queue():
+    pool = PasswordHashingPool("thread", workers=1, max_queue=1)
+    release = threading.Event()
+    try:
+        running = [
+            asyncio.ensure_future(pool.run(release.wait)) for _ in range(2)
+        ]
+        await asyncio.sleep(0)
+        assert pool.pending == 2
+
+        with pytest.raises(HTTPException) as rejected:
+            await pool.run(release.wait)
+        assert rejected.value.status_code == 503
+        assert rejected.value.headers == {"Retry-After": "1"}
+
+        release.set()
+        assert await asyncio.gather(*running) == [True, True]
+        assert pool.pending == 0
+    finally:
+        release.set()
+        pool.shutdown()
+
+
+async def test_login_rehashes_a_password_with_old_rounds(
+    client, monkeypatch
+):
+    old_hash = bcrypt_context(4).hash("secret")
+    await database.users_coll.insert_one(
+        {
+            "username": "rehashed",
+            "email": "rehashed@example.com",
+            "password": old_hash,
+        }
+    )
+    # NOTE: as if BCRYPT_ROUNDS went up since the user signed up
+    monkeypatch.setattr(utils, "pwd_context", bcrypt_context(5))
+
+    response = await client.post(
+        "/auth/login", data={"username": "rehashed", "password": "secret"}
+    )
+    assert response.status_code == 200
+
+    user = await database.users_coll.find_one({"username": "rehashed"})
+    assert user["password"] != old_hash
+    assert user["password"].startswith("$2b$05$")
+    assert utils.pwd_context.verify("secret", user["password"])
+
+
+async def test_login_keeps_a_current_hash(client):
+    current_hash = utils.hash_password("secret")
+    await database.users_coll.insert_one(
+        {
+            "username": "current",
+            "email": "current@example.com",
+            "password": current_hash,
+        }
+    )
+
+    response = await client.post(
+        "/auth/login", data={"username": "current", "password": "secret"}
+    )
+    assert response.status_code == 200
+    user = await database.users_coll.find_one({"username": "current"})
+    assert user["password"] == current_hash
@@ -0,0 +1,526 @@
+import orjson
+import pytest
+from bson.objectid import ObjectId
+from server.config import settings
+from server.models import ResponsePost
+from server.responses import ndjson_chunks
+from server.repositories import post_repository
+from server.routers import post_router
+
+pytestmark = pytest.mark.anyio
+
+
+async def create_post(client, headers, **fields) -> str:
+    response = await client.post(
+        "/post/",
+        json={"title": "title", "content": "content", **fields},
+        headers=headers,
+    )
+    assert response.status_code == 201
+    return response.json()["post_id"]
+
+
+async def test_create_and_get_post(client, make_user):
+    headers = await make_user()
+    post_id = await create_post(client, headers, title="hello")
+
+    response = await client.get(f"/post/{post_id}", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["title"] == "hello"
+
+    not_modified = await client.get(
+        f"/post/{post_id}",
+        headers={**headers, "If-None-Match": response.headers["etag"]},
+    )
+    assert not_modified.status_code == 304
+
+
+async def test_partial_etag_does_not_validate_the_full_post(
+    client, make_user
+):
+    headers = await make_user()
+    post_id = await create_post(client, headers)
+
+    partial = await client.get(
+        f"/post/{post_id}", params={"fields": "title"}, headers=headers
+    )
+    full = await client.get(
+        f"/post/{post_id}",
+        headers={**headers, "If-None-Match": partial.headers["etag"]},
+    )
+    assert full.status_code == 200
+    assert full.json()["content"] == "content"
+    assert full.headers["etag"] != partial.headers["etag"]
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {},
+        {"envelope": "true"},
+        {"search": "title"},
+        {"search": "!!"},
+    ],
+)
+async def test_partial_list_etag_does_not_validate_the_full_list(
+    client, make_user, monkeypatch, params
+):
+    async def search_owned_posts(owner_id, terms, limit, skip, projection):
+        # NOTE: mongomock has no $text, every post matches
+        return await post_repository.list_owned_posts(
+            owner_id, {}, limit, skip=skip, projection=projection
+        )
+
+    monkeypatch.setattr(
+        post_router, "search_owned_posts", search_owned_posts
+    )
+    headers = await make_user()
+    await create_post(client, headers)
+
+    partial = await client.get(
+        "/post/", params={**params, "fields": "title"}, headers=headers
+    )
+    full = await client.get(
+        "/post/",
+        params=params,
+        headers={**headers, "If-None-Match": partial.headers["etag"]},
+    )
+    assert full.status_code == 200
+    assert full.headers["etag"] != partial.headers["etag"]
+
+
+@pytest.mark.parametrize("fields", ["title,nope", "password", "_id"])
+async def test_unknown_fields_are_rejected(client, make_user, fields):
+    headers = await make_user()
+    post_id = await create_post(client, headers)
+
+    for path in (f"/post/{post_id}", "/post/"):
+        response = await client.get(
+            path, params={"fields": fields}, headers=headers
+        )
+        assert response.status_code == 400
+        assert response.json()["detail"].startswith("Invalid fields: ")
+
+
+@pytest.mark.parametrize("fields", ["", " ", ",,", " , ,"])
+async def test_blank_fields_return_the_full_post(
+    client, make_user, fields
+):
+    headers = await make_user()
+    post_id = await create_post(client, headers)
+    full = await client.get(f"/post/{post_id}", headers=headers)
+
+    response = await client.get(
+        f"/post/{post_id}", params={"fields": fields}, headers=headers
+    )
+    assert response.status_code == 200
+    assert response.json() == full.json()
+    assert response.headers["etag"] == full.headers["etag"]
+
+
+async def test_fields_are_pushed_down_to_mongo(
+    client, make_user, post_projections
+):
+    headers = await make_user()
+    post_id = await create_post(client, headers, title="hello")
+    params = {"fields": " title, id,title"}
+
+    response = await client.get(
+        f"/post/{post_id}", params=params, headers=headers
+    )
+    assert response.json() == {"title": "hello", "id": post_id}
+    listed = await client.get("/post/", params=params, headers=headers)
+    assert listed.json() == [{"title": "hello", "id": post_id}]
+
+    assert (
+        post_projections
+        == [{"title": 1, "version": 1, "last_modified": 1}] * 2
+    )
+
+
+async def test_get_post_access_errors(client, make_user):
+    owner, other = await make_user(), await make_user()
+    post_id = await create_post(client, owner)
+
+    assert (
+        await client.get("/post/bad-id", headers=owner)
+    ).status_code == 400
+    missing = await client.get(f"/post/{ObjectId()}", headers=owner)
+    assert missing.status_code == 404
+    forbidden = await client.get(f"/post/{post_id}", headers=other)
+    assert forbidden.status_code == 403
+
+
+async def test_list_pages_with_cursor(client, make_user):
+    headers = await make_user()
+    post_ids = [await create_post(client, headers) for _ in range(5)]
+
+    seen, cursor = [], None
+    while True:
+        response = await client.get(
+            "/post/",
+            params={"limit": 2, **({"cursor": cursor} if cursor else {})},
+            headers=headers,
+        )
+        assert response.status_code == 200
+        seen += [post["title"] for post in response.json()]
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    assert len(seen) == len(post_ids)
+
+
+@pytest.mark.parametrize(
+    "params", [{"limit": 0}, {"limit": -3}, {"page": 0}]
+)
+async def test_list_rejects_bad_paging(client, make_user, params):
+    headers = await make_user()
+    response = await client.get("/post/", params=params, headers=headers)
+    assert response.status_code == 422
+
+
+async def test_envelope_total_follows_writes(client, make_user):
+    headers = await make_user()
+    post_ids = [await create_post(client, headers) for _ in range(3)]
+    await client.delete(f"/post/{post_ids[0]}", headers=headers)
+
+    response = await client.get(
+        "/post/", params={"envelope": "true"}, headers=headers
+    )
+    assert response.json()["total"] == 2
+    assert len(response.json()["items"]) == 2
+
+
+async def test_text_search_envelope_links_the_next_page(
+    client, make_user, monkeypatch
+):
+    async def search_owned_posts(owner_id, terms, limit, skip, projection):
+        # NOTE: mongomock has no $text, every post matches
+        return await post_repository.list_owned_posts(
+            owner_id, {}, limit, skip=skip, projection=projection
+        )
+
+    async def filtered_total(owner_id, key, query):
+        return await post_router.get_post_count(owner_id)
+
+    monkeypatch.setattr(
+        post_router, "search_owned_posts", search_owned_posts
+    )
+    monkeypatch.setattr(post_router, "filtered_total", filtered_total)
+    headers = await make_user()
+    for _ in range(3):
+        await create_post(client, headers)
+
+    pages, page = [], "1"
+    while page is not None:
+        response = await client.get(
+            "/post/",
+            params={
+                "search": "title",
+                "envelope": "true",
+                "limit": 2,
+                "page": page,
+            },
+            headers=headers,
+        )
+        assert response.json()["total"] == 3
+        page = response.json()["next"]
+        pages.append((len(response.json()["items"]), page))
+    assert pages == [(2, "2"), (1, None)]
+
+
+async def test_update_with_stale_if_match(client, make_user):
+    headers = await make_user()
+    post_id = await create_post(client, headers)
+    etag = (await client.get(f"/post/{post_id}", headers=headers)).headers[
+        "etag"
+    ]
+
+    updated = await client.put(
+        f"/post/{post_id}",
+        json={"title": "new"},
+        headers={**headers, "If-Match": etag},
+    )
+    assert updated.status_code == 200
+    assert updated.json()["title"] == "new"
+
+    stale = await client.put(
+        f"/post/{post_id}",
+        json={"title": "newer"},
+        headers={**headers, "If-Match": etag},
+    )
+    assert stale.status_code == 412
+
+
+async def test_bulk_update_reports_posts_changed_meanwhile(
+    client, make_user, monkeypatch
+):
+    headers = await make_user()
+    kept, deleted, edited = [
+        await create_post(client, headers) for _ in range(3)
+    ]
+    bulk_write_posts = post_repository.bulk_write_posts
+
+    async def write_after_others(*args, **kwargs):
+        # NOTE: another request gets in between the check and the write
+        await client.delete(f"/post/{deleted}", headers=headers)
+        await client.put(
+            f"/post/{edited}", json={"title": "theirs"}, headers=headers
+        )
+        return await bulk_write_posts(*args, **kwargs)
+
+    monkeypatch.setattr(
+        post_repository, "bulk_write_posts", write_after_others
+    )
+    response = await client.put(
+        "/post/bulk",
+        params={"ordered": "false"},
+        json=[
+            {"post_id": post_id, "title": "ours"}
+            for post_id in (kept, deleted, edited)
+        ],
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert [
+        item["status_code"] for item in response.json()["results"]
+    ] == [200, 404, 409]
+    edited_post = await client.get(f"/post/{edited}", headers=headers)
+    assert edited_post.json()["title"] == "theirs"
+
+
+def statuses(response) -> list[int]:
+    assert response.status_code == 200
+    return [item["status_code"] for item in response.json()["results"]]
+
+
+@pytest.mark.parametrize(
+    "ordered, expected",
+    [(True, [201, 409, 424]), (False, [201, 409, 201])],
+)
+async def test_bulk_create_reports_a_failed_insert(
+    client, make_user, monkeypatch, ordered, expected
+):
+    headers = await make_user()
+    taken = ObjectId(await create_post(client, headers))
+    # NOTE: the second new post gets an _id that's already in use
+    new_ids = iter([ObjectId(), taken, ObjectId()])
+    monkeypatch.setattr(
+        post_repository,
+        "ObjectId",
+        lambda *value: ObjectId(*value) if value else next(new_ids),
+    )
+
+    response = await client.post(
+        "/post/bulk",
+        params={"ordered": ordered},
+        json=[
+            {"title": f"bulk {index}", "content": "c"}
+            for index in range(3)
+        ],
+        headers=headers,
+    )
+    assert statuses(response) == expected
+    assert response.json()["succeeded"] == expected.count(201)
+
+    listed = await client.get(
+        "/post/", params={"envelope": True}, headers=headers
+    )
+    assert listed.json()["total"] == 1 + expected.count(201)
+
+
+@pytest.mark.parametrize(
+    "ordered, expected",
+    [
+        (True, [204, 400, 424, 424, 424]),
+        (False, [204, 400, 403, 404, 204]),
+    ],
+)
+async def test_bulk_delete_reports_every_item(
+    client, make_user, ordered, expected
+):
+    owner, other = await make_user(), await make_user()
+    first, last = [await create_post(client, owner) for _ in range(2)]
+    others = await create_post(client, other)
+
+    response = await client.post(
+        "/post/bulk/delete",
+        params={"ordered": ordered},
+        json=[first, "bad-id", others, str(ObjectId()), last],
+        headers=owner,
+    )
+    # NOTE: ordered mode still reports the invalid id, it's checked up front
+    assert statuses(response) == expected
+
+    remaining = await client.get("/post/", headers=owner)
+    assert len(remaining.json()) == (1 if ordered else 0)
+    assert (
+        await client.get(f"/post/{others}", headers=other)
+    ).status_code == 200
+
+
+async def test_ordered_bulk_update_stops_at_someone_elses_post(
+    client, make_user
+):
+    owner, other = await make_user(), await make_user()
+    mine = await create_post(client, owner)
+    others = await create_post(client, other)
+
+    response = await client.put(
+        "/post/bulk",
+        json=[
+            {"post_id": mine, "title": "ours"},
+            {"post_id": others, "title": "ours"},
+            {"post_id": mine, "content": "never"},
+        ],
+        headers=owner,
+    )
+    assert statuses(response) == [200, 403, 424]
+    assert response.json()["results"][2]["detail"] == (
+        "Not Attempted After An Earlier Failure"
+    )
+    post = (await client.get(f"/post/{mine}", headers=owner)).json()
+    assert (post["title"], post["content"]) == ("ours", "content")
+
+
+async def test_bulk_update_rejects_a_repeated_post_id(client, make_user):
+    headers = await make_user()
+    post_id = await create_post(client, headers)
+
+    response = await client.put(
+        "/post/bulk",
+        params={"ordered": "false"},
+        json=[{"post_id": post_id, "title": "ours"}] * 2,
+        headers=headers,
+    )
+    assert statuses(response) == [200, 400]
+    assert response.json()["results"][1]["detail"] == (
+        f"Duplicate id: {post_id}"
+    )
+    assert response.json()["succeeded"] == 1
+
+    states = await post_repository.find_post_states([ObjectId(post_id)])
+    assert states[ObjectId(post_id)]["version"] == 2
+
+
+async def test_bulk_delete_rejects_a_repeated_post_id(client, make_user):
+    headers = await make_user()
+    post_id, kept = [await create_post(client, headers) for _ in range(2)]
+
+    response = await client.post(
+        "/post/bulk/delete",
+        params={"ordered": "false"},
+        json=[post_id, post_id, kept],
+        headers=headers,
+    )
+    assert statuses(response) == [204, 400, 204]
+    assert response.json()["succeeded"] == 2
+
+    listed = await client.get(
+        "/post/", params={"envelope": True}, headers=headers
+    )
+    assert listed.json()["total"] == 0
+
+
+async def test_export_streams_the_owners_posts_as_ndjson(
+    client, make_user, monkeypatch
+):
+    monkeypatch.setattr(settings, "CONTENT_COMPRESSION", "zlib")
+    monkeypatch.setattr(settings, "CONTENT_COMPRESSION_MIN_BYTES", 64)
+    owner, other = await make_user(), await make_user()
+    long_content = "compressed before it's stored " * 20
+    await create_post(client, owner, title="first", content="short")
+    await create_post(client, owner, title="second", content=long_content)
+    await create_post(client, other, title="someone else's")
+
+    response = await client.get("/post/export", headers=owner)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.text.endswith("\n")
+
+    posts = [orjson.loads(line) for line in response.text.splitlines()]
+    assert [(post["title"], post["content"]) for post in posts] == [
+        ("first", "short"),
+        ("second", long_content),
+    ]
+    assert all(
+        set(post) == set(ResponsePost.model_fields) for post in posts
+    )
+
+
+async def test_ndjson_chunks_hold_whole_lines():
+    async def documents():
+        for index in range(5):
+            yield {"title": f"post {index}", "content": "x" * index}
+
+    chunks = [
+        chunk
+        async for chunk in ndjson_chunks(
+            ResponsePost, documents(), chunk_size=40
+        )
+    ]
+    assert len(chunks) > 1
+    assert all(chunk.endswith(b"\n") for chunk in chunks)
+    lines = b"".join(chunks).splitlines()
+    assert [orjson.loads(line)["title"] for line in lines] == [
+        f"post {index}" for index in range(5)
+    ]
+
+
+async def test_batch_get_keeps_request_order(client, make_user):
+    owner, other = await make_user(), await make_user()
+    first = await create_post(client, owner, title="first")
+    second = await create_post(client, owner, title="second")
+    others = await create_post(client, other)
+    missing = str(ObjectId())
+
+    response = await client.post(
+        "/post/batch",
+        json=[second, "bad-id", others, missing, first],
+        headers=owner,
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [item["status_code"] for item in results] == [
+        200,
+        400,
+        403,
+        404,
+        200,
+    ]
+    assert results[0]["post"]["title"] == "second"
+    assert results[4]["post"]["title"] == "first"
+
+
+async def test_feed_only_lists_published_posts(client, make_user):
+    headers = await make_user()
+    await create_post(client, headers, title="public")
+    await create_post(client, headers, title="draft", published=False)
+
+    response = await client.get("/post/feed")
+    assert response.status_code == 200
+    assert [post["title"] for post in response.json()] == ["public"]
+
+
+async def test_feed_follows_updates_without_touching_drafts(
+    client, make_user, monkeypatch
+):
+    headers = await make_user()
+    public = await create_post(client, headers, title="public")
+    draft = await create_post(client, headers, published=False)
+    synced = []
+    sync_feed_entry = post_repository.sync_feed_entry
+
+    async def record_sync(post_id, post):
+        synced.append(str(post_id))
+        await sync_feed_entry(post_id, post)
+
+    monkeypatch.setattr(post_repository, "sync_feed_entry", record_sync)
+    for post_id in (draft, public):
+        await client.put(
+            f"/post/{post_id}", json={"title": "edited"}, headers=headers
+        )
+
+    assert synced == [public]
+    feed = (await client.get("/post/feed")).json()
+    assert [post["title"] for post in feed] == ["edited"]
@@ -0,0 +1,92 @@
+import os
+import sys
+import time
+from types import SimpleNamespace
+import pytest
+from server import profiling
+from server.config import settings
+from server.profiling import (
+    ProfileStore,
+    is_signed_profile_request,
+    sign_profile_request,
+)
+
+SECRET = "profiling-secret"
+
+
+@pytest.fixture(autouse=True)
+def profiling_secret(monkeypatch):
+    monkeypatch.setattr(settings, "PROFILING_SECRET", SECRET)
+
+
+def signed(path: str, expires_in: int = 60, secret: str = SECRET) -> bytes:
+    return sign_profile_request(
+        path, int(time.time()) + expires_in, secret
+    ).encode()
+
+
+def test_signed_request_is_accepted():
+    assert is_signed_profile_request(signed("/post/"), "/post/")
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        signed("/post/", expires_in=-1),
+        signed("/post/", secret="another-secret"),
+        signed("/user/"),
+        b"not-a-signature",
+        b"",
+    ],
+    ids=["expired", "other-secret", "other-path", "garbage", "empty"],
+)
+def test_unsigned_requests_are_refused(value):
+    assert not is_signed_profile_request(value, "/post/")
+
+
+def test_tampered_signature_is_refused():
+    value = signed("/post/").decode()
+    expires, _, signature = value.partition(".")
+    tampered = (
+        f"{expires}.{'0' if signature[0] != '0' else '1'}{signature[1:]}"
+    )
+    assert not is_signed_profile_request(tampered.encode(), "/post/")
+
+    # NOTE: moving the expiry out breaks the signature too
+    extended = f"{int(expires) + 3600}.{signature}"
+    assert not is_signed_profile_request(extended.encode(), "/post/")
+
+
+def test_nothing_is_accepted_without_a_secret(monkeypatch):
+    value = signed("/post/")
+    monkeypatch.setattr(settings, "PROFILING_SECRET", None)
+    assert not is_signed_profile_request(value, "/post/")
+
+
+def test_code_frame_names_the_function():
+    function, file, _ = profiling.code_frame(sys._getframe())
+    assert function == "test_code_frame_names_the_function"
+    assert file == __file__
+
+
+def test_code_frame_without_qualname():
+    # NOTE: code objects before python 3.11 have no co_qualname
+    code = SimpleNamespace(
+        co_name="handler", co_filename="router.py", co_firstlineno=7
+    )
+    frame = SimpleNamespace(f_code=code)
+    assert profiling.code_frame(frame) == ("handler", "router.py", 7)
+
+
+def test_prune_keeps_the_newest_profiles(tmp_path):
+    store = ProfileStore(str(tmp_path), max_profiles=2)
+    for profile_id in ("20260101T000000", "20260102T000000"):
+        store.save(profile_id, {}, {})
+    store.save("20260103T000000", {}, {})
+
+    assert sorted(os.listdir(tmp_path)) == [
+        "20260102T000000.speedscope.json",
+        "20260102T000000.summary.json",
+        "20260103T000000.speedscope.json",
+        "20260103T000000.summary.json",
+    ]
@@ -0,0 +1,202 @@
+import logging
+from types import SimpleNamespace
+import pytest
+from bson.objectid import ObjectId
+from server.query_diagnostics import (
+    PlanSummary,
+    QueryDiagnostics,
+    QueryShape,
+    assert_all_queries_indexed,
+    query_shape,
+    query_plan_warnings,
+    slow_queries,
+)
+
+COLLSCAN_EXPLAIN = {
+    "queryPlanner": {
+        "winningPlan": {
+            "stage": "SORT",
+            "inputStage": {"stage": "COLLSCAN"},
+        }
+    },
+    "executionStats": {
+        "nReturned": 10,
+        "totalKeysExamined": 0,
+        "totalDocsExamined": 5000,
+    },
+}
+# NOTE: an aggregation keeps its find plan under stages[0].$cursor
+INDEXED_AGGREGATE_EXPLAIN = {
+    "stages": [
+        {
+            "$cursor": {
+                "queryPlanner": {
+                    "winningPlan": {
+                        "stage": "FETCH",
+                        "inputStage": {
+                            "stage": "IXSCAN",
+                            "indexName": "owner_id_1__id_-1",
+                        },
+                    }
+                },
+                "executionStats": {
+                    "nReturned": 10,
+                    "totalKeysExamined": 10,
+                    "totalDocsExamined": 10,
+                },
+            }
+        },
+        {"$group": {"_id": None}},
+    ]
+}
+
+
+def make_diagnostics(**options) -> QueryDiagnostics:
+    return QueryDiagnostics(
+        **{
+            "slow_query_ms": 100,
+            "explain_interval_seconds": 0,
+            "max_examined_ratio": 10,
+            "max_shapes": 10,
+            **options,
+        }
+    )
+
+
+def find_command(owner_id: ObjectId, after_id: ObjectId) -> dict:
+    return {
+        "find": "posts",
+        "filter": {"owner_id": owner_id, "_id": {"$lt": after_id}},
+        "sort": {"_id": -1},
+        "limit": 11,
+    }
+
+
+def test_shape_drops_values_and_keeps_the_sort():
+    first = query_shape("find", find_command(ObjectId(), ObjectId()))
+    second = query_shape("find", find_command(ObjectId(), ObjectId()))
+    assert first == second
+    assert first == (
+        '{"filter":{"owner_id":"?","_id":{"$lt":"?"}},"sort":{"_id":-1}}'
+    )
+
+
+def test_shape_of_in_ignores_the_list_length():
+    shapes = {
+        query_shape(
+            "find", {"find": "posts", "filter": {"_id": {"$in": ids}}}
+        )
+        for ids in ([ObjectId()], [ObjectId(), ObjectId(), ObjectId()])
+    }
+    assert shapes == {'{"filter":{"_id":{"$in":"?"}}}'}
+
+
+def test_shape_of_a_write_reads_its_first_statement():
+    shape = query_shape(
+        "update",
+        {
+            "update": "posts",
+            "updates": [
+                {"q": {"_id": ObjectId()}, "u": {"$set": {"title": "a"}}}
+            ],
+        },
+    )
+    assert shape == '{"filter":{"_id":"?"}}'
+
+
+def test_collscan_plan_is_flagged():
+    plan = PlanSummary.from_explain(COLLSCAN_EXPLAIN)
+    assert plan.collscan
+    assert plan.stages == ["SORT", "COLLSCAN"]
+    assert plan.warnings(max_examined_ratio=10) == [
+        "collscan",
+        "examined_ratio",
+    ]
+
+
+def test_indexed_aggregate_plan_is_not_flagged():
+    plan = PlanSummary.from_explain(INDEXED_AGGREGATE_EXPLAIN)
+    assert not plan.collscan
+    assert plan.indexes == ["owner_id_1__id_-1"]
+    assert plan.warnings(max_examined_ratio=10) == []
+    assert plan.warnings(max_examined_ratio=0.5) == ["examined_ratio"]
+
+
+def test_explain_warns_once_per_reason(caplog):
+    class ExplainingClient:
+        def __getitem__(self, database):
+            return SimpleNamespace(
+                command=lambda command: COLLSCAN_EXPLAIN
+            )
+
+    diagnostics = make_diagnostics()
+    diagnostics.client = ExplainingClient()
+    query = SimpleNamespace(
+        collection="diag_posts",
+        command="find",
+        shape="{}",
+        plan=None,
+        plan_error=None,
+        warnings=[],
+    )
+    with caplog.at_level(logging.WARNING):
+        diagnostics.explain(query, "test", {})
+        diagnostics.explain(query, "test", {})
+
+    assert query.warnings == ["collscan", "examined_ratio"]
+    assert query_plan_warnings.values[("diag_posts", "collscan")] == 1
+    assert len(caplog.records) == 2
+
+
+def test_only_queries_over_slow_query_ms_are_logged(caplog):
+    diagnostics = make_diagnostics(slow_query_ms=50)
+    command = find_command(ObjectId(), ObjectId())
+    command["find"] = "slow_posts"
+
+    def run(request_id: int, duration_ms: float) -> None:
+        event = SimpleNamespace(
+            command_name="find",
+            command=command,
+            connection_id=("localhost", 27017),
+            request_id=request_id,
+            database_name="test",
+            duration_micros=duration_ms * 1000,
+        )
+        diagnostics.started(event)
+        diagnostics.finished(event)
+
+    with caplog.at_level(logging.WARNING):
+        run(1, duration_ms=5)
+        run(2, duration_ms=80)
+
+    [record] = caplog.records
+    assert "Slow query: find on slow_posts took 80.0ms" in record.message
+    assert slow_queries.values[("slow_posts", "find")] == 1
+    [shape] = diagnostics.report()
+    assert shape.count == 2
+    assert shape.max_ms == 80
+
+
+def test_assert_all_queries_indexed_lists_every_collscan():
+    diagnostics = make_diagnostics()
+    for collection, explain in (
+        ("posts", COLLSCAN_EXPLAIN),
+        ("index_versions", COLLSCAN_EXPLAIN),
+        ("users", INDEXED_AGGREGATE_EXPLAIN),
+    ):
+        diagnostics.shapes[(collection, "find", "{}")] = QueryShape(
+            collection,
+            "find",
+            "{}",
+            plan=PlanSummary.from_explain(explain),
+        )
+
+    with pytest.raises(AssertionError) as error:
+        assert_all_queries_indexed(diagnostics)
+    assert "find on posts {}" in str(error.value)
+    assert "find on index_versions {}" in str(error.value)
+    assert "users" not in str(error.value)
+
+    assert_all_queries_indexed(
+        diagnostics, allow_collections=["posts", "index_versions"]
+    )
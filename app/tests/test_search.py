@@ -0,0 +1,59 @@
+import re
+import pytest
+from server.repositories.post_repository import (
+    MAX_SEARCH_LENGTH,
+    substring_query,
+    text_search_terms,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("search", ["(.*)+", "a|b", "^[x]$", "\\d{3}"])
+def test_substring_query_matches_literally(search):
+    pattern = re.compile(
+        substring_query(search)["title"]["$regex"], re.IGNORECASE
+    )
+    assert pattern.search(f"title with {search} in it")
+    assert not pattern.search("an unrelated title")
+
+
+def test_substring_query_is_capped():
+    search = "a" * (MAX_SEARCH_LENGTH + 100)
+    assert substring_query(search)["title"]["$regex"] == "a" * (
+        MAX_SEARCH_LENGTH
+    )
+    assert substring_query("") == {}
+
+
+def test_text_search_terms_keep_only_words():
+    assert text_search_terms('"exact phrase" -negated (.*)+') == (
+        "exact phrase negated"
+    )
+    assert text_search_terms("!!! ***") == ""
+
+
+def test_text_search_terms_are_capped():
+    words = "word " * MAX_SEARCH_LENGTH
+    terms = text_search_terms(words)
+    assert len(terms) <= MAX_SEARCH_LENGTH
+    assert terms == text_search_terms(words[:MAX_SEARCH_LENGTH])
+
+
+async def test_substring_search_runs_literally(client, make_user):
+    headers = await make_user()
+    for title in ("regex (.*)+ in the title", "plain title"):
+        await client.post(
+            "/post/",
+            json={"title": title, "content": "content"},
+            headers=headers,
+        )
+
+    response = await client.get(
+        "/post/",
+        params={"search": "(.*)+", "search_mode": "substring"},
+        headers=headers,
+    )
+    assert [post["title"] for post in response.json()] == [
+        "regex (.*)+ in the title"
+    ]
@@ -0,0 +1,129 @@
+import asyncio
+import pytest
+from server.routers import post_router
+from server.singleflight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+class CountingLoader:
+    def __init__(self, result=None, error=None):
+        self.calls = 0
+        self.result = result
+        self.error = error
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+async def gather_with(group, loader, count, key="key"):
+    waiters = asyncio.gather(
+        *(group.do(key, loader) for _ in range(count)),
+        return_exceptions=True,
+    )
+    # NOTE: every caller is waiting before the loader finishes
+    await asyncio.sleep(0)
+    loader.release.set()
+    return await waiters
+
+
+async def test_concurrent_calls_share_one_load():
+    group = SingleFlight("test")
+    loader = CountingLoader(result={"title": "post"})
+
+    results = await gather_with(group, loader, 5)
+    assert loader.calls == 1
+    assert all(result is results[0] for result in results)
+    assert group.in_flight == {}
+
+    # NOTE: not a cache, a later call loads again
+    assert await group.do("key", loader) == {"title": "post"}
+    assert loader.calls == 2
+
+
+async def test_other_keys_load_separately():
+    group = SingleFlight("test")
+    loader = CountingLoader(result="post")
+
+    waiters = asyncio.gather(group.do("a", loader), group.do("b", loader))
+    await asyncio.sleep(0)
+    loader.release.set()
+    assert await waiters == ["post", "post"]
+    assert loader.calls == 2
+
+
+async def test_exception_reaches_every_caller_and_is_not_kept():
+    group = SingleFlight("test")
+    error = RuntimeError("mongo down")
+    loader = CountingLoader(error=error)
+
+    results = await gather_with(group, loader, 3)
+    assert loader.calls == 1
+    assert all(result is error for result in results)
+
+    loader.error = None
+    loader.result = "recovered"
+    assert await group.do("key", loader) == "recovered"
+    assert loader.calls == 2
+
+
+async def test_cancelled_caller_does_not_cancel_the_others():
+    group = SingleFlight("test")
+    loader = CountingLoader(result="post")
+
+    leaving = asyncio.ensure_future(group.do("key", loader))
+    staying = asyncio.ensure_future(group.do("key", loader))
+    await asyncio.sleep(0)
+    leaving.cancel()
+    await asyncio.sleep(0)
+    assert leaving.cancelled()
+
+    loader.release.set()
+    assert await staying == "post"
+    assert loader.calls == 1
+
+
+async def test_stats_count_the_collapsed_calls():
+    group = SingleFlight("test_stats")
+    await gather_with(group, CountingLoader(), 4)
+    assert group.stats() == {
+        "calls": 4,
+        "executions": 1,
+        "collapse_ratio": 0.75,
+    }
+
+
+async def test_concurrent_post_reads_share_one_query(
+    client, make_user, monkeypatch
+):
+    headers = await make_user()
+    post_id = (
+        await client.post(
+            "/post/",
+            json={"title": "title", "content": "content"},
+            headers=headers,
+        )
+    ).json()["post_id"]
+    calls = []
+    find_owned_post = post_router.find_owned_post
+
+    async def counting_find(*args, **kwargs):
+        calls.append(args)
+        # NOTE: holds the query open long enough for the others to join
+        await asyncio.sleep(0.05)
+        return await find_owned_post(*args, **kwargs)
+
+    monkeypatch.setattr(post_router, "find_owned_post", counting_find)
+    responses = await asyncio.gather(
+        *(
+            client.get(f"/post/{post_id}", headers=headers)
+            for _ in range(3)
+        )
+    )
+    assert [response.status_code for response in responses] == [200] * 3
+    assert len(calls) == 1
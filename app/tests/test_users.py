@@ -0,0 +1,32 @@
+import uuid
+import pytest
+from server.main import app
+
+pytestmark = pytest.mark.anyio
+
+
+def new_user() -> dict[str, str]:
+    username = f"user-{uuid.uuid4().hex}"
+    return {
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": "secret",
+    }
+
+
+async def test_create_user_returns_username(client):
+    user = new_user()
+    response = await client.post("/user/", json=user)
+    assert response.status_code == 201
+    assert response.json()["username"] == user["username"]
+
+
+async def test_create_user_with_a_taken_username(client):
+    # NOTE: the unique username index is built in the background at startup
+    await app.state.index_bootstrap
+    user = new_user()
+    assert (await client.post("/user/", json=user)).status_code == 201
+
+    response = await client.post("/user/", json=user)
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Username Already Taken"
@@ -0,0 +1,81 @@
+"""
+Compares the old response path against responses.fast_response.
+
+The old path is what FastAPI does for a handler returning dicts with a
+`response_model`: the serializer builds a dict per document, pydantic
+validates it against the model, dumps it back to JSON-able python and
+json.dumps writes the bytes.
+
+Run from the repository root:
+
+    python benchmarks/bench_serialization.py --docs 100 --rounds 200
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime
+from typing import List
+
+from bson.objectid import ObjectId
+from pydantic import TypeAdapter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from server.models import ResponsePost  # noqa: E402
+from server.responses import fast_response  # noqa: E402
+from server.serializers.post_serializer import (
+    post_list_serializer,
+)  # noqa: E402
+
+
+def make_documents(count: int, content_size: int) -> list[dict]:
+    owner_id = ObjectId()
+    return [
+        {
+            "_id": ObjectId(),
+            "title": f"post number {i}",
+            "content": "x" * content_size,
+            "published": True,
+            "creation_time": datetime.now().isoformat(),
+            "owner_id": owner_id,
+        }
+        for i in range(count)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=100)
+    parser.add_argument("--content-size", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    documents = make_documents(args.docs, args.content_size)
+    adapter = TypeAdapter(List[ResponsePost])
+
+    def pydantic_path() -> bytes:
+        validated = adapter.validate_python(
+            post_list_serializer(documents)
+        )
+        return json.dumps(
+            adapter.dump_python(validated, mode="json")
+        ).encode()
+
+    def fast_path() -> bytes:
+        return fast_response(ResponsePost, documents).body
+
+    # NOTE: both paths must produce the same JSON or the comparison means nothing
+    assert json.loads(pydantic_path()) == json.loads(fast_path())
+
+    results = {}
+    for name, func in (("pydantic", pydantic_path), ("fast", fast_path)):
+        seconds = min(timeit.repeat(func, number=args.rounds, repeat=5))
+        results[name] = seconds / args.rounds * 1e6
+        print(f"{name:>8}: {results[name]:10.1f} us per response")
+    print(f" speedup: {results['pydantic'] / results['fast']:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,531 @@
+"""
+Load test for every route of the API.
+
+Each scenario drives one route with concurrent clients and reports
+throughput, p50/p95/p99 latency and MongoDB commands per request, read
+from the /metrics endpoint before and after the scenario.
+
+Against a running server backed by a local mongod:
+
+    cd app && RATE_LIMIT_ENABLED=false python run.py --prod
+    python benchmarks/load_test.py --base-url http://localhost:8000
+
+The rate limits would otherwise turn most of the login and sign up
+requests into 429s, since every client shares one IP.
+
+Or fully in-process, with the app mounted on an ASGI transport and
+mongomock-motor (pip install -r requirements-dev.txt) standing in for
+MongoDB. Latencies are then only useful to compare app-side changes,
+and no Mongo command events are emitted:
+
+    python benchmarks/load_test.py --in-process
+
+Results can be written out and compared with an earlier run, the
+comparison exits non-zero on a regression:
+
+    python benchmarks/load_test.py --output before.json
+    python benchmarks/load_test.py --compare before.json --tolerance 0.2
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Callable
+
+import httpx
+
+APP_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "app"
+)
+
+
+@dataclass
+class Context:
+    """
+    State shared by the scenarios: users, their tokens and their posts.
+    """
+
+    run_id: str
+    usernames: list[str] = field(default_factory=list)
+    tokens: list[str] = field(default_factory=list)
+    post_ids: list[str] = field(default_factory=list)
+    # NOTE: posts made only to be deleted, each can be deleted once
+    disposable_post_ids: list[str] = field(default_factory=list)
+
+    def auth(self) -> dict[str, str]:
+        return {"Authorization": f"Bearer {self.tokens[0]}"}
+
+    def post_id(self, i: int) -> str:
+        return self.post_ids[i % len(self.post_ids)]
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    # NOTE: builds the url and request kwargs for the i-th request
+    build: Callable[[Context, int], tuple[str, dict[str, Any]]]
+    expected: tuple[int, ...] = (200,)
+
+
+def new_post(i: int) -> dict[str, Any]:
+    return {
+        "title": f"benchmark post {i}",
+        "content": "lorem ipsum dolor sit amet " * 40,
+    }
+
+
+SCENARIOS = [
+    Scenario(
+        "GET /health/live",
+        "GET",
+        lambda ctx, i: ("/health/live", {}),
+    ),
+    Scenario(
+        "GET /health/ready",
+        "GET",
+        lambda ctx, i: ("/health/ready", {}),
+    ),
+    Scenario(
+        "POST /auth/login",
+        "POST",
+        lambda ctx, i: (
+            "/auth/login",
+            {
+                "data": {
+                    "username": ctx.usernames[0],
+                    "password": "benchmark",
+                }
+            },
+        ),
+    ),
+    Scenario(
+        "POST /user/",
+        "POST",
+        lambda ctx, i: (
+            "/user/",
+            {
+                "json": {
+                    "username": f"bench-{ctx.run_id}-{i}",
+                    "email": f"bench-{ctx.run_id}-{i}@example.com",
+                    "password": "benchmark",
+                }
+            },
+        ),
+        expected=(201,),
+    ),
+    Scenario(
+        "GET /user/{user_name}",
+        "GET",
+        lambda ctx, i: (
+            f"/user/{ctx.usernames[0]}",
+            {"headers": ctx.auth()},
+        ),
+    ),
+    Scenario(
+        "POST /post/",
+        "POST",
+        lambda ctx, i: (
+            "/post/",
+            {"json": new_post(i), "headers": ctx.auth()},
+        ),
+        expected=(201,),
+    ),
+    Scenario(
+        "GET /post/",
+        "GET",
+        lambda ctx, i: (
+            "/post/",
+            {"params": {"limit": 20}, "headers": ctx.auth()},
+        ),
+    ),
+    Scenario(
+        "GET /post/?envelope=true",
+        "GET",
+        lambda ctx, i: (
+            "/post/",
+            {
+                "params": {"limit": 20, "envelope": "true"},
+                "headers": ctx.auth(),
+            },
+        ),
+    ),
+    Scenario(
+        "GET /post/?search=",
+        "GET",
+        lambda ctx, i: (
+            "/post/",
+            {
+                "params": {"limit": 20, "search": "lorem"},
+                "headers": ctx.auth(),
+            },
+        ),
+    ),
+    Scenario(
+        "GET /post/feed",
+        "GET",
+        lambda ctx, i: ("/post/feed", {"params": {"limit": 20}}),
+    ),
+    Scenario(
+        "GET /post/export",
+        "GET",
+        lambda ctx, i: ("/post/export", {"headers": ctx.auth()}),
+    ),
+    Scenario(
+        "GET /post/{post_id}",
+        "GET",
+        lambda ctx, i: (
+            f"/post/{ctx.post_id(i)}",
+            {"headers": ctx.auth()},
+        ),
+    ),
+    Scenario(
+        "POST /post/batch",
+        "POST",
+        lambda ctx, i: (
+            "/post/batch",
+            {
+                "json": [ctx.post_id(i * 12 + j) for j in range(12)],
+                "headers": ctx.auth(),
+            },
+        ),
+    ),
+    Scenario(
+        "PUT /post/{post_id}",
+        "PUT",
+        lambda ctx, i: (
+            f"/post/{ctx.post_id(i)}",
+            {"json": {"title": f"updated {i}"}, "headers": ctx.auth()},
+        ),
+    ),
+    Scenario(
+        "POST /post/bulk",
+        "POST",
+        lambda ctx, i: (
+            "/post/bulk",
+            {
+                "json": [new_post(i * 10 + j) for j in range(10)],
+                "headers": ctx.auth(),
+            },
+        ),
+    ),
+    Scenario(
+        "PUT /post/bulk",
+        "PUT",
+        lambda ctx, i: (
+            "/post/bulk",
+            {
+                "json": [
+                    {
+                        "post_id": ctx.post_id(i * 10 + j),
+                        "title": f"bulk {i}",
+                    }
+                    for j in range(10)
+                ],
+                "headers": ctx.auth(),
+            },
+        ),
+    ),
+    Scenario(
+        "DELETE /post/{post_id}",
+        "DELETE",
+        lambda ctx, i: (
+            f"/post/{ctx.disposable_post_ids.pop()}",
+            {"headers": ctx.auth()},
+        ),
+        expected=(204,),
+    ),
+    Scenario(
+        "POST /post/bulk/delete",
+        "POST",
+        lambda ctx, i: (
+            "/post/bulk/delete",
+            {
+                "json": [ctx.disposable_post_ids.pop() for _ in range(10)],
+                "headers": ctx.auth(),
+            },
+        ),
+    ),
+]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+async def mongo_command_count(client: httpx.AsyncClient) -> float:
+    response = await client.get("/metrics")
+    total = 0.0
+    for line in response.text.splitlines():
+        if line.startswith("mongo_command_duration_seconds_count"):
+            total += float(line.rsplit(" ", 1)[1])
+    return total
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    ctx: Context,
+    scenario: Scenario,
+    requests: int,
+    concurrency: int,
+) -> dict[str, Any]:
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for i in counter:
+            url, kwargs = scenario.build(ctx, i)
+            start = time.perf_counter()
+            response = await client.request(scenario.method, url, **kwargs)
+            await response.aread()
+            latencies.append(time.perf_counter() - start)
+            statuses[str(response.status_code)] = (
+                statuses.get(str(response.status_code), 0) + 1
+            )
+            if response.status_code not in scenario.expected:
+                errors += 1
+
+    commands_before = await mongo_command_count(client)
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    commands_after = await mongo_command_count(client)
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "statuses": statuses,
+        "throughput_rps": requests / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000
+        if latencies
+        else 0.0,
+        "mongo_ops_per_request": (commands_after - commands_before)
+        / requests,
+    }
+
+
+async def prepare(
+    client: httpx.AsyncClient, requests: int, seed_posts: int
+) -> Context:
+    ctx = Context(run_id=uuid.uuid4().hex[:8])
+    username = f"bench-{ctx.run_id}-owner"
+    response = await client.post(
+        "/user/",
+        json={
+            "username": username,
+            "email": f"{username}@example.com",
+            "password": "benchmark",
+        },
+    )
+    response.raise_for_status()
+    ctx.usernames.append(username)
+
+    response = await client.post(
+        "/auth/login",
+        data={"username": username, "password": "benchmark"},
+    )
+    response.raise_for_status()
+    ctx.tokens.append(response.json()["access_token"])
+
+    # NOTE: posts to read and update, plus enough to delete one per
+    # NOTE: DELETE request and ten per bulk delete request
+    async def create_posts(count: int) -> list[str]:
+        post_ids: list[str] = []
+        for start in range(0, count, 500):
+            response = await client.post(
+                "/post/bulk",
+                json=[
+                    new_post(i)
+                    for i in range(start, min(count, start + 500))
+                ],
+                headers=ctx.auth(),
+            )
+            response.raise_for_status()
+            post_ids += [
+                item["post_id"] for item in response.json()["results"]
+            ]
+        return post_ids
+
+    ctx.post_ids = await create_posts(seed_posts)
+    ctx.disposable_post_ids = await create_posts(requests * 11)
+    return ctx
+
+
+@contextlib.asynccontextmanager
+async def in_process_client() -> AsyncIterator[httpx.AsyncClient]:
+    try:
+        import mongomock_motor
+    except ImportError:
+        raise SystemExit(
+            "--in-process needs mongomock-motor, pip install -r requirements-dev.txt"
+        )
+    import motor.motor_asyncio
+
+    # NOTE: swapped in before the app is imported so database.py picks it up
+    motor.motor_asyncio.AsyncIOMotorClient = (
+        mongomock_motor.AsyncMongoMockClient
+    )
+    # NOTE: every client shares one IP, see the module docstring
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    sys.path.insert(0, APP_DIR)
+    from server.main import app
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            # NOTE: an unhandled error counts as a 500 instead of ending the run
+            transport=httpx.ASGITransport(
+                app=app, raise_app_exceptions=False
+            ),
+            base_url="http://benchmark",
+        ) as client:
+            yield client
+
+
+@contextlib.asynccontextmanager
+async def remote_client(base_url: str) -> AsyncIterator[httpx.AsyncClient]:
+    limits = httpx.Limits(
+        max_connections=None, max_keepalive_connections=None
+    )
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=60
+    ) as client:
+        yield client
+
+
+def compare(
+    results: dict[str, Any], baseline: dict[str, Any], tolerance: float
+) -> list[str]:
+    """
+    Lists every scenario that got slower or did more Mongo work than the baseline.
+    """
+    regressions = []
+    for name, current in results["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        if current["throughput_rps"] < before["throughput_rps"] * (
+            1 - tolerance
+        ):
+            regressions.append(
+                f"{name}: throughput {before['throughput_rps']:.1f}"
+                f" -> {current['throughput_rps']:.1f} req/s"
+            )
+        if current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {before['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms"
+            )
+        if (
+            current["mongo_ops_per_request"]
+            > before["mongo_ops_per_request"]
+        ):
+            regressions.append(
+                f"{name}: mongo ops/request"
+                f" {before['mongo_ops_per_request']:.2f}"
+                f" -> {current['mongo_ops_per_request']:.2f}"
+            )
+    return regressions
+
+
+async def main_async(args: argparse.Namespace) -> dict[str, Any]:
+    client_context = (
+        in_process_client()
+        if args.in_process
+        else remote_client(args.base_url)
+    )
+    async with client_context as client:
+        ctx = await prepare(client, args.requests, args.seed_posts)
+        scenarios = [
+            scenario
+            for scenario in SCENARIOS
+            if not args.only
+            or any(part in scenario.name for part in args.only)
+        ]
+
+        results: dict[str, Any] = {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "target": "in-process" if args.in_process else args.base_url,
+            "python": platform.python_version(),
+            "scenarios": {},
+        }
+        for scenario in scenarios:
+            outcome = await run_scenario(
+                client, ctx, scenario, args.requests, args.concurrency
+            )
+            results["scenarios"][scenario.name] = outcome
+            print(
+                f"{scenario.name:<24} {outcome['throughput_rps']:9.1f} req/s"
+                f"  p50 {outcome['p50_ms']:8.2f}  p95 {outcome['p95_ms']:8.2f}"
+                f"  p99 {outcome['p99_ms']:8.2f} ms"
+                f"  mongo/req {outcome['mongo_ops_per_request']:5.2f}"
+                f"  errors {outcome['errors']}"
+            )
+        return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Load test every route of the API"
+    )
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument(
+        "--in-process",
+        action="store_true",
+        help="run the app in-process against mongomock-motor",
+    )
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seed-posts", type=int, default=200)
+    parser.add_argument(
+        "--only",
+        action="append",
+        help="only run scenarios whose name contains this, can repeat",
+    )
+    parser.add_argument("--output", help="write the results as JSON here")
+    parser.add_argument(
+        "--compare", help="a previous --output to compare to"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="allowed relative slowdown before it counts as a regression",
+    )
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()